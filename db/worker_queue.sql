@@ -0,0 +1,191 @@
+-- Shared task queue and worker node registry for distributed workers (TASK_DISPATCH=queue).
+-- Run after init_supabase.sql. API nodes enqueue into task_queue; worker nodes (server/worker.py)
+-- claim rows with claim_tasks(), keep their leases alive with worker_heartbeat() and delete a
+-- row once its task has finished. Both tables are only accessed with the service role key.
+
+-- Tasks waiting for or running on a worker node; a row lives from /start-task until the task finishes
+CREATE TABLE IF NOT EXISTS public.task_queue (
+  task_id BIGINT PRIMARY KEY REFERENCES public.tasks(id) ON DELETE CASCADE,
+  user_id UUID REFERENCES public.users(id) ON DELETE CASCADE NOT NULL,
+  project_id BIGINT,
+  agent TEXT NOT NULL DEFAULT 'claude',
+  priority TEXT NOT NULL DEFAULT 'normal',
+  priority_rank INTEGER NOT NULL DEFAULT 1, -- 0 interactive, 1 normal, 2 batch
+  -- The GitHub token the task was submitted with, Fernet-encrypted with TASK_QUEUE_ENCRYPTION_KEY
+  -- (never exposed: RLS with no policies). Cleared when the last allowed attempt is claimed.
+  github_token TEXT,
+  enqueued_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+  -- Claim and lease: a node owns the task until lease_expires_at, renewed by its heartbeat
+  claimed_by TEXT,
+  claimed_at TIMESTAMP WITH TIME ZONE,
+  lease_expires_at TIMESTAMP WITH TIME ZONE,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  cancel_requested BOOLEAN NOT NULL DEFAULT false
+);
+
+-- Installs created before the token was cleared on claim
+ALTER TABLE public.task_queue ALTER COLUMN github_token DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_task_queue_unclaimed ON public.task_queue(priority_rank, enqueued_at) WHERE claimed_by IS NULL;
+CREATE INDEX IF NOT EXISTS idx_task_queue_claimed_by ON public.task_queue(claimed_by);
+CREATE INDEX IF NOT EXISTS idx_task_queue_user_id ON public.task_queue(user_id);
+
+-- Worker nodes: registration, capacity reporting and draining
+CREATE TABLE IF NOT EXISTS public.worker_nodes (
+  node_id TEXT PRIMARY KEY,
+  hostname TEXT,
+  execution_mode TEXT, -- 'direct' or 'docker'
+  agents TEXT[] NOT NULL DEFAULT '{}',
+  status TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'draining', 'stopped')),
+  capacity JSONB DEFAULT '{}', -- slots plus the node's admission snapshot
+  running_tasks INTEGER NOT NULL DEFAULT 0,
+  started_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  last_heartbeat_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE public.task_queue ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.worker_nodes ENABLE ROW LEVEL SECURITY;
+
+-- Claim up to p_limit tasks for a node, most urgent first.
+--
+-- Ordering mirrors the in-process scheduler: aged priority class (one class per
+-- p_aging_seconds waited), then the user with the fewest tasks running across the
+-- cluster, then submission order. Users at their maxConcurrency
+-- (users.preferences.scheduler, else p_default_user_concurrency) are skipped; two
+-- nodes claiming at the same instant can overshoot that quota by one task each.
+-- Rows are locked with SKIP LOCKED, so concurrent claims never block or double-claim.
+-- Expired leases belong to nodes that stopped heartbeating: the task is claimed again
+-- unless it has used p_max_attempts, in which case it is failed. The claim that uses the
+-- last attempt returns the encrypted GitHub token and clears it from the row.
+CREATE OR REPLACE FUNCTION public.claim_tasks(
+  p_node_id TEXT,
+  p_agents TEXT[],
+  p_limit INTEGER,
+  p_lease_seconds INTEGER,
+  p_max_attempts INTEGER,
+  p_aging_seconds DOUBLE PRECISION,
+  p_default_user_concurrency INTEGER
+)
+RETURNS SETOF public.task_queue
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_row public.task_queue;
+  v_claimed INTEGER := 0;
+  v_token TEXT;
+BEGIN
+  WITH lost AS (
+    DELETE FROM public.task_queue
+    WHERE claimed_by IS NOT NULL AND lease_expires_at < NOW()
+      AND (attempts >= p_max_attempts OR cancel_requested)
+    RETURNING task_id
+  )
+  UPDATE public.tasks
+  SET status = 'failed', error = 'Worker node lost while running the task', completed_at = NOW(), updated_at = NOW()
+  WHERE id IN (SELECT task_id FROM lost) AND status IN ('pending', 'running');
+
+  -- Tasks that already finished but whose node could not delete the row: never run them again
+  DELETE FROM public.task_queue q
+  USING public.tasks t
+  WHERE t.id = q.task_id AND t.status IN ('completed', 'failed', 'cancelled')
+    AND (q.claimed_by IS NULL OR q.lease_expires_at < NOW());
+
+  WHILE v_claimed < p_limit LOOP
+    SELECT q.* INTO v_row
+    FROM public.task_queue q
+    LEFT JOIN public.users u ON u.id = q.user_id
+    WHERE (q.claimed_by IS NULL OR q.lease_expires_at < NOW())
+      AND NOT q.cancel_requested
+      AND q.agent = ANY(p_agents)
+      AND (SELECT COUNT(*) FROM public.task_queue r
+           WHERE r.user_id = q.user_id AND r.claimed_by IS NOT NULL AND r.lease_expires_at >= NOW())
+          < COALESCE(NULLIF(u.preferences->'scheduler'->>'maxConcurrency', '')::INTEGER, p_default_user_concurrency)
+    ORDER BY
+      GREATEST(0, q.priority_rank - FLOOR(EXTRACT(EPOCH FROM NOW() - q.enqueued_at) / p_aging_seconds)),
+      (SELECT COUNT(*) FROM public.task_queue r
+       WHERE r.user_id = q.user_id AND r.claimed_by IS NOT NULL AND r.lease_expires_at >= NOW()),
+      q.priority_rank * p_aging_seconds + EXTRACT(EPOCH FROM q.enqueued_at)
+    LIMIT 1
+    FOR UPDATE OF q SKIP LOCKED;
+
+    EXIT WHEN NOT FOUND;
+
+    v_token := v_row.github_token;
+    UPDATE public.task_queue
+    SET claimed_by = p_node_id, claimed_at = NOW(),
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds), attempts = attempts + 1,
+        github_token = CASE WHEN attempts + 1 >= p_max_attempts THEN NULL ELSE github_token END
+    WHERE task_id = v_row.task_id
+    RETURNING * INTO v_row;
+    v_row.github_token := v_token;
+
+    -- Where the task ran, for operators and /tasks/<id>
+    UPDATE public.tasks
+    SET execution_metadata = COALESCE(execution_metadata, '{}'::jsonb) || jsonb_build_object('worker_node', p_node_id)
+    WHERE id = v_row.task_id;
+
+    v_claimed := v_claimed + 1;
+    RETURN NEXT v_row;
+  END LOOP;
+END;
+$$;
+
+-- Register (p_register) or heartbeat a node: upserts its worker_nodes row, renews the
+-- leases of the tasks it still holds and reports what the node has to act on.
+-- Returns {"status": <row status>, "cancel": [task ids the API asked to cancel],
+-- "lost": [task ids in p_task_ids no longer leased to this node], "leader": <node id>}.
+-- The leader is the longest-running active node that heartbeated within p_lease_seconds;
+-- it alone runs cluster-wide background jobs such as the proactive OAuth refresh.
+CREATE OR REPLACE FUNCTION public.worker_heartbeat(
+  p_node_id TEXT,
+  p_hostname TEXT,
+  p_execution_mode TEXT,
+  p_agents TEXT[],
+  p_capacity JSONB,
+  p_running INTEGER,
+  p_task_ids BIGINT[],
+  p_lease_seconds INTEGER,
+  p_status TEXT DEFAULT NULL,
+  p_register BOOLEAN DEFAULT false
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_status TEXT;
+BEGIN
+  INSERT INTO public.worker_nodes AS n
+    (node_id, hostname, execution_mode, agents, status, capacity, running_tasks, started_at, last_heartbeat_at)
+  VALUES
+    (p_node_id, p_hostname, p_execution_mode, p_agents, COALESCE(p_status, 'active'), p_capacity, p_running, NOW(), NOW())
+  ON CONFLICT (node_id) DO UPDATE SET
+    hostname = EXCLUDED.hostname,
+    execution_mode = EXCLUDED.execution_mode,
+    agents = EXCLUDED.agents,
+    status = COALESCE(p_status, n.status),
+    capacity = EXCLUDED.capacity,
+    running_tasks = EXCLUDED.running_tasks,
+    started_at = CASE WHEN p_register THEN NOW() ELSE n.started_at END,
+    last_heartbeat_at = NOW()
+  RETURNING status INTO v_status;
+
+  UPDATE public.task_queue
+  SET lease_expires_at = NOW() + make_interval(secs => p_lease_seconds)
+  WHERE claimed_by = p_node_id AND task_id = ANY(p_task_ids);
+
+  -- Nodes silent for a day are gone for good
+  DELETE FROM public.worker_nodes WHERE last_heartbeat_at < NOW() - INTERVAL '1 day';
+
+  RETURN jsonb_build_object(
+    'status', v_status,
+    'cancel', COALESCE((SELECT jsonb_agg(task_id) FROM public.task_queue
+                        WHERE claimed_by = p_node_id AND cancel_requested AND task_id = ANY(p_task_ids)), '[]'::jsonb),
+    'lost', COALESCE((SELECT jsonb_agg(t) FROM unnest(p_task_ids) AS t
+                      WHERE NOT EXISTS (SELECT 1 FROM public.task_queue q WHERE q.task_id = t AND q.claimed_by = p_node_id)), '[]'::jsonb),
+    'leader', (SELECT node_id FROM public.worker_nodes
+               WHERE status = 'active' AND last_heartbeat_at >= NOW() - make_interval(secs => p_lease_seconds)
+               ORDER BY started_at, node_id LIMIT 1)
+  );
+END;
+$$;
@@ -0,0 +1,117 @@
+from flask import Blueprint, Response, jsonify, request
+import hmac
+import os
+import logging
+from functools import wraps
+from database import DatabaseOperations
+from utils.profiling import stack_sampler, thread_dump, MAX_DURATION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+
+def require_admin(view):
+    """Admin endpoints are hidden unless ADMIN_TOKEN is set and sent as X-Admin-Token"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Not found'}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/profile/start', methods=['POST'])
+@require_admin
+def start_profile():
+    """Start sampling every thread's stack for a bounded window"""
+    try:
+        data = request.get_json(silent=True) or {}
+        duration = float(data.get('duration', 30))
+        interval = float(data.get('interval', 0.01))
+        if duration <= 0 or interval <= 0:
+            return jsonify({'error': 'duration and interval must be positive'}), 400
+
+        try:
+            session = stack_sampler.start(duration=duration, interval=interval)
+        except RuntimeError as e:
+            return jsonify({'error': str(e), 'profile': stack_sampler.status()}), 409
+
+        return jsonify({
+            'status': 'success',
+            'max_duration': MAX_DURATION_SECONDS,
+            'profile': session
+        })
+
+    except (TypeError, ValueError):
+        return jsonify({'error': 'duration and interval must be numbers'}), 400
+
+@admin_bp.route('/profile/stop', methods=['POST'])
+@require_admin
+def stop_profile():
+    """Stop the running session early"""
+    return jsonify({
+        'status': 'success',
+        'profile': stack_sampler.stop()
+    })
+
+@admin_bp.route('/profile', methods=['GET'])
+@require_admin
+def get_profile():
+    """Session status, or its samples as ?format=collapsed (flamegraph) or ?format=pstats"""
+    output = request.args.get('format')
+    if output == 'collapsed':
+        return Response(stack_sampler.collapsed(), mimetype='text/plain')
+    if output == 'pstats':
+        return Response(
+            stack_sampler.pstats(),
+            mimetype='application/octet-stream',
+            headers={'Content-Disposition': 'attachment; filename=profile.pstats'}
+        )
+    if output:
+        return jsonify({'error': 'format must be collapsed or pstats'}), 400
+    return jsonify({
+        'status': 'success',
+        'profile': stack_sampler.status()
+    })
+
+@admin_bp.route('/threads', methods=['GET'])
+@require_admin
+def get_threads():
+    """Current stack of every thread in the process"""
+    return Response(thread_dump(), mimetype='text/plain')
+
+@admin_bp.route('/workers/<node_id>/drain', methods=['POST'])
+@require_admin
+def drain_worker(node_id):
+    """Stop a worker node claiming tasks; its running tasks finish and unstarted ones go back to the queue"""
+    return _set_worker_status(node_id, 'draining')
+
+@admin_bp.route('/workers/<node_id>/resume', methods=['POST'])
+@require_admin
+def resume_worker(node_id):
+    """Let a drained worker node claim tasks again"""
+    return _set_worker_status(node_id, 'active')
+
+
+def _set_worker_status(node_id: str, status: str):
+    try:
+        node = next((row for row in DatabaseOperations.get_worker_nodes() if row['node_id'] == node_id), None)
+        if not node:
+            return jsonify({'error': 'Worker node not found'}), 404
+        if node['status'] == 'stopped':
+            return jsonify({'error': 'Worker node has stopped'}), 409
+        DatabaseOperations.set_worker_status(node_id, status)
+        logger.info(f"🚰 Worker node {node_id} set to {status}")
+        return jsonify({
+            'status': 'success',
+            'node_id': node_id,
+            'worker_status': status,
+            'message': 'Applied on the node\'s next heartbeat'
+        })
+    except Exception as e:
+        logger.error(f"Error updating worker node {node_id}: {e}")
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1 @@
+"""Benchmarks for the task pipeline and its hot paths (run as python -m benchmarks.<name>)"""
@@ -0,0 +1,341 @@
+"""
+Distributed worker benchmark: one API, several worker.py processes.
+
+The API runs in this process with TASK_DISPATCH=queue; each worker node is a
+separate ``worker.py`` process with its own NODE_ID, and all of them share one
+in-memory Supabase served over HTTP, with the pipeline benchmark's local git
+remote and fake agent CLI. Reports throughput and latency across the cluster
+and how tasks spread over the nodes. ``--drain`` sends SIGTERM to workers once
+a third of the tasks are done (they must finish what they are running, hand
+back the rest and exit cleanly); ``--kill`` SIGKILLs workers at the halfway
+point (their tasks must be claimed again by the others once the leases lapse).
+Exits non-zero when a task does not complete or a node misbehaves.
+
+    cd server
+    python -m benchmarks.cluster --workers 3 --tasks 30
+    python -m benchmarks.cluster --workers 4 --tasks 60 --drain 1 --kill 1
+"""
+import os
+import sys
+import math
+import time
+import shutil
+import signal
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from .common import add_baseline_arguments, finish, latency_summary
+from .fakes import (FakeSupabase, FakeSupabaseServer, RemoteFakeSupabase, TERMINAL_STATUSES,
+                    install_fake_supabase, make_bare_remote, make_fake_bin)
+from .pipeline import configure_environment
+
+BASELINE = Path(__file__).parent / 'baselines' / 'cluster.json'
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+HIGHER_IS_BETTER = ('throughput.tasks_per_second',)
+LOWER_IS_BETTER = ('latency.p50', 'latency.p95')
+
+
+def run_worker(db_url: str):
+    """Child process: worker.py against the parent's shared fake database"""
+    install_fake_supabase(RemoteFakeSupabase(db_url))
+    import runpy
+    runpy.run_path(str(SERVER_DIR / 'worker.py'), run_name='__main__')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Cluster:
+    """The worker processes, their logs and what the shared database says about them"""
+
+    def __init__(self, db: FakeSupabase, db_url: str, root: Path, args):
+        self.db, self.db_url, self.root, self.args = db, db_url, root, args
+        self.processes = {}
+        self.logs = {}
+
+    def start(self, count: int):
+        for n in range(count):
+            node_id = f'bench-node-{n}'
+            env = dict(os.environ, NODE_ID=node_id, WORKER_PORT=str(free_port()),
+                       WORKER_LOCK_FILE=str(self.root / f'{node_id}.lock'),
+                       WORKER_MAX_TASKS=str(self.args.slots),
+                       WORKER_HEARTBEAT_SECONDS=str(self.args.heartbeat),
+                       WORKER_LEASE_SECONDS=str(self.args.lease),
+                       WORKER_POLL_INTERVAL_SECONDS=str(self.args.poll),
+                       WORKER_DRAIN_TIMEOUT_SECONDS=str(self.args.timeout))
+            self.logs[node_id] = open(self.root / f'{node_id}.log', 'w')
+            self.processes[node_id] = subprocess.Popen(
+                [sys.executable, '-m', 'benchmarks.cluster', '--worker', self.db_url],
+                cwd=SERVER_DIR, env=env, stdout=self.logs[node_id], stderr=subprocess.STDOUT
+            )
+
+    def nodes(self) -> dict:
+        return {row['node_id']: row for row in self.db.tables.get('worker_nodes', [])}
+
+    def wait_registered(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self.nodes().get(node_id, {}).get('status') == 'active' for node_id in self.processes):
+                return
+            exited = [node_id for node_id, process in self.processes.items() if process.poll() is not None]
+            if exited:
+                raise RuntimeError(f"Worker(s) exited during startup: {', '.join(exited)}\n{self.tail(exited[0])}")
+            time.sleep(0.1)
+        raise RuntimeError(f"Workers did not register within {timeout:g}s")
+
+    def held_by(self, node_id: str) -> list:
+        return [row['task_id'] for row in self.db.tables.get('task_queue', []) if row['claimed_by'] == node_id]
+
+    def signal(self, node_id: str, signum: int):
+        self.processes[node_id].send_signal(signum)
+
+    def stop(self, timeout: float) -> dict:
+        """SIGTERM every running worker; node id -> exit code (None if it had to be killed)"""
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        codes = {}
+        for node_id, process in self.processes.items():
+            try:
+                codes[node_id] = process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                codes[node_id] = None
+            self.logs[node_id].close()
+        return codes
+
+    def tail(self, node_id: str, lines: int = 30) -> str:
+        if not self.logs[node_id].closed:
+            self.logs[node_id].flush()
+        return '\n'.join((self.root / f'{node_id}.log').read_text().splitlines()[-lines:])
+
+
+def run(args) -> dict:
+    root = Path(tempfile.mkdtemp(prefix='async-code-cluster-'))
+    cluster = None
+    try:
+        repo_url = make_bare_remote(root, files=args.repo_files)
+        # Per-user quotas are enforced cluster-wide when claiming, so size them for the whole cluster
+        os.environ.setdefault('SCHEDULER_DEFAULT_USER_CONCURRENCY', str(math.ceil(args.workers * args.slots / args.users)))
+        os.environ.setdefault('HEALTH_PROBE_INTERVAL_SECONDS', '3600')
+        configure_environment(SimpleNamespace(concurrency=args.slots, users=args.users, cache=False,
+                                              agent_seconds=args.agent_seconds, agent_files=args.agent_files),
+                              root, make_fake_bin(root))
+        os.environ['TASK_DISPATCH'] = 'queue'
+        if not os.getenv('TASK_QUEUE_ENCRYPTION_KEY'):
+            from cryptography.fernet import Fernet
+            os.environ['TASK_QUEUE_ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+
+        db = install_fake_supabase()
+        server = FakeSupabaseServer(db)
+        from flask import Flask
+        from tasks import tasks_bp
+        from health import health_bp
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        users = [f'bench-user-{n}' for n in range(args.users)]
+        db.seed('users', [{'id': user_id, 'preferences': {}} for user_id in users])
+
+        # Every claim as (node, attempt): attempt > 1 means the task ran again after its node was lost
+        claims = defaultdict(list)
+        plaintext_tokens = set()
+        claim_tasks = db.functions['claim_tasks']
+
+        def recording_claim(client, params):
+            plaintext_tokens.update(row['task_id'] for row in client.tables.get('task_queue', [])
+                                    if row.get('github_token') == 'bench-token')
+            rows, written = claim_tasks(client, params)
+            for row in rows:
+                claims[row['task_id']].append((params['p_node_id'], row['attempts']))
+            return rows, written
+        db.functions['claim_tasks'] = recording_claim
+
+        finished = {}
+        all_done = threading.Condition()
+
+        def on_write(table, row):
+            if table == 'tasks' and row.get('status') in TERMINAL_STATUSES:
+                with all_done:
+                    finished.setdefault(row['id'], (time.monotonic(), row['status']))
+                    all_done.notify_all()
+        db.on_write.append(on_write)
+
+        app = Flask(__name__)
+        app.register_blueprint(tasks_bp)
+        app.register_blueprint(health_bp)
+
+        cluster = Cluster(db, server.url, root, args)
+        cluster.start(args.workers)
+        cluster.wait_registered(args.startup_timeout)
+        print(f"🛠️ {args.workers} worker node(s) registered, {args.slots} slot(s) each")
+
+        def submit(n: int):
+            started = time.monotonic()
+            response = app.test_client().post('/start-task', headers={'X-User-ID': users[n % len(users)]}, json={
+                'prompt': f'Cluster change {n}', 'repo_url': repo_url, 'branch': 'main',
+                'github_token': 'bench-token', 'model': 'claude', 'use_cache': False
+            })
+            body = response.get_json() or {}
+            if response.status_code != 200:
+                raise RuntimeError(f"/start-task returned {response.status_code}: {body}")
+            return body['task_id'], started
+
+        print(f"🏁 Submitting {args.tasks} tasks across {args.users} user(s)")
+        wall_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            submitted = list(pool.map(submit, range(args.tasks)))
+
+        node_ids = sorted(cluster.processes)
+        drained, killed = node_ids[:args.drain], node_ids[args.drain:args.drain + args.kill]
+        events = {}
+        deadline = time.monotonic() + args.timeout
+        with all_done:
+            while len(finished) < len(submitted) and time.monotonic() < deadline:
+                all_done.wait(0.2)
+                if drained and 'drain' not in events and len(finished) >= args.tasks / 3:
+                    events['drain'] = {node_id: cluster.held_by(node_id) for node_id in drained}
+                    for node_id in drained:
+                        cluster.signal(node_id, signal.SIGTERM)
+                    print(f"🚰 SIGTERM to {', '.join(drained)} after {len(finished)} tasks")
+                if killed and 'kill' not in events and len(finished) >= args.tasks / 2:
+                    events['kill'] = {node_id: cluster.held_by(node_id) for node_id in killed}
+                    for node_id in killed:
+                        cluster.signal(node_id, signal.SIGKILL)
+                    print(f"💥 SIGKILL to {', '.join(killed)} holding {sum(len(t) for t in events['kill'].values())} task(s)")
+        wall = time.monotonic() - wall_start
+
+        with app.test_client() as client:
+            capacity = client.get('/capacity').get_json()['admission']
+        drained_codes = {node_id: cluster.processes[node_id].poll() for node_id in drained}
+        exit_codes = cluster.stop(timeout=30)
+
+        latencies, statuses = [], Counter()
+        for task_id, started in submitted:
+            ended, status = finished.get(task_id, (None, 'timeout'))
+            statuses[status] += 1
+            if status == 'completed':
+                latencies.append(ended - started)
+        completed_by = Counter((row.get('execution_metadata') or {}).get('worker_node')
+                               for row in db.tables.get('tasks', []) if row.get('status') == 'completed')
+
+        problems = []
+        if plaintext_tokens:
+            problems.append(f"tasks {sorted(plaintext_tokens)} stored their GitHub token unencrypted")
+        for node_id in drained:
+            if drained_codes[node_id] != 0:
+                problems.append(f"{node_id} did not exit cleanly after SIGTERM (exit {drained_codes[node_id]})")
+            # Draining hands back unstarted tasks and finishes the rest; nothing may be lost and rerun
+            reruns = [task_id for task_id in events.get('drain', {}).get(node_id, [])
+                      if any(attempt > 1 for _, attempt in claims[task_id])]
+            if reruns:
+                problems.append(f"{node_id} was draining but tasks {reruns} had to run again")
+        for node_id, task_ids in events.get('kill', {}).items():
+            stranded = [task_id for task_id in task_ids if finished.get(task_id, (None, ''))[1] != 'completed']
+            if stranded:
+                problems.append(f"tasks {stranded} held by killed {node_id} did not complete elsewhere")
+        for node_id, code in exit_codes.items():
+            if node_id not in killed and code != 0:
+                problems.append(f"{node_id} exited with {code}:\n{cluster.tail(node_id)}")
+        if killed and db.tables.get('task_queue'):
+            # A node killed between finishing a task and deleting its row leaves the row behind; the next
+            # claim round after its lease lapses drops rows of finished tasks, so wait for one before checking
+            time.sleep(args.lease + 1)
+            db._call('claim_tasks', {
+                'p_node_id': 'bench-sweep', 'p_agents': ['claude'], 'p_limit': 0, 'p_lease_seconds': args.lease,
+                'p_max_attempts': 2, 'p_aging_seconds': 60.0, 'p_default_user_concurrency': 1
+            })
+        if db.tables.get('task_queue'):
+            problems.append(f"{len(db.tables['task_queue'])} row(s) left in task_queue")
+
+        return {
+            'config': {
+                'workers': args.workers, 'slots': args.slots, 'tasks': args.tasks, 'users': args.users,
+                'agent_seconds': args.agent_seconds, 'repo_files': args.repo_files,
+                'drain': args.drain, 'kill': args.kill, 'lease': args.lease
+            },
+            'throughput': {
+                'wall_seconds': round(wall, 3),
+                'tasks_per_second': round(statuses['completed'] / wall, 4) if wall else 0.0
+            },
+            'latency': latency_summary(latencies),
+            'statuses': dict(statuses),
+            'completed_by_node': dict(sorted(completed_by.items(), key=lambda item: str(item[0]))),
+            'claimed_again': sum(1 for task_claims in claims.values() if any(attempt > 1 for _, attempt in task_claims)),
+            'handed_back': sum(1 for task_claims in claims.values() if len(task_claims) > 1 and all(attempt == 1 for _, attempt in task_claims)),
+            'nodes_by_status': capacity['nodes_by_status'],
+            'rpc_calls': {name: count for (table, name), count in db.queries.items() if table == 'rpc'},
+            'problems': problems
+        }
+    finally:
+        if cluster:
+            for process in cluster.processes.values():
+                if process.poll() is None:
+                    process.kill()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def print_report(results: dict):
+    print(f"\n📊 {results['throughput']['tasks_per_second']:.3f} tasks/s over {results['throughput']['wall_seconds']}s "
+          f"({', '.join(f'{k}: {v}' for k, v in sorted(results['statuses'].items()))})")
+    latency = results['latency']
+    print(f"   end-to-end  p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  max {latency['max']:.3f}s")
+    print(f"   completed by node: {', '.join(f'{node}: {count}' for node, count in results['completed_by_node'].items())}")
+    print(f"   handed back by draining nodes: {results['handed_back']}, claimed again after a lost node: {results['claimed_again']}")
+    print(f"   nodes at the end: {', '.join(f'{k}: {v}' for k, v in results['nodes_by_status'].items() if v)}")
+    print(f"   RPCs: {', '.join(f'{k}: {v}' for k, v in sorted(results['rpc_calls'].items()))}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--worker', metavar='DB_URL', help=argparse.SUPPRESS)
+    parser.add_argument('--workers', type=int, default=3, help='Worker processes to start')
+    parser.add_argument('--slots', type=int, default=2, help='Tasks each worker runs at once (WORKER_MAX_TASKS)')
+    parser.add_argument('--tasks', type=int, default=30, help='Tasks to submit')
+    parser.add_argument('--users', type=int, default=3, help='Users the tasks are spread across')
+    parser.add_argument('--agent-seconds', type=float, default=0.5, help='Time the fake agent spends per task')
+    parser.add_argument('--agent-files', type=int, default=3, help='Files the fake agent edits per task')
+    parser.add_argument('--repo-files', type=int, default=100, help='Files in the benchmark repository')
+    parser.add_argument('--drain', type=int, default=0, help='Workers to SIGTERM once a third of the tasks are done')
+    parser.add_argument('--kill', type=int, default=0, help='Workers to SIGKILL at the halfway point')
+    parser.add_argument('--heartbeat', type=float, default=1.0, help='WORKER_HEARTBEAT_SECONDS for the workers')
+    parser.add_argument('--lease', type=int, default=5, help='WORKER_LEASE_SECONDS for the workers')
+    parser.add_argument('--poll', type=float, default=0.2, help='WORKER_POLL_INTERVAL_SECONDS for the workers')
+    parser.add_argument('--startup-timeout', type=float, default=60, help='Seconds to wait for every worker to register')
+    parser.add_argument('--timeout', type=float, default=600, help='Give up waiting for tasks after this many seconds')
+    parser.add_argument('--verbose', action='store_true', help='Keep the API\'s INFO logging')
+    add_baseline_arguments(parser, str(BASELINE))
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker)
+        return 0
+    if args.drain + args.kill >= args.workers:
+        parser.error('--drain and --kill must leave at least one worker running')
+
+    results = run(args)
+    print_report(results)
+    for problem in results['problems']:
+        print(f"❌ {problem}")
+    if results['statuses'].get('completed', 0) != args.tasks:
+        print(f"❌ Only {results['statuses'].get('completed', 0)} of {args.tasks} tasks completed")
+        return 1
+    if results['problems']:
+        return 1
+    return finish(results, args, HIGHER_IS_BETTER, LOWER_IS_BETTER)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Shared reporting and baseline comparison for the benchmark scripts"""
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 6) if values else 0.0,
+        'p50': round(percentile(values, 0.50), 6),
+        'p95': round(percentile(values, 0.95), 6),
+        'p99': round(percentile(values, 0.99), 6),
+        'max': round(max(values), 6) if values else 0.0
+    }
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Nested result dict to {'a.b.c': number} for baseline comparison"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_to_baseline(results: Dict, baseline_path: Path, tolerance: float,
+                        higher_is_better: Iterable[str] = (), lower_is_better: Iterable[str] = ()) -> List[str]:
+    """
+    Regressions of ``results`` against the stored baseline, as messages.
+
+    Only the listed metrics are checked; a metric regresses when it is more than
+    ``tolerance`` (a fraction) worse than its baseline value.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())
+    if baseline.get('config') != results.get('config'):
+        print(f"⚠️  Baseline was recorded with a different config: {baseline.get('config')}")
+    current, stored = flatten(results), flatten(baseline)
+
+    regressions = []
+    for metric in higher_is_better:
+        if metric in current and stored.get(metric):
+            if current[metric] < stored[metric] * (1 - tolerance):
+                regressions.append(f'{metric}: {current[metric]:.4g} < baseline {stored[metric]:.4g}')
+    for metric in lower_is_better:
+        if metric in current and stored.get(metric):
+            if current[metric] > stored[metric] * (1 + tolerance):
+                regressions.append(f'{metric}: {current[metric]:.4g} > baseline {stored[metric]:.4g}')
+    return regressions
+
+
+def save_baseline(results: Dict, baseline_path: Path):
+    Path(baseline_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(baseline_path).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    print(f"💾 Baseline written to {baseline_path}")
+
+
+def finish(results: Dict, args, higher_is_better: Iterable[str] = (), lower_is_better: Iterable[str] = ()) -> int:
+    """Write/compare results according to the common CLI flags; returns the process exit code"""
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        return 0
+    if not Path(args.baseline).exists():
+        if args.check:
+            print(f"❌ No baseline at {args.baseline}; record one with --save-baseline")
+            return 1
+        print(f"ℹ️  No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    regressions = compare_to_baseline(results, args.baseline, args.tolerance, higher_is_better, lower_is_better)
+    for message in regressions:
+        print(f"❌ Regression: {message}")
+    if not regressions:
+        print(f"✅ Within {args.tolerance:.0%} of baseline {args.baseline}")
+    return 1 if regressions else 0
+
+
+def add_baseline_arguments(parser, default_baseline: str, default_tolerance: float = 0.25):
+    parser.add_argument('--baseline', default=default_baseline, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Record this run as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Fail when there is no baseline to compare against')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance,
+                        help='Allowed fractional regression before failing (default %(default)s)')
+    parser.add_argument('--output', help='Also write the results JSON here')
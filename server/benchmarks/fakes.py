@@ -0,0 +1,543 @@
+"""
+Local stand-ins for the services a task touches: an in-memory Supabase client
+(optionally shared between processes over HTTP), a bare git remote on disk,
+deterministic agent CLIs and a GitHub repository.
+"""
+import os
+import json
+import math
+import base64
+import stat
+import threading
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import unquote
+
+
+class FakeAPIResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _column_value(row: Dict, column: str):
+    """Resolve a PostgREST column reference such as ``execution_metadata->>base_commit``"""
+    if '->' not in column:
+        return row.get(column)
+    parts = column.replace('->>', '->').split('->')
+    value = row.get(parts[0])
+    for key in parts[1:]:
+        value = value.get(key) if isinstance(value, dict) else None
+    if '->>' in column and value is not None:
+        return value if isinstance(value, str) else json.dumps(value)
+    return value
+
+
+def _project(row: Dict, columns: str) -> Dict:
+    if columns.strip() == '*':
+        return row
+    projected = {}
+    for column in (c.strip() for c in columns.split(',')):
+        alias, _, source = column.rpartition(':')
+        source = source.strip()
+        projected[alias.strip() or source.replace('->>', '->').split('->')[-1]] = _column_value(row, source)
+    return projected
+
+
+def _matches(row: Dict, condition) -> bool:
+    operator, column, expected = condition
+    value = _column_value(row, column)
+    if operator == 'eq':
+        return value == expected
+    if operator == 'in':
+        return value in expected
+    if operator == 'is':
+        return value is None if expected in (None, 'null') else value is expected
+    raise ValueError(f"Unsupported filter: {operator}")
+
+
+class FakeQuery:
+    """The subset of postgrest-py's builder that DatabaseOperations uses"""
+
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.payload = None
+        # (operator, column, value): plain data, so a query can be sent to a FakeSupabaseServer
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.ordering = None
+        self.max_rows = None
+        self.expect_single = False
+
+    def select(self, columns: str = '*', **kwargs):
+        self.operation, self.columns = 'select', columns
+        return self
+
+    def insert(self, data):
+        self.operation, self.payload = 'insert', data
+        return self
+
+    def update(self, data):
+        self.operation, self.payload = 'update', data
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(('eq', column, str(value) if '->>' in column else value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(('in', column, list(values)))
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(('is', column, value))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.ordering = (column, desc)
+        return self
+
+    def limit(self, count, **kwargs):
+        self.max_rows = count
+        return self
+
+    def single(self):
+        self.expect_single = True
+        return self
+
+    def execute(self) -> FakeAPIResponse:
+        return self.client._execute(self)
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in
+                ('table', 'operation', 'columns', 'payload', 'filters', 'ordering', 'max_rows', 'expect_single')}
+
+
+class FakeRPC:
+    def __init__(self, client, name: str, params: Dict):
+        self.client, self.name, self.params = client, name, params
+
+    def execute(self) -> FakeAPIResponse:
+        return FakeAPIResponse(self.client._call(self.name, self.params))
+
+
+class FakeSupabase:
+    """
+    In-memory Supabase client.
+
+    Rows round-trip through JSON like they do over PostgREST, so payload sizes
+    and copy costs are realistic. ``queries`` counts executed statements per
+    (table, operation), ``thread_counters()`` gives the statements and bytes
+    returned on the calling thread (i.e. per request), and ``on_write``
+    callbacks see every inserted or updated row. ``rpc()`` runs Python
+    versions of the SQL functions in ``FUNCTIONS`` (db/worker_queue.sql).
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict]] = {}
+        self.functions: Dict[str, Callable] = dict(FUNCTIONS)
+        self.queries: Counter = Counter()
+        self.response_bytes = 0
+        self.on_write: List[Callable[[str, Dict], None]] = []
+        self._ids: Counter = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    def seed(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Insert rows directly, without counting queries; returns the stored rows"""
+        with self._lock:
+            return [self._insert_row(table, dict(row)) for row in rows]
+
+    def _insert_row(self, table: str, row: Dict) -> Dict:
+        if table in COLUMN_DEFAULTS:
+            row = {**COLUMN_DEFAULTS[table], 'enqueued_at': _now().isoformat(), **row}
+        else:
+            if 'id' not in row:
+                self._ids[table] += 1
+                row['id'] = self._ids[table]
+            now = datetime.utcnow().isoformat()
+            row.setdefault('created_at', now)
+            row.setdefault('updated_at', now)
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def _execute(self, query: FakeQuery) -> FakeAPIResponse:
+        written = []
+        with self._lock:
+            self.queries[(query.table, query.operation)] += 1
+            rows = self.tables.setdefault(query.table, [])
+            if query.operation == 'insert':
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                result = [self._insert_row(query.table, json.loads(json.dumps(row))) for row in payload]
+                written = result
+            else:
+                matched = [row for row in rows if all(_matches(row, condition) for condition in query.filters)]
+                if query.operation == 'update':
+                    changes = json.loads(json.dumps(query.payload))
+                    for row in matched:
+                        row.update(changes)
+                    result = written = matched
+                elif query.operation == 'delete':
+                    self.tables[query.table] = [row for row in rows if row not in matched]
+                    result = matched
+                else:
+                    if query.ordering:
+                        column, desc = query.ordering
+                        matched.sort(key=lambda row: (_column_value(row, column) is None, _column_value(row, column) or ''),
+                                     reverse=desc)
+                    if query.max_rows is not None:
+                        matched = matched[:query.max_rows]
+                    result = [_project(row, query.columns) for row in matched]
+            encoded = json.dumps(result)
+            self.response_bytes += len(encoded)
+            data = json.loads(encoded)
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+        self._local.bytes = getattr(self._local, 'bytes', 0) + len(encoded)
+
+        for row in written:
+            for callback in self.on_write:
+                callback(query.table, row)
+
+        if query.expect_single:
+            if len(data) != 1:
+                raise Exception(f"JSON object requested, multiple (or no) rows returned ({len(data)})")
+            data = data[0]
+        return FakeAPIResponse(data)
+
+    def _call(self, name: str, params: Dict):
+        with self._lock:
+            self.queries[('rpc', name)] += 1
+            data, written = self.functions[name](self, params)
+            data = json.loads(json.dumps(data))
+        for table, row in written:
+            for callback in self.on_write:
+                callback(table, row)
+        return data
+
+    def reset_counters(self):
+        with self._lock:
+            self.queries.clear()
+            self.response_bytes = 0
+
+    def thread_counters(self, reset: bool = False) -> tuple:
+        """(statements, response bytes) executed on this thread since the last reset"""
+        counters = (getattr(self._local, 'queries', 0), getattr(self._local, 'bytes', 0))
+        if reset:
+            self._local.queries = self._local.bytes = 0
+        return counters
+
+
+def install_fake_supabase(client=None) -> FakeSupabase:
+    """Point DatabaseOperations at an in-memory (or RemoteFakeSupabase) client instead of the configured project"""
+    import database
+    client = client or FakeSupabase()
+    database.supabase.set(client)
+    return client
+
+
+# -- db/worker_queue.sql ---------------------------------------------------
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+COLUMN_DEFAULTS = {
+    'task_queue': {'project_id': None, 'agent': 'claude', 'priority': 'normal', 'priority_rank': 1,
+                   'claimed_by': None, 'claimed_at': None, 'lease_expires_at': None,
+                   'attempts': 0, 'cancel_requested': False},
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def _claim_tasks(db: FakeSupabase, params: Dict):
+    """claim_tasks(): same cleanup, quota and ordering rules, made atomic by the client lock"""
+    now = _now()
+    tasks = {row['id']: row for row in db.tables.get('tasks', [])}
+    users = {row['id']: row for row in db.tables.get('users', [])}
+    written = []
+
+    def leased(row):
+        return row['claimed_by'] is not None and _timestamp(row['lease_expires_at']) >= now
+
+    def fail_task(task):
+        task.update(status='failed', error='Worker node lost while running the task',
+                    completed_at=now.isoformat(), updated_at=now.isoformat())
+        written.append(('tasks', task))
+
+    queue = []
+    for row in db.tables.get('task_queue', []):
+        task = tasks.get(row['task_id']) or {}
+        expired = row['claimed_by'] is not None and not leased(row)
+        if expired and (row['attempts'] >= params['p_max_attempts'] or row['cancel_requested']):
+            if task.get('status') in ('pending', 'running'):
+                fail_task(task)
+            continue
+        if task.get('status') in TERMINAL_STATUSES and (row['claimed_by'] is None or expired):
+            continue
+        queue.append(row)
+    db.tables['task_queue'] = queue
+
+    aging = params['p_aging_seconds']
+    claimed = []
+    while len(claimed) < params['p_limit']:
+        running = Counter(row['user_id'] for row in queue if leased(row))
+        candidates = []
+        for row in queue:
+            if leased(row) or row['cancel_requested'] or row['agent'] not in params['p_agents']:
+                continue
+            scheduler = ((users.get(row['user_id']) or {}).get('preferences') or {}).get('scheduler') or {}
+            if running[row['user_id']] >= int(scheduler.get('maxConcurrency') or params['p_default_user_concurrency']):
+                continue
+            enqueued = _timestamp(row['enqueued_at'])
+            effective = max(0, row['priority_rank'] - math.floor((now - enqueued).total_seconds() / aging))
+            candidates.append((effective, running[row['user_id']], row['priority_rank'] * aging + enqueued.timestamp(), row))
+        if not candidates:
+            break
+        row = min(candidates, key=lambda candidate: candidate[:3])[3]
+        token = row['github_token']
+        row.update(claimed_by=params['p_node_id'], claimed_at=now.isoformat(), attempts=row['attempts'] + 1,
+                   lease_expires_at=(now + timedelta(seconds=params['p_lease_seconds'])).isoformat())
+        if row['attempts'] >= params['p_max_attempts']:
+            row['github_token'] = None
+        task = tasks.get(row['task_id'])
+        if task is not None:
+            task['execution_metadata'] = {**(task.get('execution_metadata') or {}), 'worker_node': params['p_node_id']}
+        claimed.append({**row, 'github_token': token})
+    return claimed, written
+
+
+def _worker_heartbeat(db: FakeSupabase, params: Dict):
+    now = _now()
+    nodes = db.tables.setdefault('worker_nodes', [])
+    node = next((row for row in nodes if row['node_id'] == params['p_node_id']), None)
+    fields = {
+        'hostname': params['p_hostname'], 'execution_mode': params['p_execution_mode'], 'agents': params['p_agents'],
+        'capacity': params['p_capacity'], 'running_tasks': params['p_running'], 'last_heartbeat_at': now.isoformat()
+    }
+    if node is None:
+        node = {'node_id': params['p_node_id'], 'status': params.get('p_status') or 'active', 'started_at': now.isoformat(), **fields}
+        nodes.append(node)
+    else:
+        node.update(fields)
+        if params.get('p_status'):
+            node['status'] = params['p_status']
+        if params.get('p_register'):
+            node['started_at'] = now.isoformat()
+
+    held = {row['task_id']: row for row in db.tables.get('task_queue', []) if row['claimed_by'] == params['p_node_id']}
+    task_ids = params['p_task_ids'] or []
+    for task_id in task_ids:
+        if task_id in held:
+            held[task_id]['lease_expires_at'] = (now + timedelta(seconds=params['p_lease_seconds'])).isoformat()
+    db.tables['worker_nodes'] = [row for row in nodes if now - _timestamp(row['last_heartbeat_at']) < timedelta(days=1)]
+    return {
+        'status': node['status'],
+        'cancel': [task_id for task_id in task_ids if task_id in held and held[task_id]['cancel_requested']],
+        'lost': [task_id for task_id in task_ids if task_id not in held],
+        'leader': min(
+            ((row['started_at'], row['node_id']) for row in db.tables['worker_nodes'] if row['status'] == 'active'
+             and now - _timestamp(row['last_heartbeat_at']) <= timedelta(seconds=params['p_lease_seconds'])),
+            default=(None, None)
+        )[1]
+    }, []
+
+
+FUNCTIONS = {'claim_tasks': _claim_tasks, 'worker_heartbeat': _worker_heartbeat}
+
+
+class FakeSupabaseServer:
+    """
+    Serves a FakeSupabase over HTTP so several processes (API and worker
+    nodes) share one database; connect with RemoteFakeSupabase(server.url).
+    """
+
+    def __init__(self, client: FakeSupabase, host: str = '127.0.0.1', port: int = 0):
+        self.client = client
+        fake = client
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                try:
+                    if self.path == '/rpc':
+                        data = fake._call(request['name'], request['params'])
+                    else:
+                        query = FakeQuery(fake, request['table'])
+                        for key, value in request.items():
+                            setattr(query, key, value)
+                        query.filters = [tuple(condition) for condition in query.filters]
+                        query.ordering = tuple(query.ordering) if query.ordering else None
+                        data = fake._execute(query).data
+                    status, body = 200, {'data': data}
+                except Exception as e:
+                    status, body = 500, {'error': str(e)}
+                encoded = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f'http://{host}:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever, name='fake-supabase', daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class RemoteFakeSupabase:
+    """Supabase client for a FakeSupabaseServer running in another process"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self._local = threading.local()
+
+    def _post(self, path: str, payload: Dict):
+        import requests
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        body = session.post(self.url + path, json=payload, timeout=30).json()
+        if 'error' in body:
+            raise Exception(body['error'])
+        return body['data']
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    def _execute(self, query: FakeQuery) -> FakeAPIResponse:
+        return FakeAPIResponse(self._post('/query', query.to_dict()))
+
+    def _call(self, name: str, params: Dict):
+        return self._post('/rpc', {'name': name, 'params': params})
+
+
+def make_bare_remote(root: Path, files: int = 50, lines: int = 40, branch: str = 'main') -> str:
+    """Create a bare git repository with ``files`` text files on ``branch``; returns its path for cloning"""
+    work = root / 'remote-src'
+    bare = root / 'remote.git'
+    work.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        path = work / 'src' / f'module_{i:04d}.py'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(''.join(f'def function_{i}_{n}():\n    return {n}\n\n' for n in range(lines)))
+    env = {**os.environ, 'GIT_AUTHOR_NAME': 'bench', 'GIT_AUTHOR_EMAIL': 'bench@localhost',
+           'GIT_COMMITTER_NAME': 'bench', 'GIT_COMMITTER_EMAIL': 'bench@localhost'}
+    for args in (['git', 'init', '-q', '-b', branch], ['git', 'add', '.'], ['git', 'commit', '-q', '-m', 'Initial commit']):
+        subprocess.run(args, cwd=work, env=env, check=True)
+    subprocess.run(['git', 'clone', '-q', '--bare', str(work), str(bare)], check=True)
+    return str(bare)
+
+
+# Deterministic agent: edits files chosen by the prompt's hash after a fixed delay
+_FAKE_AGENT = '''#!/usr/bin/env python3
+import os, sys, time, hashlib
+prompt = sys.argv[-1] if len(sys.argv) > 1 else ''
+if prompt == '--version':
+    print('fake-agent 1.0'); sys.exit(0)
+time.sleep(float(os.environ.get('FAKE_AGENT_SECONDS', '0.5')))
+files = sorted(os.path.join(d, f) for d, _, fs in os.walk('.') if '.git' not in d for f in fs if f.endswith('.py'))
+seed = int(hashlib.sha256(prompt.encode()).hexdigest(), 16)
+for n in range(min(len(files), int(os.environ.get('FAKE_AGENT_FILES', '3')))):
+    with open(files[(seed + n * 7919) % len(files)], 'a') as f:
+        f.write('\\n# ' + prompt[:60] + '\\n' * int(os.environ.get('FAKE_AGENT_LINES', '20')))
+sys.stdout.write('x' * int(os.environ.get('FAKE_AGENT_OUTPUT_BYTES', '4096')) + '\\n')
+sys.exit(int(os.environ.get('FAKE_AGENT_EXIT_CODE', '0')))
+'''
+
+# Runs the command as the current user: the direct executor shells out via ``sudo -u claude-user``
+_FAKE_SUDO = '''#!/usr/bin/env python3
+import os, sys
+args, env = sys.argv[1:], dict(os.environ)
+while args:
+    if args[0] == '-u':
+        args = args[2:]
+    elif args[0].startswith('-'):
+        args = args[1:]
+    elif '=' in args[0] and not args[0].startswith('/'):
+        key, value = args[0].split('=', 1)
+        env[key] = value
+        args = args[1:]
+    else:
+        break
+os.execvpe(args[0], args, env)
+'''
+
+_NOOP = '#!/bin/sh\nexit 0\n'
+
+
+def make_fake_bin(root: Path) -> str:
+    """Directory with fake claude, codex, sudo and chown executables; prepend it to PATH"""
+    bin_dir = root / 'bin'
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, body in (('claude', _FAKE_AGENT), ('codex', _FAKE_AGENT), ('sudo', _FAKE_SUDO), ('chown', _NOOP)):
+        path = bin_dir / name
+        path.write_text(body)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return str(bin_dir)
+
+
+class FakeGitHubSession:
+    """
+    The REST calls apply_patch_to_github_repo makes through a GitHubSession,
+    answered from a dict of path -> content; unknown paths are new files.
+    """
+
+    def __init__(self, files: Dict[str, str] = None):
+        self.files = files or {}
+        self.blobs = 0
+
+    async def request(self, method, path, operation, json=None, params=None, headers=None, allow=()):
+        data, status = {'sha': '0' * 40}, 200
+        if operation == 'get_contents':
+            name = unquote(path.split('/contents/', 1)[1])
+            if name in self.files:
+                data = {'encoding': 'base64', 'content': base64.b64encode(self.files[name].encode('utf-8')).decode('ascii'), 'sha': '0' * 40}
+            else:
+                data, status = {'message': 'Not Found'}, 404
+        elif operation == 'get_commit':
+            data = {'sha': '0' * 40, 'commit': {'tree': {'sha': '1' * 40}}}
+        elif operation == 'create_blob':
+            self.blobs += 1
+            data = {'sha': f'{self.blobs:040x}'}
+        return SimpleNamespace(status=status, data=data, headers={}, body=b'')
+
+    async def get(self, path, operation, **kwargs):
+        return (await self.request('GET', path, operation, **kwargs)).data
+
+    async def post(self, path, operation, json, **kwargs):
+        return (await self.request('POST', path, operation, json=json, **kwargs)).data
+
+    async def patch(self, path, operation, json, **kwargs):
+        return (await self.request('PATCH', path, operation, json=json, **kwargs)).data
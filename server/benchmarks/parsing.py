@@ -0,0 +1,231 @@
+"""
+Micro-benchmarks for the log and patch parsing hot paths.
+
+Times ``parse_container_logs`` (the sentinel parser run on every Docker task's
+logs) and ``apply_patch_to_github_repo`` / ``apply_diff_to_content`` (run by
+/create-pr, here against an instant fake GitHub) on synthetic inputs: many-file patches, very large logs, very long
+lines and binary-ish content. Each case reports the median and best of
+``--repeat`` timed runs plus, from one extra run under tracemalloc, the peak
+memory allocated and the number of blocks still allocated afterwards. Peak
+memory is deterministic, so it makes a reliable CI guard; timings need a
+generous tolerance and only compare on the machine that recorded them.
+``--memory-only`` leaves timings out of the results, which is how CI runs it
+against the committed baselines/parsing.json.
+
+    cd server
+    python -m benchmarks.parsing                    # CI-sized inputs
+    python -m benchmarks.parsing --memory-only      # what CI checks
+    python -m benchmarks.parsing --profile full     # includes a 500 MB log
+    python -m benchmarks.parsing --case logs/long_lines --repeat 10
+"""
+import gc
+import sys
+import asyncio
+import time
+import random
+import logging
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+from .common import add_baseline_arguments, finish
+from .fakes import FakeGitHubSession, install_fake_supabase
+
+BASELINE = Path(__file__).parent / 'baselines' / 'parsing.json'
+
+# Input sizes per profile; 'full' matches the worst cases seen in production
+PROFILES = {
+    'ci': {'log_mb': 50, 'patch_files': 10000, 'long_line_mb': 2, 'file_lines': 100000},
+    'full': {'log_mb': 500, 'patch_files': 10000, 'long_line_mb': 16, 'file_lines': 1000000},
+}
+
+MB = 1024 * 1024
+
+
+def _code_lines(rng: random.Random, count: int, width: int = 60):
+    return [f"    value_{rng.getrandbits(24):06x} = compute({rng.randint(0, 10 ** 6)})".ljust(width) for _ in range(count)]
+
+
+def _binaryish(rng: random.Random, size: int) -> str:
+    """Random bytes as git would print them for a mis-detected binary file (NULs, CRs, stray newlines)"""
+    return rng.randbytes(size).decode('latin-1')
+
+
+def file_patch(name: str, body: str) -> str:
+    """One file's section of ``git format-patch`` output"""
+    count = body.count('\n') + 1
+    return (f'diff --git a/{name} b/{name}\nindex 1111111..2222222 100644\n--- a/{name}\n+++ b/{name}\n'
+            f'@@ -1,{count} +1,{count + 1} @@\n{body}')
+
+
+def hunk_body(rng: random.Random, lines: int) -> str:
+    code = _code_lines(rng, lines)
+    body = []
+    for n, line in enumerate(code):
+        body.append(('-' if n % 10 == 3 else '+' if n % 10 == 4 else ' ') + line)
+    return '\n'.join(body)
+
+
+def make_patch(files: int, body: str) -> str:
+    header = 'From 0123456789abcdef0123456789abcdef01234567 Mon Sep 17 00:00:00 2001\nSubject: [PATCH] Benchmark\n\n'
+    # The body is shared between files, so even huge patches build quickly and cheaply
+    return header + '\n'.join(file_patch(f'src/pkg_{n // 100:03d}/module_{n:05d}.py', body) for n in range(files)) + '\n--\n2.40.0\n'
+
+
+def make_container_log(files: int, before: str, after: str, patch_body: str, noise: str = '', noise_repeat: int = 0) -> str:
+    """Container output in the shape the v2 container script prints it"""
+    names = [f'src/pkg_{n // 100:03d}/module_{n:05d}.py' for n in range(files)]
+    patch = make_patch(files, patch_body)
+    parts = [noise] * noise_repeat + [
+        '=== PHASE extract 1700000000.000000000 ===',
+        'COMMIT_HASH=0123456789abcdef0123456789abcdef01234567',
+        '=== PATCH START ===', patch, '=== PATCH END ===',
+        '=== GIT DIFF START ===', patch, '=== GIT DIFF END ===',
+        '=== CHANGED FILES START ===', '\n'.join(names), '=== CHANGED FILES END ===',
+        '=== FILE CHANGES START ===',
+    ]
+    for name in names:
+        parts += [f'FILE: {name}', '=== BEFORE START ===', before, '=== BEFORE END ===',
+                  '=== AFTER START ===', after, '=== AFTER END ===', '=== FILE END ===']
+    parts += ['=== FILE CHANGES END ===', '=== PHASE done 1700000100.000000000 ===', 'Container work completed successfully']
+    return '\n'.join(parts)
+
+
+def build_cases(profile: Dict) -> Dict[str, Callable[[], tuple]]:
+    """Case name -> builder returning (callable under test, input size in bytes)"""
+    from utils.code_task_v2 import parse_container_logs
+    from tasks import apply_patch_to_github_repo, apply_diff_to_content
+
+    rng = random.Random(42)
+    task = {'chat_messages': [{'role': 'user', 'content': 'Benchmark change'}]}
+
+    def apply_patch(patch):
+        return asyncio.run(apply_patch_to_github_repo(FakeGitHubSession(), 'bench/repo', 'main', patch, task))
+
+    def logs_typical():
+        source = '\n'.join(_code_lines(rng, 200))
+        logs = make_container_log(50, source, source + '\n    extra = 1', hunk_body(rng, 40),
+                                  noise='Get:1 http://archive.ubuntu.com/ubuntu jammy InRelease [270 kB]', noise_repeat=20000)
+        return (lambda: parse_container_logs(logs)), len(logs)
+
+    def logs_large():
+        # Mostly install / agent output, as in real logs, plus a 200-file change set
+        noise = '\n'.join(f'npm http fetch GET 200 https://registry.npmjs.org/pkg-{n} {n % 97}ms' for n in range(1000))
+        source = '\n'.join(_code_lines(rng, 400))
+        logs = make_container_log(200, source, source, hunk_body(rng, 80), noise=noise,
+                                  noise_repeat=max(1, profile['log_mb'] * MB // (len(noise) + 1)))
+        return (lambda: parse_container_logs(logs)), len(logs)
+
+    def logs_long_lines():
+        # Minified bundles and lockfiles: a handful of lines, each megabytes long
+        line = 'x' * (profile['long_line_mb'] * MB)
+        logs = make_container_log(8, line, line + ';', '+' + line)
+        return (lambda: parse_container_logs(logs)), len(logs)
+
+    def logs_binaryish():
+        blob = _binaryish(rng, 256 * 1024)
+        logs = make_container_log(40, blob, blob, blob)
+        return (lambda: parse_container_logs(logs)), len(logs)
+
+    def patch_many_files():
+        patch = make_patch(profile['patch_files'], hunk_body(rng, 12))
+        return (lambda: apply_patch(patch)), len(patch)
+
+    def patch_long_lines():
+        patch = make_patch(8, '+' + 'x' * (profile['long_line_mb'] * MB))
+        return (lambda: apply_patch(patch)), len(patch)
+
+    def patch_binaryish():
+        patch = make_patch(40, '+' + _binaryish(rng, 256 * 1024))
+        return (lambda: apply_patch(patch)), len(patch)
+
+    def diff_large_file():
+        original = '\n'.join(_code_lines(rng, profile['file_lines']))
+        diff_lines = file_patch('src/big.py', hunk_body(rng, profile['file_lines'])).split('\n')[4:]
+        return (lambda: apply_diff_to_content(original, diff_lines, 'src/big.py')), len(original)
+
+    return {
+        'logs/typical': logs_typical,
+        'logs/large': logs_large,
+        'logs/long_lines': logs_long_lines,
+        'logs/binaryish': logs_binaryish,
+        'patch/many_files': patch_many_files,
+        'patch/long_lines': patch_long_lines,
+        'patch/binaryish': patch_binaryish,
+        'diff/large_file': diff_large_file,
+    }
+
+
+def measure(run: Callable, repeat: int) -> Dict:
+    """Median/best wall time over ``repeat`` runs, then peak and retained traced allocations of one more run"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        retained = len(tracemalloc.take_snapshot().traces)
+    finally:
+        tracemalloc.stop()
+    return {'median_seconds': round(statistics.median(times), 6), 'best_seconds': round(min(times), 6),
+            'peak_bytes': peak, 'retained_blocks': retained}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='ci', help='Input sizes (default %(default)s)')
+    parser.add_argument('--case', action='append', help='Only run these cases (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case')
+    parser.add_argument('--verbose', action='store_true', help='Keep the parsers\' logging')
+    parser.add_argument('--memory-only', action='store_true',
+                        help='Record and compare only the tracemalloc metrics, which do not vary between machines')
+    add_baseline_arguments(parser, str(BASELINE), default_tolerance=0.5)
+    args = parser.parse_args(argv)
+
+    install_fake_supabase()
+    cases = build_cases(PROFILES[args.profile])
+    if not args.verbose:
+        # Measure parsing, not log formatting and I/O
+        logging.disable(logging.WARNING)
+    unknown = set(args.case or []) - set(cases)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}; choose from {', '.join(cases)}")
+
+    results = {'config': {'profile': args.profile, 'python': '.'.join(sys.version.split('.')[:2]),
+                          'memory_only': args.memory_only}, 'cases': {}}
+    print(f"   {'case':<20}{'input MB':>10}{'median s':>10}{'best s':>10}{'MB/s':>9}{'peak MB':>10}{'peak/input':>12}")
+    for name, build in cases.items():
+        if args.case and name not in args.case:
+            continue
+        run, size = build()
+        stats = measure(run, args.repeat)
+        stats['input_bytes'] = size
+        results['cases'][name] = stats
+        del run
+        gc.collect()
+        print(f"   {name:<20}{size / MB:>10.1f}{stats['median_seconds']:>10.3f}{stats['best_seconds']:>10.3f}"
+              f"{size / MB / max(stats['best_seconds'], 1e-9):>9.1f}{stats['peak_bytes'] / MB:>10.1f}"
+              f"{stats['peak_bytes'] / max(size, 1):>12.2f}")
+
+    tracked = results['cases']
+    gated = ('peak_bytes',)
+    if args.memory_only:
+        for stats in tracked.values():
+            del stats['median_seconds'], stats['best_seconds']
+    else:
+        gated += ('median_seconds',)
+    # retained_blocks is recorded for review only: a few blocks of interpreter noise would trip a ratio check
+    return finish(results, args, lower_is_better=[f'cases.{name}.{metric}' for name in tracked for metric in gated])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
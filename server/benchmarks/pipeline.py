@@ -0,0 +1,185 @@
+"""
+End-to-end task pipeline benchmark.
+
+Submits tasks through the real ``/start-task`` endpoint, fair-share scheduler
+and direct executor, against an in-memory Supabase, a bare git remote on local
+disk and a deterministic fake agent CLI, so a run needs no network, no
+credentials and no containers. Reports throughput, end-to-end latency percentiles
+(submit to final status) and the per-phase breakdown the executors record, and
+exits non-zero when a tracked metric regresses past the stored baseline.
+Timings depend on the machine, so baselines/pipeline.json is not committed:
+record it on the machine that runs the comparison, and pass ``--check`` there
+so a missing baseline fails instead of passing silently.
+
+    cd server
+    python -m benchmarks.pipeline --tasks 40 --concurrency 8 --save-baseline   # (re)generate the baseline
+    python -m benchmarks.pipeline --tasks 40 --concurrency 8 --check
+"""
+import os
+import sys
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .common import add_baseline_arguments, finish, latency_summary
+from .fakes import install_fake_supabase, make_bare_remote, make_fake_bin
+
+BASELINE = Path(__file__).parent / 'baselines' / 'pipeline.json'
+TERMINAL_STATUSES = {'completed', 'failed', 'cancelled'}
+
+HIGHER_IS_BETTER = ('throughput.tasks_per_second',)
+LOWER_IS_BETTER = ('latency.p50', 'latency.p95', 'latency.p99')
+
+
+def configure_environment(args, root: Path, bin_dir: str):
+    """Environment read at import time by the modules under test; explicit env vars still win"""
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    defaults = {
+        'EXECUTION_MODE': 'direct',
+        'ANTHROPIC_API_KEY': 'bench-key',
+        'SCHEDULER_DEFAULT_USER_CONCURRENCY': str(math.ceil(args.concurrency / args.users)),
+        'SCHEDULER_MAX_WORKERS': str(args.concurrency),
+        # The scheduler, not host capacity, bounds concurrency in the benchmark
+        'TASK_CPUS': '0',
+        'TASK_MEMORY': '0',
+        'CLAUDE_MAX_CONCURRENT': '0',
+        'AGENT_SEMAPHORE_DIR': str(root / 'semaphores'),
+        'RESULT_CACHE_ENABLED': 'true' if args.cache else 'false',
+        'FAKE_AGENT_SECONDS': str(args.agent_seconds),
+        'FAKE_AGENT_FILES': str(args.agent_files),
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def run(args) -> dict:
+    root = Path(tempfile.mkdtemp(prefix='async-code-bench-'))
+    try:
+        repo_url = make_bare_remote(root, files=args.repo_files)
+        configure_environment(args, root, make_fake_bin(root))
+
+        db = install_fake_supabase()
+        from flask import Flask
+        from tasks import tasks_bp
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        users = [f'bench-user-{n}' for n in range(args.users)]
+        db.seed('users', [{'id': user_id, 'preferences': {}} for user_id in users])
+
+        finished = {}
+        all_done = threading.Condition()
+
+        def on_write(table, row):
+            if table == 'tasks' and row.get('status') in TERMINAL_STATUSES:
+                with all_done:
+                    finished.setdefault(row['id'], (time.monotonic(), row['status']))
+                    all_done.notify_all()
+        db.on_write.append(on_write)
+
+        app = Flask(__name__)
+        app.register_blueprint(tasks_bp)
+
+        def submit(n: int):
+            user_id = users[n % len(users)]
+            started = time.monotonic()
+            response = app.test_client().post('/start-task', headers={'X-User-ID': user_id}, json={
+                'prompt': f'Benchmark change {n}' if not args.cache else 'Benchmark change',
+                'repo_url': repo_url,
+                'branch': 'main',
+                'github_token': 'bench-token',
+                'model': args.agent,
+                'use_cache': args.cache
+            })
+            body = response.get_json() or {}
+            if response.status_code != 200:
+                raise RuntimeError(f"/start-task returned {response.status_code}: {body}")
+            return body['task_id'], started, time.monotonic() - started
+
+        print(f"🏁 Submitting {args.tasks} tasks across {args.users} user(s) at concurrency {args.concurrency}")
+        wall_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.submitters) as pool:
+            submitted = list(pool.map(submit, range(args.tasks)))
+
+        deadline = time.monotonic() + args.timeout
+        with all_done:
+            while len(finished) < len(submitted) and time.monotonic() < deadline:
+                all_done.wait(1.0)
+        wall = time.monotonic() - wall_start
+
+        latencies, statuses = [], {}
+        for task_id, started, _ in submitted:
+            ended, status = finished.get(task_id, (None, 'timeout'))
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 'completed':
+                latencies.append(ended - started)
+
+        from utils.phase_timer import aggregate_timings
+        timings = [{'timings': (row.get('execution_metadata') or {}).get('timings')} for row in db.tables.get('tasks', [])]
+        breakdown = aggregate_timings([t for t in timings if t['timings']])
+
+        return {
+            'config': {
+                'tasks': args.tasks, 'concurrency': args.concurrency, 'users': args.users, 'agent': args.agent,
+                'agent_seconds': args.agent_seconds, 'repo_files': args.repo_files, 'cache': args.cache
+            },
+            'throughput': {
+                'wall_seconds': round(wall, 3),
+                'tasks_per_second': round(statuses.get('completed', 0) / wall, 4) if wall else 0.0
+            },
+            'latency': latency_summary(latencies),
+            'submit_latency': latency_summary([elapsed for _, _, elapsed in submitted]),
+            'statuses': statuses,
+            'phases': breakdown['phases'],
+            'db_queries': sum(db.queries.values())
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def print_report(results: dict):
+    print(f"\n📊 {results['throughput']['tasks_per_second']:.3f} tasks/s over {results['throughput']['wall_seconds']}s "
+          f"({', '.join(f'{k}: {v}' for k, v in sorted(results['statuses'].items()))})")
+    latency = results['latency']
+    print(f"   end-to-end  p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    submit = results['submit_latency']
+    print(f"   /start-task p50 {submit['p50'] * 1000:.1f}ms  p95 {submit['p95'] * 1000:.1f}ms  p99 {submit['p99'] * 1000:.1f}ms")
+    print(f"   {results['db_queries']} DB queries")
+    if results['phases']:
+        print(f"\n   {'phase':<18}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}")
+        for name, stats in results['phases'].items():
+            print(f"   {name:<18}{stats['mean']:>9.3f}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['max']:>9.3f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tasks', type=int, default=20, help='Tasks to submit')
+    parser.add_argument('--concurrency', type=int, default=4, help='Tasks executing at once')
+    parser.add_argument('--users', type=int, default=1, help='Users the tasks are spread across')
+    parser.add_argument('--submitters', type=int, default=8, help='Client threads calling /start-task')
+    parser.add_argument('--agent', choices=['claude', 'codex'], default='claude')
+    parser.add_argument('--agent-seconds', type=float, default=0.5, help='Time the fake agent spends per task')
+    parser.add_argument('--agent-files', type=int, default=3, help='Files the fake agent edits per task')
+    parser.add_argument('--repo-files', type=int, default=200, help='Files in the benchmark repository')
+    parser.add_argument('--cache', action='store_true', help='Submit identical prompts with the result cache on')
+    parser.add_argument('--timeout', type=float, default=600, help='Give up waiting for tasks after this many seconds')
+    parser.add_argument('--verbose', action='store_true', help='Keep the server\'s INFO logging')
+    add_baseline_arguments(parser, str(BASELINE))
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print_report(results)
+    if results['statuses'].get('completed', 0) != args.tasks:
+        print(f"❌ Only {results['statuses'].get('completed', 0)} of {args.tasks} tasks completed")
+        return 1
+    return finish(results, args, HIGHER_IS_BETTER, LOWER_IS_BETTER)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Load test for the endpoints browser tabs poll.
+
+Seeds an in-memory Supabase with tasks carrying production-sized payloads
+(multi-KB diffs and patches, long chat histories, agent stdout) and runs N
+virtual users against the real ``tasks`` blueprint. Each user repeatedly
+fetches ``/tasks`` and polls ``/task-status/<id>`` for the tasks it is
+watching. Per endpoint it reports throughput, latency percentiles, response
+bytes and the DB statements (and bytes read from the DB) each request cost,
+and exits non-zero when a tracked metric regresses past the stored baseline.
+
+    cd server
+    python -m benchmarks.polling --users 50 --duration 20
+    python -m benchmarks.polling --transport inproc --users 50 --duration 20
+"""
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+from .common import add_baseline_arguments, finish, latency_summary
+from .fakes import install_fake_supabase
+
+BASELINE = Path(__file__).parent / 'baselines' / 'polling.json'
+ENDPOINTS = ('tasks', 'task_status')
+
+HIGHER_IS_BETTER = tuple(f'endpoints.{name}.requests_per_second' for name in ENDPOINTS)
+LOWER_IS_BETTER = tuple(
+    f'endpoints.{name}.{metric}' for name in ENDPOINTS
+    for metric in ('latency_ms.p50', 'latency_ms.p95', 'latency_ms.p99', 'response_bytes.mean', 'db_queries_per_request')
+)
+
+
+def _text(rng: random.Random, size: int, prefix: str = '') -> str:
+    lines, total = [], 0
+    while total < size:
+        line = f"{prefix}{' ' * rng.randint(0, 12)}value_{rng.getrandbits(32):08x} = compute({rng.randint(0, 10 ** 6)})"
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+
+def _diff(rng: random.Random, files: int, size: int) -> str:
+    per_file = max(1, size // max(1, files))
+    parts = []
+    for n in range(files):
+        name = f'src/module_{n:04d}.py'
+        parts.append(f'diff --git a/{name} b/{name}\n--- a/{name}\n+++ b/{name}\n@@ -1,10 +1,12 @@\n'
+                     + _text(rng, per_file, prefix='+'))
+    return '\n'.join(parts)
+
+
+def seed_tasks(db, args) -> dict:
+    """Tasks per user with realistic payloads; returns {user_id: [task ids it watches]}"""
+    rng = random.Random(args.seed)
+    watched = {}
+    for u in range(args.users):
+        user_id = f'load-user-{u}'
+        rows = []
+        for t in range(args.tasks_per_user):
+            status = 'running' if t < args.watch else rng.choice(['completed'] * 8 + ['failed'])
+            chat = [{
+                'role': 'user' if m % 2 == 0 else 'assistant',
+                'content': _text(rng, args.message_bytes),
+                'timestamp': time.time()
+            } for m in range(args.chat_messages)]
+            row = {
+                'user_id': user_id,
+                'project_id': None,
+                'repo_url': f'https://github.com/load/repo-{u}',
+                'target_branch': 'main',
+                'agent': 'claude',
+                'status': status,
+                'chat_messages': chat,
+                'execution_metadata': {'priority': 'normal'},
+                'changed_files': []
+            }
+            if status == 'completed':
+                diff = _diff(rng, args.diff_files, args.diff_kb * 1024)
+                row.update({
+                    'commit_hash': f'{rng.getrandbits(160):040x}',
+                    'git_diff': diff,
+                    'git_patch': 'From 0000000000000000000000000000000000000000 Mon Sep 17 00:00:00 2001\n' + diff,
+                    'changed_files': [f'src/module_{n:04d}.py' for n in range(args.diff_files)]
+                })
+                row['execution_metadata'].update({
+                    'stdout': _text(rng, args.stdout_kb * 1024),
+                    'file_changes': [{'filename': name, 'before': '', 'after': ''} for name in row['changed_files']]
+                })
+            rows.append(row)
+        stored = db.seed('tasks', rows)
+        watched[user_id] = [row['id'] for row in stored if row['status'] == 'running']
+    return watched
+
+
+class _Client:
+    """Issues requests in-process (Flask test client) or over HTTP to a local server"""
+
+    def __init__(self, app, base_url: str = None):
+        self.base_url = base_url
+        if base_url:
+            import requests
+            self.session = requests.Session()
+        else:
+            self.client = app.test_client()
+
+    def get(self, path: str, user_id: str):
+        headers = {'X-User-ID': user_id}
+        if self.base_url:
+            response = self.session.get(self.base_url + path, headers=headers, timeout=60)
+            return response.status_code, response.content, response.headers
+        response = self.client.get(path, headers=headers)
+        return response.status_code, response.get_data(), response.headers
+
+
+def run(args) -> dict:
+    db = install_fake_supabase()
+    from flask import Flask
+    from tasks import tasks_bp
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    print(f"🌱 Seeding {args.users * args.tasks_per_user} tasks ({args.diff_kb} KiB diffs, "
+          f"{args.chat_messages} x {args.message_bytes} B chat messages)")
+    watched = seed_tasks(db, args)
+
+    app = Flask(__name__)
+    app.register_blueprint(tasks_bp)
+
+    # Requests are served on one thread each, so the fake's per-thread counters are per request
+    @app.before_request
+    def _reset_db_counters():
+        db.thread_counters(reset=True)
+
+    @app.after_request
+    def _report_db_counters(response):
+        queries, read_bytes = db.thread_counters()
+        response.headers['X-Bench-DB-Queries'] = str(queries)
+        response.headers['X-Bench-DB-Bytes'] = str(read_bytes)
+        return response
+
+    server = None
+    base_url = None
+    if args.transport == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name='bench-http', daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+    samples = {name: [] for name in ENDPOINTS}
+    errors = {name: 0 for name in ENDPOINTS}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def virtual_user(user_id: str):
+        client = _Client(app, base_url)
+        rng = random.Random(f'{args.seed}-{user_id}')
+        time.sleep(rng.uniform(0, args.interval))  # spread users across the polling interval
+        while time.monotonic() < stop_at:
+            cycle_start = time.monotonic()
+            requests_this_cycle = [('tasks', '/tasks')] + [('task_status', f'/task-status/{task_id}') for task_id in watched[user_id]]
+            for name, path in requests_this_cycle:
+                started = time.monotonic()
+                status, body, headers = client.get(path, user_id)
+                elapsed = time.monotonic() - started
+                with lock:
+                    if status != 200:
+                        errors[name] += 1
+                    samples[name].append((elapsed, len(body), int(headers.get('X-Bench-DB-Queries', 0)),
+                                          int(headers.get('X-Bench-DB-Bytes', 0))))
+            time.sleep(max(0.0, args.interval - (time.monotonic() - cycle_start)))
+
+    print(f"🚦 {args.users} users polling {args.watch} task(s) each every {args.interval}s for {args.duration}s over {args.transport}")
+    threads = [threading.Thread(target=virtual_user, args=(user_id,), daemon=True) for user_id in watched]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    if server:
+        server.shutdown()
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        rows = samples[name]
+        count = len(rows) or 1
+        endpoints[name] = {
+            'requests': len(rows),
+            'errors': errors[name],
+            'requests_per_second': round(len(rows) / elapsed, 2),
+            'latency_ms': latency_summary([r[0] * 1000 for r in rows]),
+            'response_bytes': latency_summary([r[1] for r in rows]),
+            'db_queries_per_request': round(sum(r[2] for r in rows) / count, 3),
+            'db_bytes_per_request': int(sum(r[3] for r in rows) / count)
+        }
+    return {
+        'config': {
+            'users': args.users, 'tasks_per_user': args.tasks_per_user, 'watch': args.watch, 'interval': args.interval,
+            'duration': args.duration, 'transport': args.transport, 'diff_kb': args.diff_kb,
+            'chat_messages': args.chat_messages, 'message_bytes': args.message_bytes, 'stdout_kb': args.stdout_kb
+        },
+        'endpoints': endpoints
+    }
+
+
+def print_report(results: dict):
+    print(f"\n   {'endpoint':<13}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'resp KiB':>10}{'DB q/req':>10}{'DB KiB/req':>12}{'errors':>8}")
+    for name, stats in results['endpoints'].items():
+        latency = stats['latency_ms']
+        print(f"   {name:<13}{stats['requests_per_second']:>9.1f}{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+              f"{stats['response_bytes']['mean'] / 1024:>10.1f}{stats['db_queries_per_request']:>10.2f}"
+              f"{stats['db_bytes_per_request'] / 1024:>12.1f}{stats['errors']:>8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='Virtual users (browser tabs)')
+    parser.add_argument('--tasks-per-user', type=int, default=25, help='Tasks each user owns (all returned by /tasks)')
+    parser.add_argument('--watch', type=int, default=2, help='Running tasks each user polls via /task-status')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between a user\'s polling cycles (0 = closed loop)')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds to generate load')
+    parser.add_argument('--transport', choices=['http', 'inproc'], default='http',
+                        help='Serve over a local threaded HTTP server, or call the app in-process')
+    parser.add_argument('--diff-kb', type=int, default=64, help='Size of each completed task\'s diff (and patch)')
+    parser.add_argument('--diff-files', type=int, default=20, help='Files in each completed task\'s diff')
+    parser.add_argument('--chat-messages', type=int, default=10, help='Chat messages per task')
+    parser.add_argument('--message-bytes', type=int, default=2000, help='Size of each chat message')
+    parser.add_argument('--stdout-kb', type=int, default=32, help='Agent stdout stored per completed task')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated payloads')
+    parser.add_argument('--verbose', action='store_true', help='Keep the server\'s INFO logging')
+    add_baseline_arguments(parser, str(BASELINE))
+    args = parser.parse_args(argv)
+    args.watch = min(args.watch, args.tasks_per_user)
+
+    results = run(args)
+    print_report(results)
+    if any(stats['errors'] for stats in results['endpoints'].values()):
+        print("❌ Some requests failed")
+        return 1
+    return finish(results, args, HIGHER_IS_BETTER, LOWER_IS_BETTER)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
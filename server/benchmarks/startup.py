@@ -0,0 +1,143 @@
+"""
+Cold-start benchmark for the API, executor and worker entry points.
+
+Each run imports ``main`` (API), ``executor`` or ``worker`` in a fresh
+interpreter, in direct execution mode with no Supabase settings, and reports
+how long the import took, the whole process lifetime and how many modules it
+loaded. One extra run under ``-X importtime`` breaks the import time down by
+top-level package. The run fails when an entry point exceeds ``--budget-ms``
+or loads a module that must stay lazy (``--forbid``): the Docker SDK, aiohttp,
+the Supabase client and PyGithub are only needed once they are first used.
+
+    cd server
+    python -m benchmarks.startup
+    python -m benchmarks.startup --target api --repeat 10 --budget-ms 500
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from .common import add_baseline_arguments, finish
+
+BASELINE = Path(__file__).parent / 'baselines' / 'startup.json'
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+TARGETS = {'api': 'main', 'executor': 'executor', 'worker': 'worker'}
+LAZY_MODULES = ('docker', 'aiohttp', 'supabase', 'github')
+
+# Runs in the child: time the import alone, report what it loaded, and exit without waiting on background threads
+CHILD = '''
+import json, os, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import_seconds': elapsed, 'modules': sorted(sys.modules)}}), flush=True)
+os._exit(0)
+'''
+
+
+def child_env(lock_dir: str) -> dict:
+    env = dict(os.environ)
+    # Without settings the database probe fails fast instead of loading the Supabase client mid-measurement
+    for name in ('SUPABASE_URL', 'SUPABASE_SERVICE_ROLE_KEY'):
+        env.pop(name, None)
+    env.update({
+        'EXECUTION_MODE': 'direct',
+        'FORCE_DOCKER': 'false',
+        'TASK_DISPATCH': 'local',
+        'TRACE_EXPORTER': 'none',
+        'EXECUTOR_LOCK_FILE': os.path.join(lock_dir, 'executor.lock'),
+        'WORKER_LOCK_FILE': os.path.join(lock_dir, 'worker.lock'),
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    return env
+
+
+def run_child(module: str, env: dict, importtime: bool = False):
+    """(child's JSON report, process wall seconds, stderr)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD.format(module=module)]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=SERVER_DIR, env=env, capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - started
+    report = next((line for line in result.stdout.splitlines() if line.startswith('{')), None)
+    if result.returncode != 0 or report is None:
+        raise RuntimeError(f"import {module} failed (exit {result.returncode}):\n{result.stderr[-2000:]}")
+    return json.loads(report), elapsed, result.stderr
+
+
+def import_breakdown(stderr: str) -> dict:
+    """Self import time in seconds per top-level package, from ``-X importtime`` output"""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(totals)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', action='append', choices=sorted(TARGETS), help='Entry points to measure (default all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per target')
+    parser.add_argument('--budget-ms', type=float, default=1500, help='Fail when the median import exceeds this')
+    parser.add_argument('--forbid', default=','.join(LAZY_MODULES),
+                        help='Comma-separated packages that must not be loaded at startup (default %(default)s)')
+    parser.add_argument('--top', type=int, default=10, help='Packages to list in the import breakdown')
+    add_baseline_arguments(parser, str(BASELINE), default_tolerance=0.5)
+    args = parser.parse_args(argv)
+
+    forbidden = [name for name in args.forbid.split(',') if name]
+    results = {'config': {'repeat': args.repeat, 'python': sys.version.split()[0]}, 'targets': {}}
+    failures = []
+
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as lock_dir:
+        env = child_env(lock_dir)
+        for target in args.target or sorted(TARGETS):
+            module = TARGETS[target]
+            runs = [run_child(module, env) for _ in range(args.repeat)]
+            imports = [report['import_seconds'] for report, _, _ in runs]
+            processes = [elapsed for _, elapsed, _ in runs]
+            loaded = runs[-1][0]['modules']
+            breakdown = import_breakdown(run_child(module, env, importtime=True)[2])
+
+            results['targets'][target] = {
+                'import_seconds': {'median': round(statistics.median(imports), 4), 'min': round(min(imports), 4)},
+                'process_seconds': {'median': round(statistics.median(processes), 4), 'min': round(min(processes), 4)},
+                'modules': len(loaded),
+                'top_packages': {name: round(seconds, 4) for name, seconds in
+                                 sorted(breakdown.items(), key=lambda item: -item[1])[:args.top]},
+            }
+
+            stats = results['targets'][target]
+            print(f"🚀 {target} (import {module}): import {stats['import_seconds']['median'] * 1000:.0f} ms median, "
+                  f"process {stats['process_seconds']['median'] * 1000:.0f} ms, {stats['modules']} modules")
+            for name, seconds in stats['top_packages'].items():
+                print(f"   {name:<28}{seconds * 1000:>8.1f} ms")
+
+            if stats['import_seconds']['median'] * 1000 > args.budget_ms:
+                failures.append(f"{target}: import {stats['import_seconds']['median'] * 1000:.0f} ms > budget {args.budget_ms:g} ms")
+            eager = sorted({name.split('.')[0] for name in loaded} & set(forbidden))
+            if eager:
+                failures.append(f"{target}: loaded at startup: {', '.join(eager)}")
+
+    for message in failures:
+        print(f"❌ {message}")
+    tracked = results['targets']
+    status = finish(
+        results, args,
+        lower_is_better=[f'targets.{name}.{metric}' for name in tracked
+                         for metric in ('import_seconds.median', 'process_seconds.median', 'modules')]
+    )
+    return 1 if failures else status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
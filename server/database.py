@@ -1,21 +1,31 @@
 import os
+import time
 import logging
+import functools
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from supabase import create_client, Client
 import json
+from utils.lazy import LazySingleton
+from utils.task_metrics import DB_CALL_SECONDS
+from utils.tracing import SPAN_KIND_CLIENT, start_span
 
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')  # Use service role key for server operations
 
-if not supabase_url or not supabase_key:
-    logger.error("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
-    raise ValueError("Supabase configuration is missing")
+def _create_supabase_client():
+    supabase_url = os.getenv('SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')  # Use service role key for server operations
 
-supabase: Client = create_client(supabase_url, supabase_key)
+    if not supabase_url or not supabase_key:
+        logger.error("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables")
+        raise ValueError("Supabase configuration is missing")
+
+    from supabase import create_client
+    return create_client(supabase_url, supabase_key)
+
+
+# Supabase client, created on the first query (the database health probe makes one at startup)
+supabase = LazySingleton(_create_supabase_client, 'Supabase client')
 
 class DatabaseOperations:
     
@@ -85,7 +95,7 @@ class DatabaseOperations:
     @staticmethod
     def create_task(user_id: str, project_id: int = None, repo_url: str = None, 
                    target_branch: str = 'main', agent: str = 'claude', 
-                   chat_messages: List[Dict] = None) -> Dict:
+                   chat_messages: List[Dict] = None, execution_metadata: Dict = None) -> Dict:
         """Create a new task"""
         try:
             task_data = {
@@ -96,7 +106,7 @@ class DatabaseOperations:
                 'agent': agent,
                 'status': 'pending',
                 'chat_messages': chat_messages or [],
-                'execution_metadata': {}
+                'execution_metadata': execution_metadata or {}
             }
             
             result = supabase.table('tasks').insert(task_data).execute()
@@ -118,6 +128,20 @@ class DatabaseOperations:
             logger.error(f"Error fetching user tasks: {e}")
             raise
     
+    @staticmethod
+    def get_task_timings(user_id: str, agent: str = None, limit: int = 200) -> List[Dict]:
+        """Phase timings of a user's most recent finished tasks"""
+        try:
+            query = supabase.table('tasks').select('id, agent, status, timings:execution_metadata->timings') \
+                .eq('user_id', user_id).in_('status', ['completed', 'failed'])
+            if agent:
+                query = query.eq('agent', agent)
+            result = query.order('created_at', desc=True).limit(limit).execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error fetching task timings: {e}")
+            raise
+    
     @staticmethod
     def get_task_by_id(task_id: int, user_id: str) -> Optional[Dict]:
         """Get a specific task by ID for a user"""
@@ -128,6 +152,21 @@ class DatabaseOperations:
             logger.error(f"Error fetching task {task_id}: {e}")
             raise
     
+    @staticmethod
+    def find_cached_task_result(user_id: str, repo_url: str, agent: str,
+                                base_commit: str, prompt_hash: str) -> Optional[Dict]:
+        """Most recent completed task with the same repo, base commit, prompt and agent"""
+        try:
+            result = supabase.table('tasks').select('id, commit_hash, git_diff, git_patch, changed_files, execution_metadata') \
+                .eq('user_id', user_id).eq('repo_url', repo_url).eq('agent', agent).eq('status', 'completed') \
+                .eq('execution_metadata->>base_commit', base_commit) \
+                .eq('execution_metadata->>prompt_hash', prompt_hash) \
+                .order('completed_at', desc=True).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error looking up cached task result: {e}")
+            raise
+    
     @staticmethod
     def update_task(task_id: int, user_id: str, updates: Dict) -> Optional[Dict]:
         """Update a task"""
@@ -236,4 +275,169 @@ class DatabaseOperations:
             return bool(result.data)
         except Exception as e:
             logger.error(f"Error updating user preferences: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    @staticmethod
+    def get_oauth_users() -> List[Dict]:
+        """Get id and preferences of every user with Claude OAuth enabled"""
+        try:
+            result = supabase.table('users').select('id, preferences').eq('preferences->claudeCode->>useOAuth', 'true').execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error fetching OAuth users: {e}")
+            raise
+
+    # -- shared task queue and worker nodes (db/worker_queue.sql) -------
+
+    @staticmethod
+    def enqueue_task(task_id: int, user_id: str, github_token: str, agent: str, project_id: Optional[int],
+                     priority: str, priority_rank: int) -> None:
+        """Add a task to the shared queue for worker nodes to claim (``github_token`` already encrypted)"""
+        try:
+            supabase.table('task_queue').insert({
+                'task_id': task_id,
+                'user_id': user_id,
+                'project_id': project_id,
+                'agent': agent,
+                'priority': priority,
+                'priority_rank': priority_rank,
+                'github_token': github_token
+            }).execute()
+        except Exception as e:
+            logger.error(f"Error enqueueing task {task_id}: {e}")
+            raise
+
+    @staticmethod
+    def claim_queued_tasks(node_id: str, agents: List[str], limit: int, lease_seconds: int, max_attempts: int,
+                           aging_seconds: float, default_user_concurrency: int) -> List[Dict]:
+        """Lease up to ``limit`` queued tasks to a worker node (see claim_tasks in db/worker_queue.sql)"""
+        try:
+            result = supabase.rpc('claim_tasks', {
+                'p_node_id': node_id,
+                'p_agents': agents,
+                'p_limit': limit,
+                'p_lease_seconds': lease_seconds,
+                'p_max_attempts': max_attempts,
+                'p_aging_seconds': aging_seconds,
+                'p_default_user_concurrency': default_user_concurrency
+            }).execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error claiming tasks for node {node_id}: {e}")
+            raise
+
+    @staticmethod
+    def worker_heartbeat(node_id: str, node_info: Dict, task_ids: List[int], lease_seconds: int,
+                         status: str = None, register: bool = False) -> Dict:
+        """Upsert a worker node's row and renew its leases; returns its status and the tasks to cancel or drop"""
+        try:
+            result = supabase.rpc('worker_heartbeat', {
+                'p_node_id': node_id,
+                'p_hostname': node_info.get('hostname'),
+                'p_execution_mode': node_info.get('execution_mode'),
+                'p_agents': node_info.get('agents') or [],
+                'p_capacity': node_info.get('capacity') or {},
+                'p_running': node_info.get('running_tasks') or 0,
+                'p_task_ids': task_ids,
+                'p_lease_seconds': lease_seconds,
+                'p_status': status,
+                'p_register': register
+            }).execute()
+            return result.data or {}
+        except Exception as e:
+            logger.error(f"Error sending heartbeat for node {node_id}: {e}")
+            raise
+
+    @staticmethod
+    def complete_queued_task(task_id: int, node_id: str) -> None:
+        """Remove a finished task from the queue, if this node still holds its lease"""
+        try:
+            supabase.table('task_queue').delete().eq('task_id', task_id).eq('claimed_by', node_id).execute()
+        except Exception as e:
+            logger.error(f"Error completing queued task {task_id}: {e}")
+            raise
+
+    @staticmethod
+    def release_queued_task(task_id: int, node_id: str, attempts: int, github_token: Optional[str]) -> None:
+        """Hand a claimed task that never started back to the queue (e.g. when its node drains)"""
+        try:
+            supabase.table('task_queue').update({
+                'claimed_by': None,
+                'claimed_at': None,
+                'lease_expires_at': None,
+                'attempts': attempts,
+                'github_token': github_token  # encrypted; the claim may have cleared it
+            }).eq('task_id', task_id).eq('claimed_by', node_id).execute()
+        except Exception as e:
+            logger.error(f"Error releasing queued task {task_id}: {e}")
+            raise
+
+    @staticmethod
+    def cancel_queued_task(task_id: int) -> bool:
+        """Drop an unclaimed task from the queue (True), or flag a claimed one for its node to stop (False)"""
+        try:
+            result = supabase.table('task_queue').delete().eq('task_id', task_id).is_('claimed_by', 'null').execute()
+            if result.data:
+                return True
+            supabase.table('task_queue').update({'cancel_requested': True}).eq('task_id', task_id).execute()
+            return False
+        except Exception as e:
+            logger.error(f"Error cancelling queued task {task_id}: {e}")
+            raise
+
+    @staticmethod
+    def get_task_queue() -> List[Dict]:
+        """Every queued or running task in the shared queue, without tokens"""
+        try:
+            result = supabase.table('task_queue').select('task_id, user_id, project_id, agent, priority, claimed_by, attempts').execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error fetching task queue: {e}")
+            raise
+
+    @staticmethod
+    def get_worker_nodes() -> List[Dict]:
+        """Registered worker nodes with their status, capacity and last heartbeat"""
+        try:
+            result = supabase.table('worker_nodes').select('*').order('node_id').execute()
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error fetching worker nodes: {e}")
+            raise
+
+    @staticmethod
+    def set_worker_status(node_id: str, status: str) -> Optional[Dict]:
+        """Mark a worker node draining or active; it picks the change up on its next heartbeat"""
+        try:
+            result = supabase.table('worker_nodes').update({'status': status}).eq('node_id', node_id).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error setting worker node {node_id} to {status}: {e}")
+            raise
+
+    @staticmethod
+    def ping() -> None:
+        """Cheapest possible round trip, for health probes"""
+        supabase.table('tasks').select('id').limit(1).execute()
+
+
+
+def _timed(operation: str, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        result = 'error'
+        try:
+            with start_span(f'db.{operation}', {'db.system': 'postgresql'}, kind=SPAN_KIND_CLIENT):
+                value = func(*args, **kwargs)
+            result = 'ok'
+            return value
+        finally:
+            DB_CALL_SECONDS.labels(operation, result).observe(time.monotonic() - started)
+    return wrapper
+
+
+# Time and trace every public operation so /metrics and traces show per-call database latency
+for _name, _attr in list(vars(DatabaseOperations).items()):
+    if isinstance(_attr, staticmethod) and not _name.startswith('_'):
+        setattr(DatabaseOperations, _name, staticmethod(_timed(_name, _attr.__func__)))
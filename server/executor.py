@@ -0,0 +1,91 @@
+from flask import Flask, Blueprint, jsonify, request
+import os
+import hmac
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# This is the process that runs tasks, whatever dispatch mode the API workers share via .env
+os.environ['TASK_DISPATCH'] = 'local'
+
+from health import health_bp
+from admin import admin_bp
+from utils.scheduler import PRIORITY_CLASSES
+from utils.task_dispatch import task_dispatcher
+from utils.health_probes import health_probes
+from utils.services import acquire_instance_lock, require_token_off_loopback, start_task_services
+from utils.tracing import init_flask_tracing
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXECUTOR_TOKEN = os.getenv('EXECUTOR_TOKEN', '')
+EXECUTOR_LOCK_FILE = os.getenv('EXECUTOR_LOCK_FILE', '/tmp/async-code-executor.lock')
+
+executor_bp = Blueprint('executor', __name__, url_prefix='/internal')
+
+@executor_bp.before_request
+def check_token():
+    """Only API workers holding EXECUTOR_TOKEN (when set) may submit work"""
+    if EXECUTOR_TOKEN and not hmac.compare_digest(request.headers.get('X-Executor-Token', ''), EXECUTOR_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+
+@executor_bp.route('/tasks', methods=['POST'])
+def submit_task():
+    """Queue a task created by an API worker"""
+    data = request.get_json() or {}
+    if not all(data.get(field) for field in ('task_id', 'user_id', 'github_token')):
+        return jsonify({'error': 'task_id, user_id and github_token are required'}), 400
+    if data.get('priority') and data['priority'] not in PRIORITY_CLASSES:
+        return jsonify({'error': f"Unknown priority: {data['priority']}"}), 400
+
+    task_dispatcher.submit(
+        int(data['task_id']), data['user_id'], data['github_token'],
+        agent=data.get('agent') or 'claude',
+        project_id=data.get('project_id'),
+        priority=data.get('priority')
+    )
+    return jsonify({'status': 'success', 'task_id': data['task_id']})
+
+@executor_bp.route('/tasks/<int:task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """Stop a queued or running task (the API worker has already marked it cancelled)"""
+    data = request.get_json(silent=True) or {}
+    was_queued = task_dispatcher.cancel(task_id, agent=data.get('agent'), container_id=data.get('container_id'))
+    return jsonify({'status': 'success', 'task_id': task_id, 'was_queued': was_queued})
+
+@executor_bp.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify({'status': 'success', 'scheduler': task_dispatcher.scheduler_stats()})
+
+@executor_bp.route('/capacity', methods=['GET'])
+def capacity():
+    return jsonify({'status': 'success', 'admission': task_dispatcher.capacity()})
+
+
+# Only one executor per host: scheduling and slot accounting live in this process
+_instance_lock = acquire_instance_lock(EXECUTOR_LOCK_FILE, 'executor')
+
+app = Flask(__name__)
+
+# Request spans continue the API worker's trace (no-op unless TRACE_EXPORTER is set)
+init_flask_tracing(app)
+
+# /internal for the API workers, plus /health, /ready, /metrics and /admin for this process
+app.register_blueprint(executor_bp)
+app.register_blueprint(health_bp)
+app.register_blueprint(admin_bp)
+
+start_task_services()
+health_probes.start()
+
+if __name__ == '__main__':
+    # Development only; production runs gunicorn -c gunicorn.executor.conf.py executor:app
+    host = os.getenv('EXECUTOR_HOST', '127.0.0.1')
+    port = int(os.getenv('EXECUTOR_PORT', '5100'))
+    require_token_off_loopback([host], EXECUTOR_TOKEN, 'executor')
+    logger.info(f"Starting task executor on {host}:{port}")
+    app.run(host=host, port=port, threaded=True)
@@ -0,0 +1,23 @@
+"""Production server for the API: gunicorn -c gunicorn.conf.py main:app"""
+import os
+import logging
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# /create-pr and /github/repos wait on GitHub; give them room before the worker is recycled
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+
+if os.getenv('TASK_DISPATCH', 'local').lower() not in ('remote', 'queue') and workers > 1:
+    # Each worker would run its own scheduler and slot accounting
+    logging.getLogger('gunicorn.error').warning(
+        "TASK_DISPATCH is 'local': running a single worker. Start executor.py and set "
+        "TASK_DISPATCH=remote, or start worker.py nodes and set TASK_DISPATCH=queue, to scale the API tier."
+    )
+    workers = 1
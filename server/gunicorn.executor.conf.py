@@ -0,0 +1,22 @@
+"""Production server for the task executor: gunicorn -c gunicorn.executor.conf.py executor:app"""
+import os
+
+bind = f"{os.getenv('EXECUTOR_HOST', '127.0.0.1')}:{os.getenv('EXECUTOR_PORT', '5100')}"
+worker_class = 'gthread'
+# Exactly one worker: the scheduler, admission slots and containers live in that process
+workers = 1
+threads = int(os.getenv('EXECUTOR_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+# Running tasks are not handed off on restart; give in-flight internal calls time to answer
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Checked against the final settings, so command-line -b/-w cannot expose /internal or split the scheduler
+    if server.cfg.workers != 1:
+        raise RuntimeError("The executor must run with exactly one worker")
+    from utils.services import require_token_off_loopback
+    require_token_off_loopback(server.cfg.bind, os.getenv('EXECUTOR_TOKEN', ''), 'executor')
@@ -1,5 +1,8 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
 import time
+from utils.metrics import render_metrics
+from utils.task_dispatch import task_dispatcher
+from utils.health_probes import health_probes
 
 health_bp = Blueprint('health', __name__)
 
@@ -14,17 +17,44 @@ def ping():
 
 @health_bp.route('/health', methods=['GET'])
 def health():
-    """Comprehensive health check endpoint"""
+    """Cached dependency probe results; 503 when a critical dependency is down"""
+    health_probes.start()
+    snapshot = health_probes.snapshot()
     return jsonify({
-        'status': 'healthy',
+        'status': snapshot['status'],
         'service': 'async-code-api',
         'version': '1.0.0',
         'timestamp': time.time(),
-        'checks': {
-            'api': 'healthy',
-            'database': 'needs_initialization',
-            'docker': 'available'
-        }
+        'checks': snapshot['checks']
+    }), 503 if snapshot['status'] == 'unhealthy' else 200
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness for load balancers: 200 once probes have run and no critical dependency is down"""
+    health_probes.start()
+    status = health_probes.snapshot()['status']
+    ready = status in ('healthy', 'degraded')
+    return jsonify({'ready': ready, 'status': status}), 200 if ready else 503
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@health_bp.route('/capacity', methods=['GET'])
+def capacity():
+    """Task resource reservations vs host capacity; with TASK_DISPATCH=queue, worker nodes and their slots"""
+    return jsonify({
+        'status': 'success',
+        'admission': task_dispatcher.capacity()
+    })
+
+@health_bp.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """Per-user and per-project queue, concurrency and wait-time stats (cluster-wide queue counts with TASK_DISPATCH=queue)"""
+    return jsonify({
+        'status': 'success',
+        'scheduler': task_dispatcher.scheduler_stats()
     })
 
 @health_bp.route('/', methods=['GET'])
@@ -33,5 +63,5 @@ def home():
     return jsonify({
         'status': 'success',
         'message': 'Claude Code Automation API',
-        'endpoints': ['/ping', '/health', '/start-task', '/task-status', '/git-diff', '/create-pr']
+        'endpoints': ['/ping', '/health', '/ready', '/start-task', '/task-status', '/git-diff', '/create-pr']
     })
\ No newline at end of file
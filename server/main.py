@@ -11,6 +11,11 @@ load_dotenv()
 from tasks import tasks_bp
 from projects import projects_bp
 from health import health_bp
+from admin import admin_bp
+from utils.health_probes import health_probes
+from utils.services import start_task_services
+from utils.task_dispatch import task_dispatcher
+from utils.tracing import init_flask_tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,10 +26,21 @@ app = Flask(__name__)
 # Configure CORS
 CORS(app, origins=['http://localhost:3000', 'https://*.vercel.app'])
 
+# Request spans (no-op unless TRACE_EXPORTER is set)
+init_flask_tracing(app)
+
 # Register blueprints
 app.register_blueprint(health_bp)
 app.register_blueprint(tasks_bp)
 app.register_blueprint(projects_bp)
+app.register_blueprint(admin_bp)
+
+# Tasks run in this process unless TASK_DISPATCH hands them to the executor service (remote) or worker nodes (queue)
+if task_dispatcher.local:
+    start_task_services()
+
+# Dependency probes feed /health and /ready from a cache
+health_probes.start()
 
 @app.errorhandler(404)
 def not_found(error):
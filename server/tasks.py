@@ -1,17 +1,39 @@
 from flask import Blueprint, jsonify, request
+import re
 import uuid
+import os
 import time
-import threading
+import base64
+import asyncio
 import logging
+from urllib.parse import quote
 from models import TaskStatus
 from database import DatabaseOperations
-from utils import run_ai_code_task_smart  # Updated to smart execution
-from github import Github
+from utils.scheduler import DEFAULT_PRIORITY, PRIORITY_CLASSES
+from utils.task_dispatch import ExecutorUnavailable, task_dispatcher
+from utils.github_async import GitHubAPIError, GitHubBusy, GitHubTimeout, github_client
+from utils.github_permissions import permission_probe
+from utils.result_cache import CACHED_RESULT_FIELDS, result_cache
+from utils.task_metrics import TASKS_SUBMITTED, record_task_finished
+from utils.phase_timer import aggregate_timings
+from utils.responses import json_response
 
 logger = logging.getLogger(__name__)
 
 tasks_bp = Blueprint('tasks', __name__)
 
+# Creating a PR fans out over every changed file, so it gets longer than the default deadline
+GITHUB_PR_DEADLINE_SECONDS = float(os.getenv('GITHUB_PR_DEADLINE_SECONDS', '120'))
+
+
+def github_unavailable(error):
+    """503 when too many requests are already waiting on GitHub, 504 when GitHub missed the deadline"""
+    if isinstance(error, GitHubBusy):
+        logger.warning(f"⚠️ Shedding GitHub-bound request: {error}")
+        return jsonify({'error': 'GitHub requests are backed up, please retry shortly'}), 503, {'Retry-After': '1'}
+    logger.warning(f"⏰ {error}")
+    return jsonify({'error': str(error)}), 504
+
 @tasks_bp.route('/start-task', methods=['POST'])
 def start_task():
     """Start a new Claude Code automation task"""
@@ -31,6 +53,8 @@ def start_task():
         github_token = data.get('github_token')
         model = data.get('model', 'claude')  # Default to claude for backward compatibility
         project_id = data.get('project_id')  # Optional project association
+        priority = data.get('priority', DEFAULT_PRIORITY)  # interactive, normal or batch
+        use_cache = data.get('use_cache', True)  # Set false to force a fresh run
         
         if not all([prompt, repo_url, github_token]):
             return jsonify({'error': 'prompt, repo_url, and github_token are required'}), 400
@@ -39,6 +63,13 @@ def start_task():
         if model not in ['claude', 'codex']:
             return jsonify({'error': 'model must be either "claude" or "codex"'}), 400
         
+        if priority not in PRIORITY_CLASSES:
+            return jsonify({'error': f'priority must be one of: {", ".join(PRIORITY_CLASSES)}'}), 400
+        
+        # A JSON string such as "false" would be truthy, so only real booleans are accepted
+        if not isinstance(use_cache, bool):
+            return jsonify({'error': 'use_cache must be true or false'}), 400
+        
         # Create initial chat message
         chat_messages = [{
             'role': 'user',
@@ -46,6 +77,15 @@ def start_task():
             'timestamp': time.time()
         }]
         
+        # Identify this submission so identical resubmissions can reuse its results (no ls-remote for forced runs)
+        cache_key = result_cache.cache_key(repo_url, branch, prompt, github_token) if use_cache else None
+        cached = result_cache.lookup(user_id, repo_url, model, cache_key)
+        
+        execution_metadata = {'priority': priority, **(cache_key or {})}
+        if cached:
+            execution_metadata['cached_from_task_id'] = cached['id']
+            execution_metadata['file_changes'] = (cached.get('execution_metadata') or {}).get('file_changes', [])
+        
         # Create task in database
         task = DatabaseOperations.create_task(
             user_id=user_id,
@@ -53,20 +93,44 @@ def start_task():
             repo_url=repo_url,
             target_branch=branch,
             agent=model,
-            chat_messages=chat_messages
+            chat_messages=chat_messages,
+            execution_metadata=execution_metadata
         )
         
         if not task:
             return jsonify({'error': 'Failed to create task'}), 500
         
-        # Start task in background thread
-        thread = threading.Thread(target=run_ai_code_task_smart, args=(task['id'], user_id, github_token))
-        thread.daemon = True
-        thread.start()
+        TASKS_SUBMITTED.labels(model).inc()
+        if cached:
+            # Same repo, base commit, prompt and agent as a completed task: reuse its results
+            DatabaseOperations.update_task(task['id'], user_id, {
+                'status': 'completed',
+                **{field: cached.get(field) for field in CACHED_RESULT_FIELDS}
+            })
+            logger.info(f"♻️ Task {task['id']} served from cached results of task {cached['id']}")
+            record_task_finished(model, 'cache', 'completed', 0.0)
+            return jsonify({
+                'status': 'success',
+                'task_id': task['id'],
+                'priority': priority,
+                'cached': True,
+                'cached_from_task_id': cached['id'],
+                'message': 'Task completed from cached results'
+            })
+        
+        # Queue the task for fair-share dispatch across users and projects (here or on the executor service)
+        try:
+            task_dispatcher.submit(task['id'], user_id, github_token, agent=model, project_id=project_id, priority=priority)
+        except ExecutorUnavailable as e:
+            logger.error(f"❌ Could not hand task {task['id']} to the executor: {e}")
+            DatabaseOperations.update_task(task['id'], user_id, {'status': 'failed', 'error': 'Task executor unavailable'})
+            return jsonify({'error': 'Task executor unavailable, please retry'}), 503
         
         return jsonify({
             'status': 'success',
             'task_id': task['id'],
+            'priority': priority,
+            'cached': False,
             'message': 'Task started successfully'
         })
         
@@ -152,7 +216,7 @@ def list_all_tasks():
                 'chat_messages': task.get('chat_messages', [])
             }
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'tasks': formatted_tasks,
             'total_tasks': len(tasks)
@@ -162,6 +226,27 @@ def list_all_tasks():
         logger.error(f"Error listing tasks: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@tasks_bp.route('/tasks/timings', methods=['GET'])
+def get_task_timings():
+    """Per-phase duration breakdown across the user's recent finished tasks"""
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 400
+        
+        agent = request.args.get('agent')
+        limit = min(request.args.get('limit', 200, type=int), 1000)
+        
+        tasks = DatabaseOperations.get_task_timings(user_id, agent=agent, limit=limit)
+        return jsonify({
+            'status': 'success',
+            'timings': aggregate_timings([t for t in tasks if t.get('timings')])
+        })
+        
+    except Exception as e:
+        logger.error(f"Error fetching task timings: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @tasks_bp.route('/tasks/<int:task_id>', methods=['GET'])
 def get_task_details(task_id):
     """Get detailed information about a specific task"""
@@ -174,7 +259,8 @@ def get_task_details(task_id):
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        return jsonify({
+        # Diffs, patches and file snapshots run to megabytes: compressed, and streamed when large
+        return json_response({
             'status': 'success',
             'task': task
         })
@@ -183,6 +269,40 @@ def get_task_details(task_id):
         logger.error(f"Error fetching task details: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@tasks_bp.route('/tasks/<int:task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """Cancel a pending or running task, freeing its execution slot immediately"""
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 400
+        
+        task = DatabaseOperations.get_task_by_id(task_id, user_id)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        if task['status'] not in ['pending', 'running']:
+            return jsonify({'error': f"Task is already {task['status']}"}), 409
+        
+        # Mark the row first so executors treat the kill below as a cancellation, not a failure
+        DatabaseOperations.update_task(task_id, user_id, {
+            'status': 'cancelled',
+            'error': 'Cancelled by user'
+        })
+        
+        task_dispatcher.cancel(task_id, agent=task.get('agent'), container_id=task.get('container_id'))
+        
+        logger.info(f"🛑 Task {task_id} cancelled by user {user_id}")
+        return jsonify({
+            'status': 'success',
+            'task_id': task_id,
+            'message': 'Task cancelled'
+        })
+        
+    except Exception as e:
+        logger.error(f"Error cancelling task: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @tasks_bp.route('/tasks/<int:task_id>/chat', methods=['POST'])
 def add_chat_message(task_id):
     """Add a chat message to a task"""
@@ -230,7 +350,7 @@ def get_git_diff(task_id):
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        return jsonify({
+        return json_response({
             'status': 'success',
             'git_diff': task.get('git_diff', ''),
             'task_id': task_id
@@ -242,7 +362,7 @@ def get_git_diff(task_id):
 
 @tasks_bp.route('/validate-token', methods=['POST'])
 def validate_github_token():
-    """Validate GitHub token and check permissions"""
+    """Validate GitHub token and check permissions without writing to the repository"""
     try:
         data = request.get_json()
         github_token = data.get('github_token')
@@ -251,92 +371,46 @@ def validate_github_token():
         if not github_token:
             return jsonify({'error': 'github_token is required'}), 400
         
-        # Create GitHub client
-        g = Github(github_token)
+        # Token and repository lookups go out together (each cached per token)
+        repo_parts = repo_url.replace('https://github.com/', '').replace('.git', '') if repo_url else None
+        token_info, repo_info = github_client.run(validate_token_access, github_token, repo_parts)
+        if isinstance(token_info, Exception):
+            raise token_info
+        logger.info(f"🔐 Token belongs to user: {token_info['login']} (scopes: {token_info['scopes']})")
         
-        # Test basic authentication
-        user = g.get_user()
-        logger.info(f"🔐 Token belongs to user: {user.login}")
-        
-        # Test token scopes
-        rate_limit = g.get_rate_limit()
-        logger.info(f"📊 Rate limit info: {rate_limit.core.remaining}/{rate_limit.core.limit}")
-        
-        # If repo URL provided, test repo access
-        repo_info = {}
-        if repo_url:
-            try:
-                repo_parts = repo_url.replace('https://github.com/', '').replace('.git', '')
-                repo = g.get_repo(repo_parts)
-                
-                # Test various permissions
-                permissions = {
-                    'read': True,  # If we got here, we can read
-                    'write': False,
-                    'admin': False
-                }
-                
-                try:
-                    # Test if we can read branches
-                    branches = list(repo.get_branches())
-                    permissions['read_branches'] = True
-                    logger.info(f"✅ Can read branches ({len(branches)} found)")
-                    
-                    # Test if we can create branches
-                    test_branch_name = f"test-permissions-{int(time.time())}"
-                    try:
-                        # Try to create a test branch
-                        main_branch = repo.get_branch(repo.default_branch)
-                        test_ref = repo.create_git_ref(f"refs/heads/{test_branch_name}", main_branch.commit.sha)
-                        permissions['create_branches'] = True
-                        logger.info(f"✅ Can create branches - test successful")
-                        
-                        # Clean up test branch immediately
-                        test_ref.delete()
-                        logger.info(f"🧹 Cleaned up test branch")
-                        
-                    except Exception as branch_error:
-                        permissions['create_branches'] = False
-                        logger.warning(f"❌ Cannot create branches: {branch_error}")
-                        
-                except Exception as e:
-                    permissions['read_branches'] = False
-                    permissions['create_branches'] = False
-                    logger.warning(f"❌ Cannot read branches: {e}")
-                
-                try:
-                    # Check if we can write (without actually writing)
-                    repo_perms = repo.permissions
-                    permissions['write'] = repo_perms.push
-                    permissions['admin'] = repo_perms.admin
-                    logger.info(f"📋 Repo permissions: push={repo_perms.push}, admin={repo_perms.admin}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Could not check repo permissions: {e}")
-                
-                repo_info = {
-                    'name': repo.full_name,
-                    'private': repo.private,
-                    'permissions': permissions,
-                    'default_branch': repo.default_branch
-                }
-                
-            except Exception as repo_error:
-                return jsonify({
-                    'error': f'Cannot access repository: {str(repo_error)}',
-                    'user': user.login
-                }), 403
+        if isinstance(repo_info, Exception):
+            return jsonify({
+                'error': f'Cannot access repository: {str(repo_info)}',
+                'user': token_info['login']
+            }), 403
+        if repo_info:
+            logger.info(f"📋 Repo permissions for {repo_info['name']}: {repo_info['permissions']}")
         
         return jsonify({
             'status': 'success',
-            'user': user.login,
-            'repo': repo_info,
+            'user': token_info['login'],
+            'scopes': token_info['scopes'],
+            'repo': repo_info or {},
             'message': 'Token is valid and has repository access'
         })
         
+    except (GitHubBusy, GitHubTimeout) as e:
+        return github_unavailable(e)
     except Exception as e:
         logger.error(f"Token validation error: {str(e)}")
         return jsonify({'error': f'Token validation failed: {str(e)}'}), 401
 
+async def validate_token_access(github_token, repo_full_name):
+    """(token info, repo permissions or None); a lookup GitHub refused is returned as its GitHubAPIError"""
+    lookups = [permission_probe.get_token_info(github_token)]
+    if repo_full_name:
+        lookups.append(permission_probe.get_repo_permissions(github_token, repo_full_name))
+    results = await asyncio.gather(*lookups, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception) and not isinstance(result, GitHubAPIError):
+            raise result  # transport failures and timeouts are not an answer about the token
+    return results[0], (results[1] if repo_full_name else None)
+
 @tasks_bp.route('/create-pr/<int:task_id>', methods=['POST'])
 def create_pull_request(task_id):
     """Create a pull request by applying the saved patch to a fresh repo clone"""
@@ -380,94 +454,105 @@ def create_pull_request(task_id):
         # Extract repo info from URL
         repo_parts = task['repo_url'].replace('https://github.com/', '').replace('.git', '')
         
-        # Create GitHub client
-        g = Github(github_token)
-        repo = g.get_repo(repo_parts)
-        
         # Determine branch strategy
         base_branch = task['target_branch']
         pr_branch = f"claude-code-{task_id}"
         
         logger.info(f"📋 Creating PR branch '{pr_branch}' from base '{base_branch}'")
-        
-        # Get the latest commit from the base branch
-        base_branch_obj = repo.get_branch(base_branch)
-        base_sha = base_branch_obj.commit.sha
-        
-        # Create new branch for the PR
-        try:
-            # Check if branch already exists
-            try:
-                existing_branch = repo.get_branch(pr_branch)
-                logger.warning(f"⚠️ Branch '{pr_branch}' already exists, deleting it first...")
-                repo.get_git_ref(f"heads/{pr_branch}").delete()
-                logger.info(f"🗑️ Deleted existing branch '{pr_branch}'")
-            except:
-                pass  # Branch doesn't exist, which is what we want
-            
-            # Create the new branch
-            new_ref = repo.create_git_ref(f"refs/heads/{pr_branch}", base_sha)
-            logger.info(f"✅ Created branch '{pr_branch}' from {base_sha[:8]}")
-            
-        except Exception as branch_error:
-            logger.error(f"❌ Failed to create branch '{pr_branch}': {str(branch_error)}")
-            
-            # Provide specific error messages based on the error
-            error_msg = str(branch_error).lower()
-            if "resource not accessible" in error_msg:
-                detailed_error = (
-                    f"GitHub token lacks permission to create branches. "
-                    f"Please ensure your token has 'repo' scope (not just 'public_repo'). "
-                    f"Error: {branch_error}"
-                )
-            elif "already exists" in error_msg:
-                detailed_error = f"Branch '{pr_branch}' already exists. Please try again or use a different task."
-            else:
-                detailed_error = f"Failed to create branch '{pr_branch}': {branch_error}"
-                
-            return jsonify({'error': detailed_error}), 403
-        
-        # Apply the patch by creating/updating files
         logger.info(f"📦 Applying patch with {len(task.get('changed_files', []))} changed files...")
         
-        # Parse and apply the git patch to the repository
-        patch_content = task['git_patch']
-        files_updated = apply_patch_to_github_repo(repo, pr_branch, patch_content, task)
+        # Branch, patch and pull request in one coroutine on the GitHub loop, cancelled as a whole at the deadline
+        try:
+            pr, files_updated = github_client.run(
+                open_pull_request, github_client.session(github_token), repo_parts, base_branch, pr_branch,
+                task, pr_title, pr_body, deadline=GITHUB_PR_DEADLINE_SECONDS
+            )
+        except BranchCreationError as branch_error:
+            return jsonify({'error': str(branch_error)}), 403
         
         if not files_updated:
             return jsonify({'error': 'Failed to apply patch - no file changes extracted'}), 500
-            
-        logger.info(f"✅ Applied patch, updated {len(files_updated)} files")
-        
-        # Create pull request
-        pr = repo.create_pull(
-            title=pr_title,
-            body=pr_body,
-            head=pr_branch,
-            base=base_branch
-        )
         
         # Update task with PR information
         DatabaseOperations.update_task(task_id, user_id, {
             'pr_branch': pr_branch,
-            'pr_number': pr.number,
-            'pr_url': pr.html_url
+            'pr_number': pr['number'],
+            'pr_url': pr['html_url']
         })
         
-        logger.info(f"🎉 Created PR #{pr.number}: {pr.html_url}")
+        logger.info(f"🎉 Created PR #{pr['number']}: {pr['html_url']}")
         
         return jsonify({
             'status': 'success',
-            'pr_url': pr.html_url,
-            'pr_number': pr.number,
+            'pr_url': pr['html_url'],
+            'pr_number': pr['number'],
             'branch': pr_branch,
             'files_updated': len(files_updated)
         })
         
+    except (GitHubBusy, GitHubTimeout) as e:
+        return github_unavailable(e)
     except Exception as e:
         logger.error(f"Error creating PR: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+class BranchCreationError(Exception):
+    """The PR branch could not be created; the message is shown to the user"""
+
+
+async def open_pull_request(github, repo_full_name, base_branch, pr_branch, task, title, body):
+    """Create the PR branch from the base branch, commit the task's patch to it and open the PR"""
+    repo_path = f"/repos/{repo_full_name}"
+    
+    # The base branch and any leftover PR branch are looked up together
+    base, existing = await asyncio.gather(
+        github.get(f"{repo_path}/branches/{quote(base_branch, safe='')}", 'get_branch'),
+        github.request('GET', f"{repo_path}/git/ref/heads/{quote(pr_branch)}", 'get_branch', allow=(404,))
+    )
+    base_sha = base['commit']['sha']
+    
+    try:
+        if existing.status == 200:
+            logger.warning(f"⚠️ Branch '{pr_branch}' already exists, deleting it first...")
+            await github.delete(f"{repo_path}/git/refs/heads/{quote(pr_branch)}", 'delete_branch')
+            logger.info(f"🗑️ Deleted existing branch '{pr_branch}'")
+        
+        # Create the new branch
+        await github.post(f"{repo_path}/git/refs", 'create_branch', {'ref': f"refs/heads/{pr_branch}", 'sha': base_sha})
+        logger.info(f"✅ Created branch '{pr_branch}' from {base_sha[:8]}")
+        
+    except GitHubAPIError as branch_error:
+        logger.error(f"❌ Failed to create branch '{pr_branch}': {str(branch_error)}")
+        
+        # Provide specific error messages based on the error
+        error_msg = str(branch_error).lower()
+        if "resource not accessible" in error_msg:
+            detailed_error = (
+                f"GitHub token lacks permission to create branches. "
+                f"Please ensure your token has 'repo' scope (not just 'public_repo'). "
+                f"Error: {branch_error}"
+            )
+        elif "already exists" in error_msg:
+            detailed_error = f"Branch '{pr_branch}' already exists. Please try again or use a different task."
+        else:
+            detailed_error = f"Failed to create branch '{pr_branch}': {branch_error}"
+        raise BranchCreationError(detailed_error)
+    
+    # Parse and apply the git patch to the repository
+    files_updated = await apply_patch_to_github_repo(github, repo_full_name, pr_branch, task['git_patch'], task)
+    if not files_updated:
+        return None, []
+    logger.info(f"✅ Applied patch, updated {len(files_updated)} files")
+    
+    pr = await github.post(f"{repo_path}/pulls", 'create_pull', {
+        'title': title,
+        'body': body,
+        'head': pr_branch,
+        'base': base_branch
+    })
+    return pr, files_updated
+
 # Legacy task migration endpoint
 @tasks_bp.route('/migrate-legacy-tasks', methods=['POST'])
 def migrate_legacy_tasks():
@@ -518,54 +603,94 @@ def migrate_legacy_tasks():
         return jsonify({'error': str(e)}), 500
 
 
-def apply_patch_to_github_repo(repo, branch, patch_content, task):
+def parse_patch_files(patch_content):
+    """Split a git patch into {path: diff lines from the file's first @@ up to the next file}"""
+    file_diffs = {}
+    
+    # This is a simplified patch parser - for production you might want a more robust one
+    lines = patch_content.split('\n')
+    i = 0
+    
+    while i < len(lines):
+        line = lines[i]
+        
+        # Look for file headers in patch format
+        if line.startswith('--- a/') or line.startswith('--- /dev/null'):
+            # Next line should be +++ b/filename
+            if i + 1 < len(lines) and lines[i + 1].startswith('+++ b/'):
+                current_file = lines[i + 1][6:]  # Remove '+++ b/'
+                logger.info(f"📄 Found file change: {current_file}")
+                
+                # Skip to the actual diff content (after @@)
+                j = i + 2
+                while j < len(lines) and not lines[j].startswith('@@'):
+                    j += 1
+                
+                if j < len(lines):
+                    # Only this file's section: apply_diff_to_content stops at the next 'diff --git' anyway,
+                    # and slicing to the end of the patch for every file made parsing quadratic
+                    end = j + 1
+                    while end < len(lines) and not lines[end].startswith('diff --git'):
+                        end += 1
+                    file_diffs[current_file] = lines[j:end]
+                
+                i = j
+        i += 1
+    
+    return file_diffs
+
+
+async def get_file_content(github, repo_path, path, ref):
+    """(text, blob sha) of a file on ``ref``, or ("", None) for a file the patch creates"""
+    contents_path = f"{repo_path}/contents/{quote(path)}"
+    response = await github.request('GET', contents_path, 'get_contents', params={'ref': ref}, allow=(404,))
+    if response.status == 404:
+        logger.info(f"📝 New file: {path}")
+        return "", None
+    
+    try:
+        if response.data.get('encoding') == 'base64':
+            content = base64.b64decode(response.data['content']).decode('utf-8')
+        else:
+            # Files over 1 MB come without inline content; fetch the raw bytes instead
+            raw = await github.request('GET', contents_path, 'get_contents', params={'ref': ref},
+                                       headers={'Accept': 'application/vnd.github.raw'})
+            content = raw.body.decode('utf-8')
+    except UnicodeDecodeError:
+        logger.warning(f"⚠️ {path} is not UTF-8 text, treating it as a new file")
+        return "", response.data.get('sha')
+    
+    logger.info(f"📥 Got original content for {path}")
+    return content, response.data.get('sha')
+
+
+async def apply_patch_to_github_repo(github, repo_full_name, branch, patch_content, task):
     """Apply a git patch to a GitHub repository using the GitHub API"""
     try:
         logger.info(f"🔧 Parsing patch content...")
+        repo_path = f"/repos/{repo_full_name}"
         
         # Parse git patch format to extract file changes
-        files_to_update = {}
-        current_file = None
-        new_content_lines = []
+        file_diffs = parse_patch_files(patch_content)
+        if not file_diffs:
+            logger.warning("⚠️ No files to update")
+            return []
         
-        # This is a simplified patch parser - for production you might want a more robust one
-        lines = patch_content.split('\n')
-        i = 0
+        # Fetch every original file and the branch head concurrently
+        current_commit, *originals = await asyncio.gather(
+            github.get(f"{repo_path}/commits/{quote(branch)}", 'get_commit'),
+            *(get_file_content(github, repo_path, path, branch) for path in file_diffs)
+        )
         
-        while i < len(lines):
-            line = lines[i]
-            
-            # Look for file headers in patch format
-            if line.startswith('--- a/') or line.startswith('--- /dev/null'):
-                # Next line should be +++ b/filename
-                if i + 1 < len(lines) and lines[i + 1].startswith('+++ b/'):
-                    current_file = lines[i + 1][6:]  # Remove '+++ b/'
-                    logger.info(f"📄 Found file change: {current_file}")
-                    
-                    # Get the original file content if it exists
-                    try:
-                        file_obj = repo.get_contents(current_file, ref=branch)
-                        original_content = file_obj.decoded_content.decode('utf-8')
-                        logger.info(f"📥 Got original content for {current_file}")
-                    except:
-                        original_content = ""  # New file
-                        logger.info(f"📝 New file: {current_file}")
-                    
-                    # For simplicity, we'll reconstruct the file from the diff
-                    # Skip to the actual diff content (after @@)
-                    j = i + 2
-                    while j < len(lines) and not lines[j].startswith('@@'):
-                        j += 1
-                    
-                    if j < len(lines):
-                        # Apply the diff changes
-                        new_content = apply_diff_to_content(original_content, lines[j:], current_file)
-                        if new_content is not None:
-                            files_to_update[current_file] = new_content
-                            logger.info(f"✅ Prepared update for {current_file}")
-                    
-                    i = j
-            i += 1
+        # For simplicity, we'll reconstruct each file from the diff
+        files_to_update = {}
+        file_shas = {}
+        for (path, diff_lines), (original_content, sha) in zip(file_diffs.items(), originals):
+            new_content = apply_diff_to_content(original_content, diff_lines, path)
+            if new_content is not None:
+                files_to_update[path] = new_content
+                file_shas[path] = sha
+                logger.info(f"✅ Prepared update for {path}")
         
         # Create a single commit with all file changes using GitHub's Tree API
         if not files_to_update:
@@ -583,75 +708,64 @@ def apply_patch_to_github_repo(repo, branch, patch_content, task):
                     break
         
         try:
-            # Get the current commit to build upon
-            current_commit = repo.get_commit(branch)
+            # Create a blob for every file at once
+            blobs = await asyncio.gather(*(
+                github.post(f"{repo_path}/git/blobs", 'create_blob', {'content': content, 'encoding': 'utf-8'})
+                for content in files_to_update.values()
+            ))
             
             # Create tree elements for all changed files
             tree_elements = []
-            
-            for file_path, new_content in files_to_update.items():
-                # Create a blob for the file content
-                blob = repo.create_git_blob(new_content, "utf-8")
-                
-                # Add to tree elements
+            for file_path, blob in zip(files_to_update, blobs):
                 tree_elements.append({
                     "path": file_path,
                     "mode": "100644",  # Normal file mode
                     "type": "blob",
-                    "sha": blob.sha
+                    "sha": blob['sha']
                 })
-                
-                logger.info(f"📝 Prepared blob for {file_path}")
                 updated_files.append(file_path)
+            logger.info(f"📝 Prepared {len(blobs)} blobs")
             
             # Create a new tree with all the changes
-            new_tree = repo.create_git_tree(tree_elements, base_tree=current_commit.commit.tree)
+            new_tree = await github.post(f"{repo_path}/git/trees", 'create_tree', {
+                'base_tree': current_commit['commit']['tree']['sha'],
+                'tree': tree_elements
+            })
             
             # Create a single commit with all the changes
-            new_commit = repo.create_git_commit(
-                message=commit_message,
-                tree=new_tree,
-                parents=[current_commit.commit]
-            )
+            new_commit = await github.post(f"{repo_path}/git/commits", 'create_commit', {
+                'message': commit_message,
+                'tree': new_tree['sha'],
+                'parents': [current_commit['sha']]
+            })
             
             # Update the branch to point to the new commit
-            ref = repo.get_git_ref(f"heads/{branch}")
-            ref.edit(new_commit.sha)
+            await github.patch(f"{repo_path}/git/refs/heads/{quote(branch)}", 'update_ref', {'sha': new_commit['sha']})
             
-            logger.info(f"✅ Created single commit {new_commit.sha[:8]} with {len(updated_files)} files")
+            logger.info(f"✅ Created single commit {new_commit['sha'][:8]} with {len(updated_files)} files")
             
-        except Exception as commit_error:
+        except GitHubAPIError as commit_error:
             logger.error(f"❌ Failed to create single commit: {commit_error}")
             # Fallback to individual file updates if tree method fails
             logger.info("🔄 Falling back to individual file updates...")
+            updated_files = []
             
+            # One at a time: each update moves the branch head the next one builds on
             for file_path, new_content in files_to_update.items():
                 try:
-                    # Check if file exists
-                    try:
-                        file_obj = repo.get_contents(file_path, ref=branch)
-                        # Update existing file
-                        repo.update_file(
-                            path=file_path,
-                            message=commit_message,
-                            content=new_content,
-                            sha=file_obj.sha,
-                            branch=branch
-                        )
-                        logger.info(f"📝 Updated existing file: {file_path}")
-                    except:
-                        # Create new file
-                        repo.create_file(
-                            path=file_path,
-                            message=commit_message,
-                            content=new_content,
-                            branch=branch
-                        )
-                        logger.info(f"🆕 Created new file: {file_path}")
+                    update = {
+                        'message': commit_message,
+                        'content': base64.b64encode(new_content.encode('utf-8')).decode('ascii'),
+                        'branch': branch
+                    }
+                    if file_shas[file_path]:
+                        update['sha'] = file_shas[file_path]
+                    await github.request('PUT', f"{repo_path}/contents/{quote(file_path)}", 'update_file', json=update)
+                    logger.info(f"{'📝 Updated existing' if file_shas[file_path] else '🆕 Created new'} file: {file_path}")
                     
                     updated_files.append(file_path)
                     
-                except Exception as file_error:
+                except GitHubAPIError as file_error:
                     logger.error(f"❌ Failed to update {file_path}: {file_error}")
         
         return updated_files
@@ -752,55 +866,75 @@ def fetch_github_repos():
         if not github_token:
             return jsonify({'error': 'github_token is required'}), 400
         
-        # Create GitHub client
-        g = Github(github_token)
-        
-        # Get authenticated user's repositories
-        user = g.get_user()
-        repos = []
-        
-        # Fetch user's repositories (both owned and accessible)
-        for repo in user.get_repos():
-            # Include both public and private repos the user has access to
-            repo_data = {
-                'id': repo.id,
-                'name': repo.name,
-                'full_name': repo.full_name,
-                'description': repo.description,
-                'private': repo.private,
-                'fork': repo.fork,
-                'created_at': repo.created_at.isoformat() if repo.created_at else None,
-                'updated_at': repo.updated_at.isoformat() if repo.updated_at else None,
-                'pushed_at': repo.pushed_at.isoformat() if repo.pushed_at else None,
-                'clone_url': repo.clone_url,
-                'ssh_url': repo.ssh_url,
-                'html_url': repo.html_url,
-                'default_branch': repo.default_branch,
-                'language': repo.language,
-                'stargazers_count': repo.stargazers_count,
-                'forks_count': repo.forks_count,
-                'open_issues_count': repo.open_issues_count,
-                'size': repo.size,
-                'permissions': {
-                    'admin': repo.permissions.admin,
-                    'push': repo.permissions.push,
-                    'pull': repo.permissions.pull
-                }
-            }
-            repos.append(repo_data)
+        # User and every page of repositories, fetched concurrently
+        user, repos = github_client.run(fetch_user_repositories, github_client.session(github_token))
         
         # Sort by updated_at (most recently updated first)
         repos.sort(key=lambda x: x['updated_at'] or '', reverse=True)
         
-        logger.info(f"📦 Fetched {len(repos)} repositories for user {user.login}")
+        logger.info(f"📦 Fetched {len(repos)} repositories for user {user['login']}")
         
         return jsonify({
             'status': 'success',
-            'user': user.login,
+            'user': user['login'],
             'repositories': repos,
             'total_count': len(repos)
         })
         
+    except (GitHubBusy, GitHubTimeout) as e:
+        return github_unavailable(e)
     except Exception as e:
         logger.error(f"Error fetching GitHub repositories: {str(e)}")
-        return jsonify({'error': f'Failed to fetch repositories: {str(e)}'}), 401
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+REPOS_PER_PAGE = 100
+LAST_PAGE_LINK = re.compile(r'<[^>]*[?&]page=(\d+)[^>]*>;\s*rel="last"')
+
+
+def _timestamp(value):
+    # Same format PyGithub's datetime.isoformat() produced
+    return value.replace('Z', '+00:00') if value else None
+
+
+def repository_summary(repo):
+    permissions = repo.get('permissions') or {}
+    return {
+        'id': repo['id'],
+        'name': repo['name'],
+        'full_name': repo['full_name'],
+        'description': repo.get('description'),
+        'private': repo.get('private'),
+        'fork': repo.get('fork'),
+        'created_at': _timestamp(repo.get('created_at')),
+        'updated_at': _timestamp(repo.get('updated_at')),
+        'pushed_at': _timestamp(repo.get('pushed_at')),
+        'clone_url': repo.get('clone_url'),
+        'ssh_url': repo.get('ssh_url'),
+        'html_url': repo.get('html_url'),
+        'default_branch': repo.get('default_branch'),
+        'language': repo.get('language'),
+        'stargazers_count': repo.get('stargazers_count'),
+        'forks_count': repo.get('forks_count'),
+        'open_issues_count': repo.get('open_issues_count'),
+        'size': repo.get('size'),
+        'permissions': {
+            'admin': permissions.get('admin', False),
+            'push': permissions.get('push', False),
+            'pull': permissions.get('pull', False)
+        }
+    }
+
+
+async def fetch_user_repositories(github):
+    """The authenticated user and all repositories they can access (owned and shared)"""
+    def page(number):
+        return github.request('GET', '/user/repos', 'list_repos', params={'per_page': REPOS_PER_PAGE, 'page': number})
+    
+    # The first page's Link header says how many more there are; fetch those all at once
+    user, first = await asyncio.gather(github.get('/user', 'get_user'), page(1))
+    last = LAST_PAGE_LINK.search(first.headers.get('Link', ''))
+    rest = await asyncio.gather(*(page(n) for n in range(2, int(last.group(1)) + 1))) if last else []
+    
+    repos = [repository_summary(repo) for response in (first, *rest) for repo in response.data]
+    return user, repos
@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the unit tests (run from server/: ``python -m pytest -q``).
+
+Every test gets a fresh in-memory database (benchmarks/fakes.py), so nothing
+here needs Supabase credentials or network access.
+"""
+import os
+import sys
+
+import pytest
+
+# Keep module-level singletons off real host state before anything imports them
+os.environ.setdefault('AGENT_SEMAPHORE_DIR', os.path.join('/tmp', f'async-code-test-semaphores-{os.getpid()}'))
+os.environ.setdefault('CLAUDE_OAUTH_PROACTIVE_REFRESH', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import install_fake_supabase  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """A fresh in-memory Supabase behind DatabaseOperations"""
+    return install_fake_supabase()
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from utils.admission import AdmissionController, ResourceProfile, parse_size
+
+GB = 1024 ** 3
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController(ResourceProfile(4.0, 8 * GB))
+
+
+def test_parse_size():
+    assert parse_size('512m') == 512 * 1024 ** 2
+    assert parse_size('2g') == 2 * GB
+    assert parse_size('1.5G') == int(1.5 * GB)
+    assert parse_size('1048576') == 1048576
+    with pytest.raises(ValueError):
+        parse_size('lots')
+
+
+def test_reservations_add_up_and_release(controller):
+    task = ResourceProfile(1.5, 3 * GB)
+    assert controller.try_admit(1, task)
+    assert controller.try_admit(2, task)
+    # A third would need 4.5 CPUs and 9 GB
+    assert not controller.try_admit(3, task)
+
+    snapshot = controller.snapshot()
+    assert snapshot['reserved'] == {'cpus': 3.0, 'memory_bytes': 6 * GB}
+    assert snapshot['available'] == {'cpus': 1.0, 'memory_bytes': 2 * GB}
+    assert snapshot['running_tasks'] == 2
+
+    controller.release(1)
+    assert controller.try_admit(3, task)
+    assert controller.snapshot()['reserved'] == {'cpus': 3.0, 'memory_bytes': 6 * GB}
+
+
+def test_admit_and_release_are_idempotent(controller):
+    task = ResourceProfile(1.0, GB)
+    assert controller.try_admit(1, task)
+    assert controller.try_admit(1, task)
+    assert controller.snapshot()['reserved']['cpus'] == 1.0
+
+    controller.release(1)
+    controller.release(1)
+    controller.release(99)
+    assert controller.snapshot()['reserved'] == {'cpus': 0.0, 'memory_bytes': 0}
+
+
+def test_memory_alone_can_block_admission(controller):
+    assert controller.try_admit(1, ResourceProfile(0.5, 7 * GB))
+    assert not controller.fits(ResourceProfile(0.5, 2 * GB))
+
+
+def test_oversized_task_runs_only_on_an_idle_host(controller):
+    huge = ResourceProfile(16.0, 64 * GB)
+    assert controller.try_admit(1, ResourceProfile(1.0, GB))
+    assert not controller.try_admit(2, huge)
+    controller.release(1)
+    assert controller.try_admit(2, huge)
+    assert not controller.try_admit(3, ResourceProfile(0.1, 1))
+
+
+def test_admit_waits_for_a_release(controller):
+    assert controller.try_admit(1, ResourceProfile(4.0, GB))
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit(2, ResourceProfile(2.0, GB), timeout=5)))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    controller.release(1)
+    waiter.join(5)
+    assert admitted == [True]
+    assert controller.snapshot()['reserved']['cpus'] == 2.0
+
+
+def test_admit_times_out(controller):
+    assert controller.try_admit(1, ResourceProfile(4.0, GB))
+    assert not controller.admit(2, ResourceProfile(1.0, GB), timeout=0.05)
+    assert controller.snapshot()['running_tasks'] == 1
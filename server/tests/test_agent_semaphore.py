@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import utils.scheduler as scheduler_module
+from utils.admission import AdmissionController, ResourceProfile, parse_size
+from utils.agent_semaphore import AgentSemaphore
+from utils.scheduler import TaskScheduler
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
+
+
+def test_try_acquire_stops_at_the_limit(directory):
+    semaphore = AgentSemaphore('codex', 2, directory)
+    first, second = semaphore.try_acquire(), semaphore.try_acquire()
+    assert first and second and first.index != second.index
+    assert semaphore.try_acquire() is None
+
+    first.release()
+    first.release()  # idempotent: must not free a second slot
+    third = semaphore.try_acquire()
+    assert third and third.index == first.index
+    assert semaphore.try_acquire() is None
+
+
+def test_slots_are_shared_through_the_lock_files(directory):
+    # Two semaphores on the same directory stand in for two processes on one host
+    ours, other_process = AgentSemaphore('codex', 2, directory), AgentSemaphore('codex', 2, directory)
+    held = [other_process.try_acquire(), other_process.try_acquire()]
+    assert ours.try_acquire() is None
+
+    held[0].release()
+    slot = ours.try_acquire()
+    assert slot and slot.index == held[0].index
+
+
+def test_acquire_waits_for_another_process(directory):
+    ours, other_process = AgentSemaphore('codex', 1, directory), AgentSemaphore('codex', 1, directory)
+    held = other_process.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(ours.acquire()))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+
+    held.release()
+    waiter.join(5)
+    assert len(acquired) == 1
+    acquired[0].release()
+
+
+def test_slot_context_manager_releases(directory):
+    semaphore = AgentSemaphore('claude', 1, directory)
+    with semaphore.slot():
+        assert semaphore.try_acquire() is None
+    slot = semaphore.try_acquire()
+    assert slot is not None
+    slot.release()
+
+
+def test_scheduler_skips_an_agent_without_free_slots(directory, monkeypatch):
+    controller = AdmissionController(ResourceProfile(8.0, parse_size('16g')))
+    codex = AgentSemaphore('codex', 1, directory)
+    monkeypatch.setattr(scheduler_module, 'admission_controller', controller)
+    monkeypatch.setattr(scheduler_module, 'execution_semaphore', lambda agent: codex if agent == 'codex' else None)
+    scheduler = TaskScheduler(execute=lambda *args: None, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+
+    busy = codex.try_acquire()
+    scheduler.submit(1, 'alice', 'token', agent='codex', priority='interactive')
+    scheduler.submit(2, 'bob', 'token', agent='claude', priority='batch')
+
+    # The codex task waits in the queue without a reservation; the claude task goes past it
+    user, project, entry = scheduler._pick()
+    assert entry.task_id == 2
+    assert controller.snapshot()['running_tasks'] == 1
+    assert scheduler._pick() is None
+
+    busy.release()
+    user, project, entry = scheduler._pick()
+    assert entry.task_id == 1 and entry.agent_slot is not None
+    assert codex.try_acquire() is None
+
+    # Finishing the task returns its slot and its reservation
+    user.record_dispatch(0.0)
+    project.record_dispatch(0.0)
+    scheduler._running += 1
+    scheduler._finished(user, project, entry)
+    assert controller.snapshot()['running_tasks'] == 1
+    slot = codex.try_acquire()
+    assert slot is not None
+    slot.release()
+
+
+def test_scheduler_returns_the_slot_when_admission_refuses(directory, monkeypatch):
+    controller = AdmissionController(ResourceProfile(1.0, parse_size('2g')))
+    codex = AgentSemaphore('codex', 1, directory)
+    monkeypatch.setattr(scheduler_module, 'admission_controller', controller)
+    monkeypatch.setattr(scheduler_module, 'execution_semaphore', lambda agent: codex)
+    scheduler = TaskScheduler(execute=lambda *args: None, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+
+    assert controller.try_admit(99, ResourceProfile(1.0, parse_size('1g')))
+    scheduler.submit(1, 'alice', 'token', agent='codex')
+    assert scheduler._pick() is None
+    slot = codex.try_acquire()
+    assert slot is not None
+    slot.release()
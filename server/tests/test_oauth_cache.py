@@ -0,0 +1,109 @@
+import time
+import threading
+
+import pytest
+
+from utils.claude_oauth import ClaudeOAuthManager, OAuthTokenCache
+
+
+def tokens(refresh_token: str, expires_in: float, access_token: str = None):
+    return {'access_token': access_token or f'access-{refresh_token}', 'refresh_token': refresh_token,
+            'expires_at': int(time.time() + expires_in)}
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    """Replace the token endpoint: each call issues a new refresh token valid for an hour"""
+    calls = []
+    lock = threading.Lock()
+
+    def refresh_access_token(manager):
+        time.sleep(0.05)  # long enough for concurrent callers to pile up on the user lock
+        with lock:
+            calls.append(manager.refresh_token)
+            return True, tokens(f'{manager.refresh_token}-r{len(calls)}', 3600)
+
+    monkeypatch.setattr(ClaudeOAuthManager, 'refresh_access_token', refresh_access_token)
+    return calls
+
+
+def test_concurrent_callers_share_one_refresh(refreshes):
+    cache = OAuthTokenCache()
+    expiring = tokens('rt', 60)
+    persisted, results = [], []
+    barrier = threading.Barrier(8)
+
+    def task():
+        barrier.wait()
+        results.append(cache.ensure_valid_tokens('alice', dict(expiring), persist=persisted.append))
+
+    threads = [threading.Thread(target=task) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert refreshes == ['rt']
+    assert len(persisted) == 1
+    assert all(success for success, _ in results)
+    assert {result['refresh_token'] for _, result in results} == {'rt-r1'}
+    assert cache.get('alice')['refresh_token'] == 'rt-r1'
+
+
+def test_valid_tokens_are_not_refreshed(refreshes):
+    cache = OAuthTokenCache()
+    valid = tokens('rt', 3600)
+    assert cache.ensure_valid_tokens('alice', valid) == (True, valid)
+    assert refreshes == []
+    assert cache.get('alice') == valid
+
+
+def test_users_refresh_independently(refreshes):
+    cache = OAuthTokenCache()
+    cache.ensure_valid_tokens('alice', tokens('a', 60))
+    cache.ensure_valid_tokens('bob', tokens('b', 60))
+    assert sorted(refreshes) == ['a', 'b']
+
+
+def test_stale_copy_of_the_same_login_uses_the_cache(refreshes):
+    cache = OAuthTokenCache()
+    stored = tokens('rt', 60)
+    _, refreshed = cache.ensure_valid_tokens('alice', stored)
+
+    # Another task still holds the preferences read before the refresh
+    success, current = cache.ensure_valid_tokens('alice', dict(stored))
+    assert success and current == refreshed
+    assert refreshes == ['rt']
+
+    cache.put('alice', dict(stored))
+    assert cache.get('alice') == refreshed
+
+
+def test_new_login_replaces_the_cached_tokens(refreshes):
+    cache = OAuthTokenCache()
+    cache.ensure_valid_tokens('alice', tokens('old', 60))
+
+    # Signing in again issues an unrelated refresh token, even if it expires sooner
+    login = tokens('new', 1800)
+    assert cache.ensure_valid_tokens('alice', login) == (True, login)
+    assert cache.get('alice') == login
+
+    # Tokens outside the cached login's lineage always win: the stored preferences stay authoritative
+    other = tokens('old-r1', 7200)
+    cache.put('alice', other)
+    assert cache.get('alice') == other
+
+
+def test_failed_refresh_keeps_the_cache(monkeypatch):
+    monkeypatch.setattr(ClaudeOAuthManager, 'refresh_access_token', lambda manager: (False, 'HTTP 400'))
+    cache = OAuthTokenCache()
+    persisted = []
+    assert cache.ensure_valid_tokens('alice', tokens('rt', 60), persist=persisted.append) == (False, None)
+    assert persisted == []
+    assert cache.get('alice') is None
+
+
+def test_incomplete_tokens_are_rejected(refreshes):
+    cache = OAuthTokenCache()
+    assert cache.ensure_valid_tokens('alice', {'access_token': 'a'}) == (False, None)
+    assert refreshes == []
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import utils.scheduler as scheduler_module
+from utils.admission import AdmissionController, ResourceProfile, parse_size
+from utils.scheduler import TaskScheduler
+
+
+class Recorder:
+    """Scheduler ``execute`` callable that records the dispatch order"""
+
+    def __init__(self, expected: int):
+        self.order = []
+        self.expected = expected
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, task_id, user_id, github_token, agent):
+        with self._lock:
+            self.order.append(task_id)
+            if len(self.order) >= self.expected:
+                self.done.set()
+
+
+@pytest.fixture
+def one_at_a_time(monkeypatch):
+    """Room for a single task, so the scheduler dispatches strictly one after another"""
+    controller = AdmissionController(ResourceProfile(1.0, parse_size('2g')))
+    monkeypatch.setattr(scheduler_module, 'admission_controller', controller)
+    monkeypatch.setattr(scheduler_module, 'execution_semaphore', lambda agent: None)
+    return controller
+
+
+def run_in_order(submissions, monkeypatch, expected=None):
+    """Queue every submission before the dispatch thread starts, then return the dispatch order"""
+    recorder = Recorder(expected or len(submissions))
+    scheduler = TaskScheduler(execute=recorder, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+    for task_id, user_id, priority in submissions:
+        scheduler.submit(task_id, user_id, 'token', priority=priority)
+    TaskScheduler.start(scheduler)
+    assert recorder.done.wait(5), f"dispatched only {recorder.order}"
+    return recorder.order
+
+
+def test_higher_priority_class_dispatches_first(one_at_a_time, monkeypatch):
+    order = run_in_order([(1, 'alice', 'batch'), (2, 'alice', 'normal'), (3, 'alice', 'interactive')], monkeypatch)
+    assert order == [3, 2, 1]
+
+
+def test_users_share_dispatches_fairly(one_at_a_time, monkeypatch):
+    submissions = [(n, 'alice', 'normal') for n in range(1, 5)] + [(n, 'bob', 'normal') for n in range(5, 7)]
+    order = run_in_order(submissions, monkeypatch)
+    assert order == [1, 5, 2, 6, 3, 4]
+
+
+def test_user_weight_scales_their_share(one_at_a_time, monkeypatch, db):
+    db.seed('users', [{'id': 'bob', 'preferences': {'scheduler': {'weight': 2}}}])
+    submissions = [(n, 'alice', 'normal') for n in range(1, 4)] + [(n, 'bob', 'normal') for n in range(4, 8)]
+    order = run_in_order(submissions, monkeypatch)
+    # Bob's virtual clock advances half as fast, so he gets two dispatches for each of Alice's
+    assert order[:6] == [1, 4, 5, 2, 6, 7]
+
+
+def test_waiting_tasks_age_into_higher_classes(one_at_a_time, monkeypatch):
+    monkeypatch.setattr(scheduler_module, 'PRIORITY_AGING_SECONDS', 0.2)
+    recorder = Recorder(2)
+    scheduler = TaskScheduler(execute=recorder, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+    scheduler.submit(1, 'alice', 'token', priority='batch')
+    threading.Event().wait(0.45)  # two aging steps: batch -> interactive
+    scheduler.submit(2, 'bob', 'token', priority='interactive')
+    TaskScheduler.start(scheduler)
+    assert recorder.done.wait(5)
+    assert recorder.order == [1, 2]
+
+
+def test_user_quota_holds_back_their_tasks(monkeypatch, db):
+    monkeypatch.setattr(scheduler_module, 'admission_controller', AdmissionController(ResourceProfile(8.0, parse_size('16g'))))
+    monkeypatch.setattr(scheduler_module, 'execution_semaphore', lambda agent: None)
+    db.seed('users', [{'id': 'alice', 'preferences': {'scheduler': {'maxConcurrency': 1}}}])
+    scheduler = TaskScheduler(execute=lambda *args: None, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+    scheduler.submit(1, 'alice', 'token')
+    scheduler.submit(2, 'alice', 'token')
+    scheduler.submit(3, 'bob', 'token')
+
+    user, project, entry = scheduler._pick()
+    assert entry.task_id == 1
+    user.record_dispatch(0.0)
+    project.record_dispatch(0.0)
+    # Alice is at her quota, so Bob's task goes next even though Alice's was queued first
+    assert scheduler._pick()[2].task_id == 3
+    assert scheduler._pick() is None
+
+
+def test_cancel_removes_only_queued_tasks(one_at_a_time, monkeypatch):
+    scheduler = TaskScheduler(execute=lambda *args: None, max_workers=1)
+    monkeypatch.setattr(scheduler, 'start', lambda: None)
+    scheduler.submit(1, 'alice', 'token')
+    scheduler.submit(2, 'alice', 'token')
+
+    assert scheduler.cancel(1)
+    assert not scheduler.cancel(1)
+    assert scheduler.stats()['queued'] == 1
+    assert scheduler._pick()[2].task_id == 2
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+from utils.oauth_refresh import OAuthRefreshScheduler
+from utils.queue_tokens import QueueTokenCipher
+from utils.worker_node import WorkerNode
+
+
+class FakeDispatcher:
+    """Records cancellations; every task counts as still queued locally"""
+
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel(self, task_id, agent=None, container_id=None, abandon=False):
+        self.cancelled.append((task_id, abandon))
+        return True
+
+
+@pytest.fixture
+def node(monkeypatch):
+    monkeypatch.setenv('WORKER_LEASE_SECONDS', '60')
+    node = WorkerNode('node-a')
+    node._dispatcher = FakeDispatcher()
+    return node
+
+
+def claim(db, node, task_id, claimed_by=None, **fields):
+    """A task_queue row leased to ``claimed_by`` (default: ``node``), also held locally by ``node``"""
+    row = db.seed('task_queue', [{'task_id': task_id, 'user_id': 'alice', 'claimed_by': claimed_by or node.node_id,
+                                  'attempts': 1, **fields}])[0]
+    node._claimed[task_id] = dict(row)
+    return row
+
+
+def test_queue_token_round_trip():
+    cipher = QueueTokenCipher(Fernet.generate_key().decode())
+    cipher.check()
+    stored = cipher.encrypt('ghp_secret')
+    assert 'ghp_secret' not in stored
+    assert cipher.decrypt(stored) == 'ghp_secret'
+
+
+def test_queue_token_errors():
+    stored = QueueTokenCipher(Fernet.generate_key().decode()).encrypt('ghp_secret')
+    with pytest.raises(ValueError):
+        QueueTokenCipher(Fernet.generate_key().decode()).decrypt(stored)
+    with pytest.raises(ValueError):
+        QueueTokenCipher(Fernet.generate_key().decode()).decrypt('')
+    with pytest.raises(RuntimeError):
+        QueueTokenCipher('').check()
+
+
+def test_heartbeat_cancels_and_drops_lost_tasks(db, node):
+    claim(db, node, 1)
+    claim(db, node, 2, cancel_requested=True)
+    claim(db, node, 3, claimed_by='node-b')  # its lease lapsed and another node claimed it
+
+    node._heartbeat()
+
+    assert sorted(node._dispatcher.cancelled) == [(2, False), (3, True)]
+    assert list(node._claimed) == [1]
+    queue = {row['task_id']: row for row in db.tables['task_queue']}
+    # The cancelled task's row is cleared; the lost task's row belongs to node-b now
+    assert sorted(queue) == [1, 3]
+    assert queue[1]['lease_expires_at'] is not None
+    assert queue[3]['claimed_by'] == 'node-b'
+
+
+def test_heartbeat_elects_the_longest_running_node(db, node, monkeypatch):
+    monkeypatch.setenv('WORKER_LEASE_SECONDS', '60')
+    other = WorkerNode('node-b')
+    other._dispatcher = FakeDispatcher()
+
+    other._heartbeat(register=True)
+    time.sleep(0.01)
+    node._heartbeat(register=True)
+    other._heartbeat()
+    assert other.is_leader and not node.is_leader
+
+    # A draining leader hands over on the next heartbeat
+    other._heartbeat(status='draining')
+    node._heartbeat()
+    assert node.is_leader and not other.is_leader
+    assert node.stats()['leader']
+
+
+def test_only_the_leader_schedules_oauth_refreshes():
+    leading = []
+    scheduler = OAuthRefreshScheduler()
+    scheduler.leader_check = lambda: bool(leading)
+    tokens = {'access_token': 'a', 'refresh_token': 'r', 'expires_at': int(time.time()) + 3600}
+
+    scheduler.track('alice', tokens)
+    assert not scheduler._due
+
+    leading.append(True)
+    scheduler.track('alice', tokens)
+    assert scheduler._due['alice'] == tokens['expires_at'] - scheduler.lead_seconds
+
+    leading.clear()
+    scheduler._standby()
+    assert not scheduler._due and not scheduler._heap
+
+
+def test_operator_drain_and_resume(db, node):
+    node._heartbeat(register=True)
+    next(row for row in db.tables['worker_nodes'] if row['node_id'] == node.node_id)['status'] = 'draining'
+    node._heartbeat()
+    assert node.status == 'draining'
+    assert node._free_slots() == 0
+
+    next(row for row in db.tables['worker_nodes'] if row['node_id'] == node.node_id)['status'] = 'active'
+    node._heartbeat()
+    assert node.status == 'active'
@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional
+from .metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_RESERVED = Gauge(
+    'admission_reserved',
+    'Resources reserved by running tasks',
+    ['resource']
+)
+ADMISSION_CAPACITY = Gauge(
+    'admission_capacity',
+    'Host resources available to tasks',
+    ['resource']
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    'admission_wait_seconds',
+    'Time tasks waited for resources before being admitted'
+)
+
+_SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_size(value) -> int:
+    """Parse a Docker-style size ('2g', '512m', '1048576') into bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([bkmgt]?)b?\s*', str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+class ResourceProfile(NamedTuple):
+    """CPU and memory a task reserves for its whole run"""
+    cpus: float
+    memory: int
+
+
+def task_resource_profile(agent: str = 'claude') -> ResourceProfile:
+    """Resource profile for an agent, e.g. CODEX_TASK_CPUS / CODEX_TASK_MEMORY over TASK_CPUS / TASK_MEMORY"""
+    prefix = agent.upper()
+    cpus = os.getenv(f'{prefix}_TASK_CPUS') or os.getenv('TASK_CPUS', '1')
+    memory = os.getenv(f'{prefix}_TASK_MEMORY') or os.getenv('TASK_MEMORY', '2g')
+    return ResourceProfile(float(cpus), parse_size(memory))
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def detect_host_capacity() -> ResourceProfile:
+    """
+    Resources this process may hand out to tasks: HOST_CPUS / HOST_MEMORY if set,
+    otherwise the tighter of the cgroup (v2, then v1) limit and the machine's
+    CPU count and /proc/meminfo total.
+    """
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    memory = None
+    meminfo = _read_first_line('/proc/meminfo')
+    if meminfo and meminfo.startswith('MemTotal:'):
+        memory = int(meminfo.split()[1]) * 1024
+
+    # cgroup v2
+    cpu_max = _read_first_line('/sys/fs/cgroup/cpu.max')
+    if cpu_max and not cpu_max.startswith('max'):
+        quota, period = cpu_max.split()
+        cpus = min(cpus, int(quota) / int(period))
+    else:
+        # cgroup v1
+        quota = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if quota and period and int(quota) > 0:
+            cpus = min(cpus, int(quota) / int(period))
+
+    memory_limit = _read_first_line('/sys/fs/cgroup/memory.max') or _read_first_line('/sys/fs/cgroup/memory/memory.limit_in_bytes')
+    if memory_limit and memory_limit != 'max':
+        limit = int(memory_limit)
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if limit < (1 << 60):
+            memory = min(memory, limit) if memory else limit
+
+    if os.getenv('HOST_CPUS'):
+        cpus = float(os.getenv('HOST_CPUS'))
+    if os.getenv('HOST_MEMORY'):
+        memory = parse_size(os.getenv('HOST_MEMORY'))
+
+    # Leave headroom for the API process itself
+    headroom = parse_size(os.getenv('ADMISSION_RESERVED_MEMORY', '512m'))
+    return ResourceProfile(cpus, max(0, (memory or 0) - headroom))
+
+
+class AdmissionController:
+    """
+    Admits tasks only while their resource profile fits in the remaining host capacity.
+
+    A profile larger than the whole host is admitted only when nothing else is
+    running, so an oversized task cannot wait forever.
+    """
+
+    def __init__(self, capacity: ResourceProfile = None):
+        self.capacity = capacity or detect_host_capacity()
+        self._reservations: Dict[int, ResourceProfile] = {}
+        self._reserved_cpus = 0.0
+        self._reserved_memory = 0
+        self._cond = threading.Condition()
+
+        ADMISSION_CAPACITY.labels('cpus').set(self.capacity.cpus)
+        ADMISSION_CAPACITY.labels('memory_bytes').set(self.capacity.memory)
+        ADMISSION_RESERVED.labels('cpus').set_function(lambda: self._reserved_cpus)
+        ADMISSION_RESERVED.labels('memory_bytes').set_function(lambda: self._reserved_memory)
+        logger.info(f"📐 Admission capacity: {self.capacity.cpus:g} CPUs, {self.capacity.memory / 1024 ** 3:.1f} GiB")
+
+    def fits(self, profile: ResourceProfile) -> bool:
+        with self._cond:
+            return self._fits(profile)
+
+    def _fits(self, profile: ResourceProfile) -> bool:
+        if not self._reservations:
+            return True
+        return (self._reserved_cpus + profile.cpus <= self.capacity.cpus and
+                self._reserved_memory + profile.memory <= self.capacity.memory)
+
+    def _reserve(self, task_id: int, profile: ResourceProfile):
+        self._reservations[task_id] = profile
+        self._reserved_cpus += profile.cpus
+        self._reserved_memory += profile.memory
+
+    def try_admit(self, task_id: int, profile: ResourceProfile) -> bool:
+        """Reserve resources for a task if they fit right now"""
+        with self._cond:
+            if task_id in self._reservations:
+                return True
+            if not self._fits(profile):
+                return False
+            self._reserve(task_id, profile)
+            return True
+
+    def admit(self, task_id: int, profile: ResourceProfile, timeout: float = None) -> bool:
+        """Block until the task's profile fits (or timeout), then reserve it"""
+        started = time.monotonic()
+        with self._cond:
+            if task_id in self._reservations:
+                return True
+            if not self._cond.wait_for(lambda: self._fits(profile), timeout):
+                return False
+            self._reserve(task_id, profile)
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+        return True
+
+    def release(self, task_id: int):
+        """Return a task's reservation to the pool"""
+        with self._cond:
+            profile = self._reservations.pop(task_id, None)
+            if profile is None:
+                return
+            self._reserved_cpus -= profile.cpus
+            self._reserved_memory -= profile.memory
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        """Reserved vs available capacity"""
+        with self._cond:
+            return {
+                'capacity': {'cpus': self.capacity.cpus, 'memory_bytes': self.capacity.memory},
+                'reserved': {'cpus': self._reserved_cpus, 'memory_bytes': self._reserved_memory},
+                'available': {
+                    'cpus': max(0.0, self.capacity.cpus - self._reserved_cpus),
+                    'memory_bytes': max(0, self.capacity.memory - self._reserved_memory)
+                },
+                'running_tasks': len(self._reservations)
+            }
+
+
+# Process-wide controller shared by every executor
+admission_controller = AdmissionController()
@@ -0,0 +1,168 @@
+import os
+import time
+import fcntl
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from .metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+AGENT_SEMAPHORE_WAIT_SECONDS = Histogram(
+    'agent_semaphore_wait_seconds',
+    'Time tasks waited for an agent concurrency slot',
+    ['agent']
+)
+AGENT_SEMAPHORE_HELD = Gauge(
+    'agent_semaphore_held_slots',
+    'Agent concurrency slots held by this process',
+    ['agent']
+)
+
+# Agents throttled when no <AGENT>_MAX_CONCURRENT is set
+DEFAULT_AGENT_LIMITS = {'codex': 2}
+
+
+class _Slot:
+    """One held semaphore slot; release() is idempotent"""
+
+    def __init__(self, semaphore: 'AgentSemaphore', index: int, handle):
+        self.semaphore = semaphore
+        self.index = index
+        self._handle = handle
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.semaphore._release(self)
+
+
+class AgentSemaphore:
+    """
+    Counting semaphore shared by every process on the host.
+
+    Each of the ``limit`` slots is an flock on its own file under
+    AGENT_SEMAPHORE_DIR, so a slot held by a crashed process is released by the
+    kernel. Threads in this process first take an in-process semaphore, so only
+    as many threads as there are slots ever touch the lock files; when other
+    processes hold every slot, the thread blocks in flock() on one slot until
+    its holder lets go. ``try_acquire()`` never waits: the scheduler uses it so
+    a task only leaves the queue once it holds a slot.
+    """
+
+    def __init__(self, agent: str, limit: int, directory: str = None):
+        self.agent = agent
+        self.limit = max(1, limit)
+        self.directory = directory or os.getenv('AGENT_SEMAPHORE_DIR', '/tmp/async-code-semaphores')
+        os.makedirs(self.directory, exist_ok=True)
+        self._local = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self._held = set()
+        self._next = itertools.count()
+        AGENT_SEMAPHORE_HELD.labels(agent).set_function(lambda: len(self._held))
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f'{self.agent}.{index}.lock')
+
+    def _try_slot(self, index: int, blocking: bool):
+        handle = open(self._path(index), 'a')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except BlockingIOError:
+            handle.close()
+            return None
+        except Exception:
+            handle.close()
+            raise
+
+    def acquire(self) -> _Slot:
+        """Block until a slot is free on this host and return it"""
+        started = time.monotonic()
+        self._local.acquire()
+        try:
+            while True:
+                with self._lock:
+                    free = [i for i in range(self.limit) if i not in self._held]
+                for index in free:
+                    handle = self._try_slot(index, blocking=False)
+                    if handle:
+                        break
+                else:
+                    # Every free-looking slot is held by another process: wait on one of them
+                    index = free[next(self._next) % len(free)]
+                    handle = self._try_slot(index, blocking=True)
+                with self._lock:
+                    if index in self._held:
+                        # Another thread of ours took this slot while we were blocked
+                        handle.close()
+                        continue
+                    self._held.add(index)
+                break
+        except Exception:
+            self._local.release()
+            raise
+
+        waited = time.monotonic() - started
+        AGENT_SEMAPHORE_WAIT_SECONDS.labels(self.agent).observe(waited)
+        if waited > 1:
+            logger.info(f"🚦 Waited {waited:.1f}s for a {self.agent} slot ({self.limit} per host)")
+        return _Slot(self, index, handle)
+
+    def try_acquire(self) -> Optional[_Slot]:
+        """Take a free slot without waiting, or return None if every slot on the host is held"""
+        if not self._local.acquire(blocking=False):
+            return None
+        try:
+            with self._lock:
+                free = [i for i in range(self.limit) if i not in self._held]
+                for index in free:
+                    handle = self._try_slot(index, blocking=False)
+                    if handle:
+                        self._held.add(index)
+                        return _Slot(self, index, handle)
+        except Exception:
+            self._local.release()
+            raise
+        self._local.release()
+        return None
+
+    def _release(self, slot: _Slot):
+        try:
+            fcntl.flock(slot._handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            slot._handle.close()
+            with self._lock:
+                self._held.discard(slot.index)
+            self._local.release()
+
+    @contextmanager
+    def slot(self):
+        held = self.acquire()
+        try:
+            yield held
+        finally:
+            held.release()
+
+
+_semaphores: Dict[str, AgentSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def execution_semaphore(agent: str) -> Optional[AgentSemaphore]:
+    """The semaphore a task of ``agent`` runs under: its own in Docker mode, claude's in direct mode (one CLI)"""
+    docker_mode = os.getenv('EXECUTION_MODE', 'direct').lower() == 'docker' or os.getenv('FORCE_DOCKER', 'false').lower() == 'true'
+    return agent_semaphore(agent if docker_mode else 'claude')
+
+
+def agent_semaphore(agent: str) -> Optional[AgentSemaphore]:
+    """Host-wide semaphore for an agent, or None if the agent is not throttled (<AGENT>_MAX_CONCURRENT=0)"""
+    with _semaphores_lock:
+        if agent not in _semaphores:
+            limit = int(os.getenv(f'{agent.upper()}_MAX_CONCURRENT', DEFAULT_AGENT_LIMITS.get(agent, 0)))
+            _semaphores[agent] = AgentSemaphore(agent, limit) if limit > 0 else None
+        return _semaphores[agent]
@@ -0,0 +1,89 @@
+import os
+import signal
+import logging
+import threading
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """Raised inside an executor when its task has been cancelled"""
+
+
+class CancellationRegistry:
+    """
+    Process-wide record of cancelled tasks and the host processes running them.
+
+    Executors check ``is_cancelled()`` at their checkpoints and call
+    ``finish()`` when they are done. Direct-mode executors register their
+    subprocesses (started in their own session) so ``cancel()`` can kill the
+    whole process group at once. An abandoned task is cancelled without
+    writing its outcome, because another worker node owns it now.
+    """
+
+    def __init__(self):
+        self._cancelled: Set[int] = set()
+        self._abandoned: Set[int] = set()
+        self._processes: Dict[int, Set] = {}
+        self._lock = threading.Lock()
+
+    def cancel(self, task_id: int) -> int:
+        """Mark a task cancelled and kill its registered process groups; returns how many were signalled"""
+        with self._lock:
+            self._cancelled.add(task_id)
+            processes = list(self._processes.get(task_id, ()))
+        killed = 0
+        for process in processes:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                killed += 1
+            except ProcessLookupError:
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️  Failed to kill process group {process.pid} for task {task_id}: {e}")
+        return killed
+
+    def abandon(self, task_id: int) -> int:
+        """Cancel a task whose result must not be written (its lease passed to another node)"""
+        with self._lock:
+            self._abandoned.add(task_id)
+        return self.cancel(task_id)
+
+    def is_abandoned(self, task_id: int) -> bool:
+        return task_id in self._abandoned
+
+    def is_cancelled(self, task_id: int) -> bool:
+        return task_id in self._cancelled
+
+    def check(self, task_id: int):
+        """Raise TaskCancelled if the task has been cancelled"""
+        if task_id in self._cancelled:
+            raise TaskCancelled(f"Task {task_id} was cancelled")
+
+    def register_process(self, task_id: int, process):
+        with self._lock:
+            self._processes.setdefault(task_id, set()).add(process)
+            cancelled = task_id in self._cancelled
+        if cancelled:
+            # Cancelled between the last checkpoint and the process starting
+            self.cancel(task_id)
+
+    def unregister_process(self, task_id: int, process):
+        with self._lock:
+            processes = self._processes.get(task_id)
+            if processes:
+                processes.discard(process)
+                if not processes:
+                    del self._processes[task_id]
+
+    def finish(self, task_id: int):
+        """Forget a task once its executor has stopped"""
+        with self._lock:
+            self._cancelled.discard(task_id)
+            self._abandoned.discard(task_id)
+            self._processes.pop(task_id, None)
+
+
+# Process-wide registry shared by the scheduler and both executors
+task_cancellations = CancellationRegistry()
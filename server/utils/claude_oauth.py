@@ -2,14 +2,31 @@ import os
 import json
 import time
 import logging
+import threading
 import requests
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Optional, Set, Tuple
+from .metrics import Counter, Histogram
+from .tracing import SPAN_KIND_CLIENT, start_span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pooled HTTP session shared by every OAuth manager in the process
+_http_session = requests.Session()
+
+OAUTH_REFRESH_SECONDS = Histogram(
+    'claude_oauth_refresh_duration_seconds',
+    'Latency of Claude OAuth token refresh requests',
+    ['trigger', 'result']
+)
+OAUTH_REFRESH_FAILURES = Counter(
+    'claude_oauth_refresh_failures_total',
+    'Claude OAuth token refreshes that failed',
+    ['trigger']
+)
+
 class ClaudeOAuthManager:
     """Manages Claude OAuth token lifecycle including refresh operations"""
     
@@ -122,12 +139,13 @@ class ClaudeOAuthManager:
             }
             
             # Make refresh request
-            response = requests.post(
-                self.TOKEN_REFRESH_URL,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            with start_span('oauth.refresh', kind=SPAN_KIND_CLIENT):
+                response = _http_session.post(
+                    self.TOKEN_REFRESH_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=30
+                )
             
             if response.status_code == 200:
                 token_data = response.json()
@@ -200,11 +218,12 @@ class ClaudeOAuthManager:
                 'User-Agent': 'Claude-Code-Automation/1.0'
             }
             
-            response = requests.get(
-                self.TOKEN_VALIDATE_URL,
-                headers=headers,
-                timeout=10
-            )
+            with start_span('oauth.validate', kind=SPAN_KIND_CLIENT):
+                response = _http_session.get(
+                    self.TOKEN_VALIDATE_URL,
+                    headers=headers,
+                    timeout=10
+                )
             
             is_valid = response.status_code == 200
             
@@ -264,6 +283,149 @@ class ClaudeOAuthManager:
             return None
 
 
+def expires_at_seconds(tokens: Optional[Dict]) -> float:
+    """Normalize a token dict's expires_at (seconds or milliseconds) to seconds"""
+    try:
+        expires_at = float((tokens or {}).get('expires_at') or 0)
+    except (TypeError, ValueError):
+        return 0
+    return expires_at / 1000 if expires_at > 9999999999 else expires_at
+
+
+class OAuthTokenCache:
+    """
+    Process-wide OAuth token cache keyed by user with single-flight refresh.
+
+    Concurrent tasks for the same user serialize on a per-user lock, so only the
+    first one to find the token near expiry calls the refresh endpoint; the rest
+    pick up the refreshed tokens from the cache. The ``persist`` callback runs
+    exactly once per successful refresh.
+
+    Tokens passed in (normally read from the user's stored preferences) replace
+    the cached ones unless they belong to the same login: their refresh token
+    is the cached one or one the cache has refreshed from. Only then does the
+    later expiry win, so a re-authentication or a settings change is never
+    shadowed by a cached token that happens to expire later.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, Dict] = {}
+        self._lineage: Dict[str, Set[str]] = {}  # refresh tokens the cached entry descends from
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = threading.Lock()
+            return lock
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """Return the cached tokens for a user, if any"""
+        return self._tokens.get(user_id)
+
+    def _current(self, user_id: str, tokens: Dict) -> Dict:
+        """The cached tokens if ``tokens`` are an older copy of the same login, else ``tokens`` (call under the user lock)"""
+        cached = self._tokens.get(user_id)
+        if cached is None:
+            return tokens
+        if tokens is None:
+            return cached
+        if tokens.get('refresh_token') in self._lineage.get(user_id, ()):
+            return cached if expires_at_seconds(cached) >= expires_at_seconds(tokens) else tokens
+        return tokens
+
+    def _store(self, user_id: str, tokens: Dict, refreshed_from: Dict = None):
+        """Cache ``tokens``, extending the login's lineage or starting a new one (call under the user lock)"""
+        lineage = self._lineage.get(user_id, set())
+        if (refreshed_from or tokens).get('refresh_token') not in lineage:
+            lineage = set()
+        lineage |= {t['refresh_token'] for t in (tokens, refreshed_from) if t and t.get('refresh_token')}
+        self._tokens[user_id] = tokens
+        self._lineage[user_id] = lineage
+
+    def put(self, user_id: str, tokens: Dict):
+        """Store tokens for a user unless the cache already holds a newer copy of the same login"""
+        with self._user_lock(user_id):
+            if self._current(user_id, tokens) is tokens and self._tokens.get(user_id) is not tokens:
+                self._store(user_id, tokens)
+
+    def ensure_valid_tokens(self, user_id: str, tokens: Dict,
+                            persist: Optional[Callable[[Dict], None]] = None,
+                            buffer_seconds: int = 300,
+                            trigger: str = 'inline') -> Tuple[bool, Optional[Dict]]:
+        """
+        Return (success, tokens) with tokens valid for at least buffer_seconds,
+        refreshing at most once across all concurrent callers for the user.
+        ``trigger`` labels the refresh metrics ('inline' or 'scheduler').
+        """
+        with self._user_lock(user_id):
+            current = self._current(user_id, tokens)
+
+            oauth_manager = ClaudeOAuthManager()
+            if not oauth_manager.load_tokens_from_dict(current):
+                return False, None
+
+            if not oauth_manager.is_token_expired(buffer_seconds):
+                if self._tokens.get(user_id) is not current:
+                    self._store(user_id, current)
+                return True, current
+
+            logger.info(f"🔄 Refreshing OAuth tokens for {user_id} ({trigger}, single-flight)")
+            started = time.monotonic()
+            success, result = oauth_manager.refresh_access_token()
+            OAUTH_REFRESH_SECONDS.labels(trigger, 'success' if success else 'failure').observe(time.monotonic() - started)
+            if not success:
+                OAUTH_REFRESH_FAILURES.labels(trigger).inc()
+                logger.error(f"❌ Token refresh failed for {user_id}: {result}")
+                return False, None
+
+            self._store(user_id, result, refreshed_from=current)
+            if persist:
+                try:
+                    persist(result)
+                except Exception as e:
+                    logger.warning(f"⚠️  Failed to persist refreshed OAuth tokens for {user_id}: {e}")
+            return True, result
+
+
+# Shared by every executor thread in the process
+oauth_token_cache = OAuthTokenCache()
+
+# Cache key for the server-wide tokens loaded from CLAUDE_* environment variables
+ENV_OAUTH_CACHE_KEY = '__env__'
+
+
+def persist_user_oauth_tokens(user_id: str, tokens: Dict) -> bool:
+    """Write refreshed tokens back to users.preferences.claudeCode.oauth"""
+    from database import DatabaseOperations
+
+    # Re-read preferences so a concurrent settings change is not overwritten
+    user = DatabaseOperations.get_user_by_id(user_id)
+    preferences = dict(user.get('preferences') or {}) if user else {}
+    claude_config = dict(preferences.get('claudeCode') or {})
+    claude_config['oauth'] = tokens
+    preferences['claudeCode'] = claude_config
+
+    updated = DatabaseOperations.update_user_preferences(user_id, preferences)
+    if updated:
+        logger.info(f"✅ User preferences updated with refreshed OAuth tokens for {user_id}")
+    return updated
+
+
+def ensure_user_oauth_tokens(user_id: str, tokens: Dict, buffer_seconds: int = 300,
+                             trigger: str = 'inline') -> Tuple[bool, Optional[Dict]]:
+    """Resolve valid OAuth tokens for a user through the shared cache, persisting any refresh"""
+    return oauth_token_cache.ensure_valid_tokens(
+        user_id,
+        tokens,
+        persist=lambda refreshed: persist_user_oauth_tokens(user_id, refreshed),
+        buffer_seconds=buffer_seconds,
+        trigger=trigger
+    )
+
+
 def refresh_claude_oauth_tokens(tokens: Dict) -> Tuple[bool, Optional[Dict]]:
     """
     Convenience function to refresh Claude OAuth tokens
@@ -4,79 +4,54 @@ import logging
 import docker
 import docker.types
 import uuid
+import re
 import time
-import random
 from datetime import datetime
 from database import DatabaseOperations
-from .claude_oauth import ClaudeOAuthManager
-import fcntl
+from .claude_oauth import ClaudeOAuthManager, ENV_OAUTH_CACHE_KEY, ensure_user_oauth_tokens, oauth_token_cache
+from .oauth_refresh import oauth_refresh_scheduler
+from .container import docker_client, container_labels, container_reaper, kill_task_container
+from .container_supervisor import container_supervisor
+from .admission import task_resource_profile
+from .cancellation import task_cancellations
+from .task_metrics import CONTAINER_OPERATION_SECONDS, record_task_finished
+from .phase_timer import task_timers
+from .tracing import SPAN_KIND_CLIENT, current_context, record_span, start_span, use_context
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Docker client
-docker_client = docker.from_env()
+# Hard limit on a task container's run time, enforced by the container supervisor
+CONTAINER_TIMEOUT_SECONDS = int(os.getenv('CONTAINER_TIMEOUT_SECONDS', '300'))
 
-def cleanup_orphaned_containers():
-    """Clean up orphaned AI code task containers aggressively"""
-    try:
-        # Get all containers with our naming pattern
-        containers = docker_client.containers.list(all=True, filters={'name': 'ai-code-task-'})
-        orphaned_count = 0
-        current_time = time.time()
-        
-        for container in containers:
-            try:
-                # Get container creation time
-                created_at = container.attrs['Created']
-                # Parse ISO format timestamp and convert to epoch time
-                created_time = datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp()
-                age_hours = (current_time - created_time) / 3600
-                
-                # Remove containers that are:
-                # 1. Not running (exited, dead, created)
-                # 2. OR older than 2 hours (stuck containers)
-                # 3. OR in error state
-                should_remove = (
-                    container.status in ['exited', 'dead', 'created'] or
-                    age_hours > 2 or
-                    container.status == 'restarting'
-                )
-                
-                if should_remove:
-                    logger.info(f"🧹 Removing orphaned container {container.id[:12]} (status: {container.status}, age: {age_hours:.1f}h)")
-                    container.remove(force=True)
-                    orphaned_count += 1
-                
-            except Exception as e:
-                logger.warning(f"⚠️  Failed to cleanup container {container.id[:12]}: {e}")
-                # If we can't inspect it, try to force remove it anyway
-                try:
-                    container.remove(force=True)
-                    orphaned_count += 1
-                    logger.info(f"🧹 Force removed problematic container: {container.id[:12]}")
-                except Exception as force_error:
-                    logger.warning(f"⚠️  Could not force remove container {container.id[:12]}: {force_error}")
-        
-        if orphaned_count > 0:
-            logger.info(f"🧹 Cleaned up {orphaned_count} orphaned containers")
-        
-    except Exception as e:
-        logger.warning(f"⚠️  Failed to cleanup orphaned containers: {e}")
+# Cap each container at its profile's TASK_CPUS (off: containers share idle CPU by weight)
+TASK_CPU_HARD_LIMIT = os.getenv('TASK_CPU_HARD_LIMIT', 'false').lower() == 'true'
+
+# Small pool that collects logs and persists results after containers exit
+_finalizer_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CONTAINER_FINALIZER_WORKERS', '4')),
+    thread_name_prefix='container-finalizer'
+)
 
-def run_ai_code_task_v2(task_id: int, user_id: str, github_token: str):
-    """Run AI Code automation (Claude or Codex) in a container - Supabase version"""
+def run_ai_code_task_v2(task_id: int, user_id: str, github_token: str) -> Future:
+    """
+    Run AI Code automation (Claude or Codex) in a container - Supabase version
+    
+    Returns once the container is started; the returned Future resolves when
+    the task's results have been persisted.
+    """
     try:
         # Get task from database to check the model type
         task = DatabaseOperations.get_task_by_id(task_id, user_id)
         if not task:
             logger.error(f"Task {task_id} not found in database")
-            return
+            return _completed_future()
         
         model_cli = task.get('agent', 'claude')
         
-        # With comprehensive sandboxing fixes, both Claude and Codex can now run in parallel
+        # Codex concurrency is bounded by its host-wide agent semaphore (CODEX_MAX_CONCURRENT), taken by the scheduler
         logger.info(f"🚀 Running {model_cli.upper()} task {task_id} directly in parallel mode")
         return _run_ai_code_task_v2_internal(task_id, user_id, github_token)
             
@@ -89,18 +64,27 @@ def run_ai_code_task_v2(task_id: int, user_id: str, github_token: str):
             })
         except:
             logger.error(f"Failed to update task {task_id} status after exception")
+        return _completed_future()
 
-def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str):
-    """Internal implementation of AI Code automation - called directly for Claude or via queue for Codex"""
+def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str) -> Future:
+    """Internal implementation of AI Code automation for both Claude and Codex"""
+    task = None
+    started_at = time.monotonic()
+    timer = task_timers.get(task_id)
+    timer.end()
     try:
-        # Clean up any orphaned containers before starting new task
-        cleanup_orphaned_containers()
+        if task_cancellations.is_cancelled(task_id):
+            logger.info(f"🛑 Task {task_id} was cancelled before it started")
+            task_cancellations.finish(task_id)
+            task_timers.pop(task_id)
+            return _completed_future()
         
         # Get task from database (v2 function)
         task = DatabaseOperations.get_task_by_id(task_id, user_id)
         if not task:
             logger.error(f"Task {task_id} not found in database")
-            return
+            task_timers.pop(task_id)
+            return _completed_future()
         
         # Update task status to running
         DatabaseOperations.update_task(task_id, user_id, {'status': 'running'})
@@ -123,7 +107,9 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
                 'status': 'failed',
                 'error': error_msg
             })
-            return
+            record_task_finished(model_name, 'docker', 'failed', time.monotonic() - started_at)
+            task_timers.pop(task_id)
+            return _completed_future()
         
         logger.info(f"📋 Task details: prompt='{prompt[:50]}...', repo={task['repo_url']}, branch={task['target_branch']}, model={model_name}")
         logger.info(f"Starting {model_name} task {task_id}")
@@ -141,8 +127,15 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
             'DEBIAN_FRONTEND': 'noninteractive',  # Non-interactive package installs
         }
         
+        # Continue the task's trace inside the container (W3C trace context)
+        trace_context = current_context()
+        if trace_context:
+            env_vars['TRACEPARENT'] = trace_context.traceparent()
+        
         # Add model-specific API keys and environment variables
         model_cli = task.get('agent', 'claude')
+        timer.agent = model_cli
+        timer.begin('credentials')
         
         # Get user preferences for custom environment variables
         user = DatabaseOperations.get_user_by_id(user_id)
@@ -175,37 +168,14 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
             if (user_use_oauth and has_user_oauth) or use_oauth:
                 logger.info(f"🔐 Using Claude OAuth authentication for task {task_id}")
                 
-                # Initialize OAuth manager and validate/refresh tokens
-                oauth_manager = ClaudeOAuthManager()
-                
                 if has_user_oauth:
-                    # Load from user preferences
+                    # Resolve through the shared per-user cache so concurrent tasks refresh once
                     logger.info(f"🔍 Loading OAuth tokens from user preferences: {list(user_oauth_tokens.keys())}")
-                    if oauth_manager.load_tokens_from_dict(user_oauth_tokens):
-                        # Check if tokens need refresh
-                        success, refreshed_tokens = oauth_manager.ensure_valid_token()
-                        if success and refreshed_tokens:
-                            # Update user preferences with new tokens
-                            logger.info(f"🔄 OAuth tokens refreshed for user {user_id}, updating preferences")
-                            try:
-                                updated_oauth = claude_config.copy() if claude_config else {}
-                                updated_oauth['oauth'] = refreshed_tokens
-                                updated_prefs = user_preferences.copy()
-                                updated_prefs['claudeCode'] = updated_oauth
-                                
-                                DatabaseOperations.update_user_preferences(user_id, updated_prefs)
-                                logger.info("✅ User preferences updated with refreshed OAuth tokens")
-                                
-                                # Use refreshed tokens
-                                user_oauth_tokens = refreshed_tokens
-                            except Exception as e:
-                                logger.warning(f"⚠️  Failed to update user preferences with refreshed tokens: {e}")
-                        elif not success:
-                            logger.error(f"❌ OAuth token refresh failed for user {user_id}")
-                            raise Exception("OAuth token refresh failed")
-                    else:
-                        logger.error(f"❌ Failed to load OAuth tokens from user preferences")
-                        raise Exception("Invalid OAuth tokens in user preferences")
+                    success, user_oauth_tokens = ensure_user_oauth_tokens(user_id, user_oauth_tokens)
+                    if not success:
+                        logger.error(f"❌ OAuth token refresh failed for user {user_id}")
+                        raise Exception("OAuth token refresh failed")
+                    oauth_refresh_scheduler.track(user_id, user_oauth_tokens)
                         
                     # Set environment variables with current (possibly refreshed) tokens
                     logger.info(f"🔍 Setting OAuth environment variables for container")
@@ -217,30 +187,24 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
                     })
                     logger.info(f"🔍 OAuth env vars set - access_token: {user_oauth_tokens['access_token'][:20]}..., expires_at: {user_oauth_tokens['expires_at']}")
                 else:
-                    # Load from environment variables
+                    # Load from environment variables; refreshed tokens live only in the process cache
+                    oauth_manager = ClaudeOAuthManager()
                     if oauth_manager.load_tokens_from_env():
-                        # Check if tokens need refresh
-                        success, refreshed_tokens = oauth_manager.ensure_valid_token()
-                        if success and refreshed_tokens:
-                            logger.info(f"🔄 OAuth tokens refreshed from environment for task {task_id}")
-                            # Use refreshed tokens
-                            claude_env.update({
-                                'CLAUDE_ACCESS_TOKEN': refreshed_tokens['access_token'],
-                                'CLAUDE_REFRESH_TOKEN': refreshed_tokens['refresh_token'],
-                                'CLAUDE_EXPIRES_AT': str(refreshed_tokens['expires_at']),
-                                'CLAUDE_USE_OAUTH': '1'
-                            })
-                        elif not success:
+                        env_tokens = {
+                            'access_token': oauth_manager.access_token,
+                            'refresh_token': oauth_manager.refresh_token,
+                            'expires_at': oauth_manager.expires_at
+                        }
+                        success, env_tokens = oauth_token_cache.ensure_valid_tokens(ENV_OAUTH_CACHE_KEY, env_tokens)
+                        if not success:
                             logger.error(f"❌ OAuth token refresh failed for environment tokens")
                             raise Exception("OAuth token refresh failed")
-                        else:
-                            # Tokens still valid, use original
-                            claude_env.update({
-                                'CLAUDE_ACCESS_TOKEN': os.getenv('CLAUDE_ACCESS_TOKEN'),
-                                'CLAUDE_REFRESH_TOKEN': os.getenv('CLAUDE_REFRESH_TOKEN'),
-                                'CLAUDE_EXPIRES_AT': os.getenv('CLAUDE_EXPIRES_AT'),
-                                'CLAUDE_USE_OAUTH': '1'
-                            })
+                        claude_env.update({
+                            'CLAUDE_ACCESS_TOKEN': env_tokens['access_token'],
+                            'CLAUDE_REFRESH_TOKEN': env_tokens['refresh_token'],
+                            'CLAUDE_EXPIRES_AT': str(env_tokens['expires_at']),
+                            'CLAUDE_USE_OAUTH': '1'
+                        })
                     else:
                         logger.error(f"❌ Failed to load OAuth tokens from environment")
                         raise Exception("Invalid OAuth tokens in environment")
@@ -271,28 +235,9 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
         
         # Use standard Ubuntu image and install CLI tools at runtime
         container_image = 'ubuntu:22.04'
+        profile = task_resource_profile(model_cli)
         
-        # Add staggered start to prevent race conditions with parallel Codex tasks
-        if model_cli == 'codex':
-            # Random delay between 0.5-2 seconds for Codex containers to prevent resource conflicts
-            stagger_delay = random.uniform(0.5, 2.0)
-            logger.info(f"🕐 Adding {stagger_delay:.1f}s staggered start delay for Codex task {task_id}")
-            time.sleep(stagger_delay)
-            
-            # Add file-based locking for Codex to prevent parallel execution conflicts
-            lock_file_path = '/tmp/codex_execution_lock'
-            try:
-                logger.info(f"🔒 Acquiring Codex execution lock for task {task_id}")
-                with open(lock_file_path, 'w') as lock_file:
-                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    logger.info(f"✅ Codex execution lock acquired for task {task_id}")
-                    # Continue with container creation while holding the lock
-            except (IOError, OSError) as e:
-                logger.warning(f"⚠️  Could not acquire Codex execution lock for task {task_id}: {e}")
-                # Add additional delay if lock fails
-                additional_delay = random.uniform(1.0, 3.0)
-                logger.info(f"🕐 Adding additional {additional_delay:.1f}s delay due to lock conflict")
-                time.sleep(additional_delay)
+        timer.end()
         
         # Load Claude credentials from user preferences in Supabase
         credentials_content = ""
@@ -328,8 +273,10 @@ def _run_ai_code_task_v2_internal(task_id: int, user_id: str, github_token: str)
                 logger.info(f"ℹ️  No meaningful Claude credentials found in user preferences for task {task_id} - skipping credentials setup (credentials: {credentials_json})")
         
         # Create the command to run in container (v2 function)
+        # PHASE lines mark in-container phase boundaries (epoch seconds) for the task's phase timer
         container_command = f'''
 set -e
+echo "=== PHASE setup $(date +%s.%N) ==="
 echo "Setting up environment..."
 
 # Update package list and install essential tools
@@ -353,6 +300,7 @@ claude --version || echo "Claude CLI version check failed, but continuing..."
 mkdir -p /workspace
 cd /workspace
 
+echo "=== PHASE clone $(date +%s.%N) ==="
 echo "Setting up repository..."
 
 # Clone repository with authentication
@@ -368,6 +316,7 @@ git config user.name "Claude Code Automation"
 # We'll extract the patch instead of pushing directly
 echo "📋 Will extract changes as patch for later PR creation..."
 
+echo "=== PHASE agent $(date +%s.%N) ==="
 echo "Starting {model_cli.upper()} Code with prompt..."
 
 # Create a temporary file with the prompt using heredoc for proper handling
@@ -516,6 +465,8 @@ fi
 
 fi  # End of model selection (claude vs codex)
 
+echo "=== PHASE extract $(date +%s.%N) ==="
+
 # Check if there are changes
 if git diff --quiet; then
     echo "ℹ️  No changes made by {model_cli.upper()} - this is a valid outcome"
@@ -582,6 +533,7 @@ else
 fi
 
 # Explicitly exit with success code
+echo "=== PHASE done $(date +%s.%N) ==="
 echo "Container work completed successfully"
 exit 0
 '''
@@ -601,11 +553,17 @@ exit 0
             'tty': False,  # Don't allocate TTY - may prevent clean exit
             'stdin_open': False,  # Don't keep stdin open - may prevent clean exit
             'name': f'ai-code-task-{task_id}-{int(time.time())}-{uuid.uuid4().hex[:8]}',  # Highly unique container name with UUID
-            'mem_limit': '2g',  # Limit memory usage to prevent resource conflicts
-            'cpu_shares': 1024,  # Standard CPU allocation
+            'labels': container_labels(task_id),  # Lets the background reaper find task containers by label
+            'mem_limit': profile.memory,  # Matches the admission controller's reservation
+            'cpu_shares': 1024,  # Standard CPU allocation; TASK_CPUS only sizes admission unless the hard cap is on
             'ulimits': [docker.types.Ulimit(name='nofile', soft=1024, hard=2048)]  # File descriptor limits
         }
         
+        if TASK_CPU_HARD_LIMIT:
+            # Opt-in: throttle the container to its reserved CPUs instead of letting it use idle ones
+            container_kwargs.pop('cpu_shares')
+            container_kwargs['nano_cpus'] = int(profile.cpus * 1e9)
+        
         # Add essential Docker configuration for Codex compatibility
         if model_cli == 'codex':
             logger.warning(f"⚠️  Running Codex with enhanced Docker privileges to bypass seccomp/landlock restrictions")
@@ -617,17 +575,30 @@ exit 0
                     'no-new-privileges=false'  # Allow privilege escalation needed by Codex
                 ],
                 'cap_add': ['ALL'],            # Grant all Linux capabilities
-                'privileged': True,            # Run in fully privileged mode
-                'pid_mode': 'host'            # Share host PID namespace
+                'privileged': True             # Run in fully privileged mode
+                # No host PID namespace: each Codex container only sees its own processes,
+                # so parallel Codex tasks cannot interfere and need no global lock
             })
         
+        # Make sure the events subscription is live before the container can exit
+        timer.begin('container_create')
+        container_supervisor.start()
+        
+        # Cancelled while credentials and the command were prepared: stop before a container exists
+        task_cancellations.check(task_id)
+        
+        # Protected by task id from before creation, so the reaper cannot take a container still in 'created'
+        container_reaper.protect(task_id)
+        
         # Retry container creation with enhanced conflict handling
         container = None
         max_retries = 5  # Increased retries for better reliability
         for attempt in range(max_retries):
             try:
                 logger.info(f"🔄 Container creation attempt {attempt + 1}/{max_retries}")
-                container = docker_client.containers.run(**container_kwargs)
+                with start_span('docker.container.create', {'task.id': task_id, 'attempt': attempt + 1}, kind=SPAN_KIND_CLIENT), \
+                        CONTAINER_OPERATION_SECONDS.labels('create').time():
+                    container = docker_client.containers.run(**container_kwargs)
                 logger.info(f"✅ Container created successfully: {container.id[:12]} (name: {container_kwargs['name']})")
                 break
             except docker.errors.APIError as e:
@@ -638,8 +609,6 @@ exit 0
                     new_name = f'ai-code-task-{task_id}-{int(time.time())}-{uuid.uuid4().hex[:8]}'
                     container_kwargs['name'] = new_name
                     logger.info(f"🆔 New container name: {new_name}")
-                    # Try to clean up any conflicting containers
-                    cleanup_orphaned_containers()
                 else:
                     logger.warning(f"⚠️  Docker API error on attempt {attempt + 1}: {e}")
                     if attempt == max_retries - 1:
@@ -653,26 +622,124 @@ exit 0
         
         # Update task with container ID (v2 function)
         DatabaseOperations.update_task(task_id, user_id, {'container_id': container.id})
+        timer.end()
+        
+        # Completion is event driven: the supervisor resolves exit_future from the Docker
+        # events stream and the finalizer pool picks up logs, parsing and DB writes
+        logger.info(f"⏳ Watching container {container.id[:12]} for completion (timeout: {CONTAINER_TIMEOUT_SECONDS}s)...")
+        task_done = Future()
+        watch_started = time.monotonic()
+        watch_started_ns = time.time_ns()
+        exit_future = container_supervisor.watch(container, timeout=CONTAINER_TIMEOUT_SECONDS)
+        exit_future.add_done_callback(
+            lambda f: CONTAINER_OPERATION_SECONDS.labels('wait').observe(time.monotonic() - watch_started)
+        )
+        exit_future.add_done_callback(
+            lambda f: record_span('docker.container.run', watch_started_ns, parent=trace_context,
+                                  attributes={'task.id': task_id, 'container.id': container.id[:12]},
+                                  error=str(f.exception()) if f.exception() else None)
+        )
+        exit_future.add_done_callback(
+            lambda f: _finalizer_pool.submit(_finalize_container_task, task_id, user_id, container, model_name, f, task_done,
+                                             task.get('execution_metadata') or {}, started_at, timer, trace_context)
+        )
+        if task_cancellations.is_cancelled(task_id):
+            # Cancelled while the container was being created; the die event finalizes it
+            kill_task_container(container.id)
+        return task_done
+            
+    except Exception as e:
+        container_reaper.release(task_id)
+        task_timers.pop(task_id)
+        if task_cancellations.is_cancelled(task_id):
+            logger.info(f"🛑 Task {task_id} cancelled during startup")
+            status = 'abandoned' if task_cancellations.is_abandoned(task_id) else 'cancelled'
+            record_task_finished(task.get('agent') if task else None, 'docker', status, time.monotonic() - started_at)
+            task_cancellations.finish(task_id)
+            return _completed_future()
+        model_name = task.get('agent', 'claude').upper() if task else 'UNKNOWN'
+        logger.error(f"💥 Unexpected exception in {model_name} task {task_id}: {str(e)}")
+        record_task_finished(model_name, 'docker', 'failed', time.monotonic() - started_at)
         
-        logger.info(f"⏳ Waiting for container to complete (timeout: 300s)...")
+        try:
+            DatabaseOperations.update_task(task_id, user_id, {
+                'status': 'failed',
+                'error': str(e)
+            })
+        except:
+            logger.error(f"Failed to update task {task_id} status after exception")
         
-        # Wait for container to finish - should exit naturally when script completes
+        logger.error(f"🔄 {model_name} Task {task_id} failed with exception: {str(e)}")
+        return _completed_future()
+
+
+def _completed_future() -> Future:
+    """Future for a task that finished (or failed) before a container was started"""
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+def _remove_container(container):
+    """Remove a finished container, falling back to a forced removal"""
+    try:
+        with CONTAINER_OPERATION_SECONDS.labels('remove').time():
+            container.remove()
+        logger.info(f"🧹 Successfully removed container {container.id[:12]}")
+    except docker.errors.NotFound:
+        logger.info(f"🧹 Container {container.id[:12]} already removed")
+    except Exception as cleanup_error:
+        logger.warning(f"⚠️  Failed to remove container {container.id[:12]}: {cleanup_error}")
+        # Try force removal as fallback
         try:
-            logger.info(f"🔄 Waiting for container script to complete naturally...")
-            
-            # Check initial container state
-            container.reload()
-            logger.info(f"🔍 Container initial state: {container.status}")
-            
-            # Use standard wait - container should exit when bash script finishes
-            logger.info(f"🔄 Calling container.wait() - container should exit when script completes...")
-            result = container.wait(timeout=300)  # 5 minute timeout
-            logger.info(f"🎯 Container exited naturally! Exit code: {result['StatusCode']}")
+            container.remove(force=True)
+            logger.info(f"🧹 Force removed container {container.id[:12]}")
+        except docker.errors.NotFound:
+            logger.info(f"🧹 Container {container.id[:12]} already removed")
+        except Exception as force_cleanup_error:
+            logger.error(f"❌ Failed to force remove container {container.id[:12]}: {force_cleanup_error}")
+
+
+def _finalize_container_task(task_id: int, user_id: str, container, model_name: str, exit_future: Future, task_done: Future,
+                             execution_metadata: dict = None, started_at: float = None, timer=None, trace_context=None):
+    """Collect logs, persist results and remove the container once it has exited"""
+    with use_context(trace_context), start_span('task.finalize', {'task.id': task_id, 'container.id': container.id[:12]}):
+        status = 'failed'
+        try:
+            if task_cancellations.is_abandoned(task_id):
+                # Another worker node holds the task now; its outcome is theirs to write
+                status = 'abandoned'
+                logger.warning(f"⚠️  Task {task_id} abandoned after its lease was lost, removing container {container.id[:12]}")
+                _remove_container(container)
+                return
+            if task_cancellations.is_cancelled(task_id):
+                # Re-assert the status in case a startup write raced the cancel endpoint
+                status = 'cancelled'
+                logger.info(f"🛑 Task {task_id} cancelled, removing container {container.id[:12]}")
+                _remove_container(container)
+                DatabaseOperations.update_task(task_id, user_id, {'status': 'cancelled', 'error': 'Cancelled by user'})
+                return
+        
+            try:
+                result = exit_future.result()
+                logger.info(f"🎯 Container exited! Exit code: {result['StatusCode']}{' (OOM killed)' if result['OOMKilled'] else ''}")
+            except Exception as e:
+                logger.error(f"⏰ Container timeout or error: {str(e)}")
+                logger.error(f"🔄 Updating task status to FAILED due to timeout/error...")
             
-            # Verify final container state
-            container.reload()
-            logger.info(f"🔍 Final container state: {container.status}")
+                DatabaseOperations.update_task(task_id, user_id, {
+                    'status': 'failed',
+                    'error': f"Container execution timeout or error: {str(e)}"
+                })
             
+                # Try to clean up container on error
+                try:
+                    container.remove(force=True)
+                    logger.info(f"Cleaned up failed container {container.id}")
+                except Exception as cleanup_error:
+                    logger.warning(f"Failed to remove failed container {container.id}: {cleanup_error}")
+                return
+        
             # Get logs before any cleanup operations
             logger.info(f"📜 Retrieving container logs...")
             try:
@@ -682,178 +749,175 @@ exit 0
             except Exception as log_error:
                 logger.warning(f"❌ Failed to get container logs: {log_error}")
                 logs = f"Failed to retrieve logs: {log_error}"
-            
+        
             # Clean up container after getting logs
-            try:
-                container.reload()  # Refresh container state
-                container.remove()
-                logger.info(f"🧹 Successfully removed container {container.id[:12]}")
-            except docker.errors.NotFound:
-                logger.info(f"🧹 Container {container.id[:12]} already removed")
-            except Exception as cleanup_error:
-                logger.warning(f"⚠️  Failed to remove container {container.id[:12]}: {cleanup_error}")
-                # Try force removal as fallback
-                try:
-                    container.remove(force=True)
-                    logger.info(f"🧹 Force removed container {container.id[:12]}")
-                except docker.errors.NotFound:
-                    logger.info(f"🧹 Container {container.id[:12]} already removed")
-                except Exception as force_cleanup_error:
-                    logger.error(f"❌ Failed to force remove container {container.id[:12]}: {force_cleanup_error}")
-                
-        except Exception as e:
-            logger.error(f"⏰ Container timeout or error: {str(e)}")
-            logger.error(f"🔄 Updating task status to FAILED due to timeout/error...")
+            _remove_container(container)
+        
+            timer = timer or task_timers.get(task_id, model_name.lower())
+            timer.record_wall_clock(parse_phase_marks(logs))
+            timer.add_bytes('logs', logs)
+        
+            if result['StatusCode'] == 0:
+                logger.info(f"✅ Container exited successfully (code 0) - parsing results...")
+                timer.begin('parse')
+                parsed = parse_container_logs(logs)
+                timer.add_bytes('diff', parsed['git_diff'])
+                timer.add_bytes('patch', parsed['git_patch'])
+                # Snapshot before persisting; the persist phase itself is only exported as a metric
+                timings = timer.to_dict()
             
-            DatabaseOperations.update_task(task_id, user_id, {
-                'status': 'failed',
-                'error': f"Container execution timeout or error: {str(e)}"
-            })
+                logger.info(f"🔄 Updating task status to COMPLETED...")
             
-            # Try to get logs even on error
-            try:
-                logs = container.logs().decode('utf-8')
-            except Exception as log_error:
-                logs = f"Container failed and logs unavailable: {log_error}"
+                # Update task in database
+                timer.begin('persist')
+                DatabaseOperations.update_task(task_id, user_id, {
+                    'status': 'completed',
+                    'commit_hash': parsed['commit_hash'],
+                    'git_diff': parsed['git_diff'],
+                    'git_patch': parsed['git_patch'],
+                    'changed_files': parsed['changed_files'],
+                    'execution_metadata': {
+                        **(execution_metadata or {}),  # keep submit-time metadata (priority, cache key)
+                        'file_changes': parsed['file_changes'],
+                        'timings': timings,
+                        'completed_at': datetime.now().isoformat()
+                    }
+                })
+                timer.end()
+            
+                status = 'completed'
+                commit_hash = parsed['commit_hash']
+                logger.info(f"🎉 {model_name} Task {task_id} completed successfully! Commit: {commit_hash[:8] if commit_hash else 'N/A'}, Diff lines: {parsed['git_diff'].count(chr(10)) + 1 if parsed['git_diff'] else 0}")
+            
+            else:
+                error_detail = "Container was OOM killed" if result['OOMKilled'] else f"Container exited with code {result['StatusCode']}"
+                logger.error(f"❌ {error_detail}")
+                DatabaseOperations.update_task(task_id, user_id, {
+                    'status': 'failed',
+                    'error': f"{error_detail}: {logs}",
+                    'execution_metadata': {**(execution_metadata or {}), 'timings': timer.to_dict()}
+                })
+                logger.error(f"💥 {model_name} Task {task_id} failed: {logs[:200]}...")
             
-            # Try to clean up container on error
+        except Exception as e:
+            logger.error(f"💥 Unexpected exception finalizing {model_name} task {task_id}: {str(e)}")
             try:
-                container.reload()  # Refresh container state
-                container.remove(force=True)
-                logger.info(f"Cleaned up failed container {container.id}")
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to remove failed container {container.id}: {cleanup_error}")
-            return
-        
-        if result['StatusCode'] == 0:
-            logger.info(f"✅ Container exited successfully (code 0) - parsing results...")
-            # Parse output to extract commit hash, diff, and patch
-            lines = logs.split('\n')
-            commit_hash = None
-            git_diff = []
-            git_patch = []
-            changed_files = []
-            file_changes = []
-            capturing_diff = False
+                DatabaseOperations.update_task(task_id, user_id, {
+                    'status': 'failed',
+                    'error': str(e)
+                })
+            except:
+                logger.error(f"Failed to update task {task_id} status after exception")
+        finally:
+            record_task_finished(model_name, 'docker', status, time.monotonic() - started_at if started_at else None)
+            container_reaper.release(task_id)
+            task_cancellations.finish(task_id)
+            task_timers.pop(task_id)
+            task_done.set_result(None)
+
+
+def parse_phase_marks(logs: str) -> list:
+    """(phase, epoch seconds) pairs from the container's PHASE lines, in order"""
+    return [(name, float(ts)) for name, ts in re.findall(r'^=== PHASE (\w+) (\d+(?:\.\d+)?) ===$', logs, re.MULTILINE)]
+
+
+def parse_container_logs(logs: str) -> dict:
+    """Extract commit hash, patch, diff, changed files and before/after file contents from container logs"""
+    lines = logs.split('\n')
+    commit_hash = None
+    git_diff = []
+    git_patch = []
+    changed_files = []
+    file_changes = []
+    capturing_diff = False
+    capturing_patch = False
+    capturing_files = False
+    capturing_file_changes = False
+    capturing_before = False
+    capturing_after = False
+    current_file = None
+    current_before = []
+    current_after = []
+    
+    for line in lines:
+        if line.startswith('COMMIT_HASH='):
+            commit_hash = line.split('=', 1)[1]
+            logger.info(f"🔑 Found commit hash: {commit_hash}")
+        elif line == '=== PATCH START ===':
+            capturing_patch = True
+            logger.info(f"📦 Starting to capture git patch...")
+        elif line == '=== PATCH END ===':
             capturing_patch = False
+            logger.info(f"📦 Finished capturing git patch ({len(git_patch)} lines)")
+        elif line == '=== GIT DIFF START ===':
+            capturing_diff = True
+            logger.info(f"📊 Starting to capture git diff...")
+        elif line == '=== GIT DIFF END ===':
+            capturing_diff = False
+            logger.info(f"📊 Finished capturing git diff ({len(git_diff)} lines)")
+        elif line == '=== CHANGED FILES START ===':
+            capturing_files = True
+            logger.info(f"📁 Starting to capture changed files...")
+        elif line == '=== CHANGED FILES END ===':
             capturing_files = False
+            logger.info(f"📁 Finished capturing changed files ({len(changed_files)} files)")
+        elif line == '=== FILE CHANGES START ===':
+            capturing_file_changes = True
+            logger.info(f"🔄 Starting to capture file changes...")
+        elif line == '=== FILE CHANGES END ===':
             capturing_file_changes = False
-            capturing_before = False
-            capturing_after = False
-            current_file = None
-            current_before = []
-            current_after = []
-            
-            for line in lines:
-                if line.startswith('COMMIT_HASH='):
-                    commit_hash = line.split('=', 1)[1]
-                    logger.info(f"🔑 Found commit hash: {commit_hash}")
-                elif line == '=== PATCH START ===':
-                    capturing_patch = True
-                    logger.info(f"📦 Starting to capture git patch...")
-                elif line == '=== PATCH END ===':
-                    capturing_patch = False
-                    logger.info(f"📦 Finished capturing git patch ({len(git_patch)} lines)")
-                elif line == '=== GIT DIFF START ===':
-                    capturing_diff = True
-                    logger.info(f"📊 Starting to capture git diff...")
-                elif line == '=== GIT DIFF END ===':
-                    capturing_diff = False
-                    logger.info(f"📊 Finished capturing git diff ({len(git_diff)} lines)")
-                elif line == '=== CHANGED FILES START ===':
-                    capturing_files = True
-                    logger.info(f"📁 Starting to capture changed files...")
-                elif line == '=== CHANGED FILES END ===':
-                    capturing_files = False
-                    logger.info(f"📁 Finished capturing changed files ({len(changed_files)} files)")
-                elif line == '=== FILE CHANGES START ===':
-                    capturing_file_changes = True
-                    logger.info(f"🔄 Starting to capture file changes...")
-                elif line == '=== FILE CHANGES END ===':
-                    capturing_file_changes = False
-                    # Add the last file if we were processing one
-                    if current_file:
-                        file_changes.append({
-                            'filename': current_file,
-                            'before': '\n'.join(current_before),
-                            'after': '\n'.join(current_after)
-                        })
-                    logger.info(f"🔄 Finished capturing file changes ({len(file_changes)} files)")
-                elif capturing_file_changes:
-                    if line.startswith('FILE: '):
-                        # Save previous file data if exists
-                        if current_file:
-                            file_changes.append({
-                                'filename': current_file,
-                                'before': '\n'.join(current_before),
-                                'after': '\n'.join(current_after)
-                            })
-                        # Start new file
-                        current_file = line.split('FILE: ', 1)[1]
-                        current_before = []
-                        current_after = []
-                        capturing_before = False
-                        capturing_after = False
-                    elif line == '=== BEFORE START ===':
-                        capturing_before = True
-                        capturing_after = False
-                    elif line == '=== BEFORE END ===':
-                        capturing_before = False
-                    elif line == '=== AFTER START ===':
-                        capturing_after = True
-                        capturing_before = False
-                    elif line == '=== AFTER END ===':
-                        capturing_after = False
-                    elif line == '=== FILE END ===':
-                        # File processing complete
-                        pass
-                    elif capturing_before:
-                        current_before.append(line)
-                    elif capturing_after:
-                        current_after.append(line)
-                elif capturing_patch:
-                    git_patch.append(line)
-                elif capturing_diff:
-                    git_diff.append(line)
-                elif capturing_files:
-                    if line.strip():  # Only add non-empty lines
-                        changed_files.append(line.strip())
-            
-            logger.info(f"🔄 Updating task status to COMPLETED...")
-            
-            # Update task in database
-            DatabaseOperations.update_task(task_id, user_id, {
-                'status': 'completed',
-                'commit_hash': commit_hash,
-                'git_diff': '\n'.join(git_diff),
-                'git_patch': '\n'.join(git_patch),
-                'changed_files': changed_files,
-                'execution_metadata': {
-                    'file_changes': file_changes,
-                    'completed_at': datetime.now().isoformat()
-                }
-            })
-            
-            logger.info(f"🎉 {model_name} Task {task_id} completed successfully! Commit: {commit_hash[:8] if commit_hash else 'N/A'}, Diff lines: {len(git_diff)}")
-            
-        else:
-            logger.error(f"❌ Container exited with error code {result['StatusCode']}")
-            DatabaseOperations.update_task(task_id, user_id, {
-                'status': 'failed',
-                'error': f"Container exited with code {result['StatusCode']}: {logs}"
-            })
-            logger.error(f"💥 {model_name} Task {task_id} failed: {logs[:200]}...")
-            
-    except Exception as e:
-        model_name = task.get('agent', 'claude').upper() if task else 'UNKNOWN'
-        logger.error(f"💥 Unexpected exception in {model_name} task {task_id}: {str(e)}")
-        
-        try:
-            DatabaseOperations.update_task(task_id, user_id, {
-                'status': 'failed',
-                'error': str(e)
-            })
-        except:
-            logger.error(f"Failed to update task {task_id} status after exception")
-        
-        logger.error(f"🔄 {model_name} Task {task_id} failed with exception: {str(e)}")
+            # Add the last file if we were processing one
+            if current_file:
+                file_changes.append({
+                    'filename': current_file,
+                    'before': '\n'.join(current_before),
+                    'after': '\n'.join(current_after)
+                })
+            logger.info(f"🔄 Finished capturing file changes ({len(file_changes)} files)")
+        elif capturing_file_changes:
+            if line.startswith('FILE: '):
+                # Save previous file data if exists
+                if current_file:
+                    file_changes.append({
+                        'filename': current_file,
+                        'before': '\n'.join(current_before),
+                        'after': '\n'.join(current_after)
+                    })
+                # Start new file
+                current_file = line.split('FILE: ', 1)[1]
+                current_before = []
+                current_after = []
+                capturing_before = False
+                capturing_after = False
+            elif line == '=== BEFORE START ===':
+                capturing_before = True
+                capturing_after = False
+            elif line == '=== BEFORE END ===':
+                capturing_before = False
+            elif line == '=== AFTER START ===':
+                capturing_after = True
+                capturing_before = False
+            elif line == '=== AFTER END ===':
+                capturing_after = False
+            elif line == '=== FILE END ===':
+                # File processing complete
+                pass
+            elif capturing_before:
+                current_before.append(line)
+            elif capturing_after:
+                current_after.append(line)
+        elif capturing_patch:
+            git_patch.append(line)
+        elif capturing_diff:
+            git_diff.append(line)
+        elif capturing_files:
+            if line.strip():  # Only add non-empty lines
+                changed_files.append(line.strip())
+    
+    return {
+        'commit_hash': commit_hash,
+        'git_diff': '\n'.join(git_diff),
+        'git_patch': '\n'.join(git_patch),
+        'changed_files': changed_files,
+        'file_changes': file_changes
+    }
@@ -1,58 +1,143 @@
+import os
+import time
+import socket
 import logging
+import threading
 import docker
-import docker.types
-import time
-from datetime import datetime
+from typing import Dict, Optional, Set
+from .lazy import LazySingleton
+from .metrics import Counter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-# Docker client
-docker_client = docker.from_env()
+# Docker client, connected on first use so the daemon only has to be up once a container is needed
+docker_client = LazySingleton(docker.from_env, 'Docker client')
+
+# Identity of this node; containers are labelled with it so each node only reaps its own
+NODE_ID = os.getenv('NODE_ID') or socket.gethostname()
+
+LABEL_MANAGED = 'async-code.managed'
+LABEL_TASK_ID = 'async-code.task-id'
+LABEL_OWNER_NODE = 'async-code.owner-node'
+
+CONTAINERS_REAPED = Counter(
+    'containers_reaped_total',
+    'Task containers removed by the background reaper',
+    ['state']
+)
+
+
+def container_labels(task_id: int) -> Dict[str, str]:
+    """Labels attached to every task container so it can be found without name scans"""
+    return {
+        LABEL_MANAGED: 'true',
+        LABEL_TASK_ID: str(task_id),
+        LABEL_OWNER_NODE: NODE_ID
+    }
 
-def cleanup_orphaned_containers():
-    """Clean up orphaned AI code task containers aggressively"""
+
+def kill_task_container(container_id: str) -> bool:
+    """Kill a task container immediately; returns False if it is already gone"""
     try:
-        # Get all containers with our naming pattern
-        containers = docker_client.containers.list(all=True, filters={'name': 'ai-code-task-'})
-        orphaned_count = 0
-        current_time = time.time()
-        
+        docker_client.api.kill(container_id)
+        logger.info(f"🛑 Killed container {container_id[:12]}")
+        return True
+    except docker.errors.NotFound:
+        return False
+    except docker.errors.APIError as e:
+        # Not running any more (already exited or being removed)
+        logger.info(f"ℹ️ Container {container_id[:12]} not killed: {e}")
+        return False
+
+
+class ContainerReaper:
+    """
+    Periodically removes this node's finished or stuck task containers.
+
+    Containers are selected by label with a single sparse list call (no
+    per-container inspect). Tasks an executor is still handling are protected
+    by their task-id label from before their container is created until the
+    executor releases them, so a container is never reaped while it is being
+    created or started and its logs are never reaped early.
+    """
+
+    def __init__(self, interval_seconds: int = None, max_age_seconds: int = None):
+        self.interval_seconds = interval_seconds or int(os.getenv('CONTAINER_REAPER_INTERVAL_SECONDS', '300'))
+        self.max_age_seconds = max_age_seconds or int(os.getenv('CONTAINER_MAX_AGE_SECONDS', '7200'))
+        self._protected: Set[str] = set()   # task ids, matched against LABEL_TASK_ID
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def protect(self, task_id: int):
+        """Exclude a task's containers from reaping while an executor still owns them; call before creating one"""
+        with self._lock:
+            self._protected.add(str(task_id))
+
+    def release(self, task_id: int):
+        with self._lock:
+            self._protected.discard(str(task_id))
+
+    def reap_once(self) -> int:
+        """Remove exited, dead, stuck or over-age containers owned by this node"""
+        containers = docker_client.containers.list(
+            all=True,
+            sparse=True,
+            filters={'label': [f'{LABEL_MANAGED}=true', f'{LABEL_OWNER_NODE}={NODE_ID}']}
+        )
+        with self._lock:
+            protected = set(self._protected)
+
+        removed = 0
+        now = time.time()
         for container in containers:
+            if (container.attrs.get('Labels') or {}).get(LABEL_TASK_ID) in protected:
+                continue
             try:
-                # Get container creation time
-                created_at = container.attrs['Created']
-                # Parse ISO format timestamp and convert to epoch time
-                created_time = datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp()
-                age_hours = (current_time - created_time) / 3600
-                
-                # Remove containers that are:
-                # 1. Not running (exited, dead, created)
-                # 2. OR older than 2 hours (stuck containers)
-                # 3. OR in error state
+                state = container.attrs.get('State', 'unknown')
+                age_seconds = now - container.attrs.get('Created', now)
+
                 should_remove = (
-                    container.status in ['exited', 'dead', 'created'] or
-                    age_hours > 2 or
-                    container.status == 'restarting'
+                    state in ['exited', 'dead', 'created', 'restarting'] or
+                    age_seconds > self.max_age_seconds
                 )
-                
+
                 if should_remove:
-                    logger.info(f"🧹 Removing orphaned container {container.id[:12]} (status: {container.status}, age: {age_hours:.1f}h)")
+                    logger.info(f"🧹 Reaping container {container.id[:12]} (task: {container.attrs.get('Labels', {}).get(LABEL_TASK_ID)}, state: {state}, age: {age_seconds / 3600:.1f}h)")
                     container.remove(force=True)
-                    orphaned_count += 1
-                
+                    CONTAINERS_REAPED.labels(state).inc()
+                    removed += 1
+            except docker.errors.NotFound:
+                continue
             except Exception as e:
-                logger.warning(f"⚠️  Failed to cleanup container {container.id[:12]}: {e}")
-                # If we can't inspect it, try to force remove it anyway
-                try:
-                    container.remove(force=True)
-                    orphaned_count += 1
-                    logger.info(f"🧹 Force removed problematic container: {container.id[:12]}")
-                except Exception as force_error:
-                    logger.warning(f"⚠️  Could not force remove container {container.id[:12]}: {force_error}")
-        
-        if orphaned_count > 0:
-            logger.info(f"🧹 Cleaned up {orphaned_count} orphaned containers")
-        
-    except Exception as e:
-        logger.warning(f"⚠️  Failed to cleanup orphaned containers: {e}")
+                logger.warning(f"⚠️  Failed to reap container {container.id[:12]}: {e}")
+
+        if removed > 0:
+            logger.info(f"🧹 Reaped {removed} containers")
+        return removed
+
+    def _run(self):
+        logger.info(f"🧹 Container reaper started (interval: {self.interval_seconds}s, max age: {self.max_age_seconds}s, node: {NODE_ID})")
+        while not self._stop_event.is_set():
+            try:
+                self.reap_once()
+            except Exception as e:
+                logger.warning(f"⚠️  Container reaper pass failed: {e}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name='container-reaper', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+
+# Process-wide reaper, started by the server entry point in Docker execution mode
+container_reaper = ContainerReaper()
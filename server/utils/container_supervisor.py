@@ -0,0 +1,202 @@
+import os
+import time
+import heapq
+import logging
+import threading
+import docker
+from concurrent.futures import Future
+from typing import Dict, Optional
+from .container import docker_client, LABEL_MANAGED, LABEL_OWNER_NODE, NODE_ID
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerTimeout(Exception):
+    """Raised through a completion future when a container exceeds its timeout"""
+
+
+class _Watch:
+    __slots__ = ('container_id', 'future', 'deadline', 'oom_killed')
+
+    def __init__(self, container_id: str, future: Future, deadline: float):
+        self.container_id = container_id
+        self.future = future
+        self.deadline = deadline
+        self.oom_killed = False
+
+
+class ContainerSupervisor:
+    """
+    Tracks task container completion from a single Docker events subscription.
+
+    ``watch()`` returns a Future that resolves to ``{'StatusCode', 'OOMKilled'}``
+    when the container dies, or fails with ContainerTimeout after the container
+    has been killed for running past its deadline. One events thread and one
+    timer thread serve every container, so no task needs a thread blocked in
+    ``container.wait()``.
+
+    Done-callbacks run on the events thread and must hand real work off to a pool.
+    """
+
+    # How long a die event for a not-yet-watched container is remembered
+    RECENT_EXIT_TTL = 300
+
+    def __init__(self):
+        self._watches: Dict[str, _Watch] = {}
+        self._recent_exits: Dict[str, tuple] = {}
+        self._deadlines = []
+        self._lock = threading.Lock()
+        self._timer_cond = threading.Condition(self._lock)
+        self._connected = threading.Event()
+        self._stopping = False
+        self._events = None
+        self._events_thread: Optional[threading.Thread] = None
+        self._timer_thread: Optional[threading.Thread] = None
+
+    def start(self, wait_connected: float = 5.0):
+        """Start the events and timer threads (idempotent) and wait for the subscription"""
+        with self._lock:
+            if self._events_thread is None or not self._events_thread.is_alive():
+                self._stopping = False
+                self._events_thread = threading.Thread(target=self._events_loop, name='container-events', daemon=True)
+                self._events_thread.start()
+            if self._timer_thread is None or not self._timer_thread.is_alive():
+                self._timer_thread = threading.Thread(target=self._timer_loop, name='container-timeouts', daemon=True)
+                self._timer_thread.start()
+        self._connected.wait(wait_connected)
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._timer_cond.notify()
+        if self._events is not None:
+            try:
+                self._events.close()
+            except Exception:
+                pass
+
+    def watch(self, container, timeout: float) -> Future:
+        """Return a Future for the container's exit, enforcing ``timeout`` seconds centrally"""
+        future = Future()
+        container_id = container.id
+        with self._lock:
+            recent = self._recent_exits.pop(container_id, None)
+            if recent is None:
+                watch = _Watch(container_id, future, time.monotonic() + timeout)
+                self._watches[container_id] = watch
+                heapq.heappush(self._deadlines, (watch.deadline, container_id))
+                self._timer_cond.notify()
+        if recent is not None:
+            # The container died before anyone asked; resolve straight away
+            future.set_result({'StatusCode': recent[0], 'OOMKilled': recent[1]})
+        return future
+
+    def active_count(self) -> int:
+        return len(self._watches)
+
+    def _resolve(self, container_id: str, exit_code: int, oom_killed: bool = False):
+        with self._lock:
+            watch = self._watches.pop(container_id, None)
+            if watch is None:
+                now = time.monotonic()
+                self._recent_exits[container_id] = (exit_code, oom_killed, now)
+                for stale in [cid for cid, v in self._recent_exits.items() if now - v[2] > self.RECENT_EXIT_TTL]:
+                    del self._recent_exits[stale]
+                return
+            oom_killed = oom_killed or watch.oom_killed
+        if not watch.future.done():
+            watch.future.set_result({'StatusCode': exit_code, 'OOMKilled': oom_killed})
+
+    def _handle_event(self, event: Dict):
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        action = event.get('Action') or event.get('status')
+        if not container_id:
+            return
+        if action == 'oom':
+            with self._lock:
+                watch = self._watches.get(container_id)
+                if watch:
+                    watch.oom_killed = True
+            logger.warning(f"💥 Container {container_id[:12]} was OOM killed")
+        elif action == 'die':
+            attributes = event.get('Actor', {}).get('Attributes', {})
+            try:
+                exit_code = int(attributes.get('exitCode', -1))
+            except (TypeError, ValueError):
+                exit_code = -1
+            self._resolve(container_id, exit_code)
+
+    def _reconcile(self):
+        """After (re)connecting, resolve any watched container that exited while we were not listening"""
+        with self._lock:
+            container_ids = list(self._watches)
+        for container_id in container_ids:
+            try:
+                state = docker_client.api.inspect_container(container_id)['State']
+                if not state.get('Running') and state.get('Status') != 'created':
+                    self._resolve(container_id, state.get('ExitCode', -1), state.get('OOMKilled', False))
+            except docker.errors.NotFound:
+                self._resolve(container_id, -1)
+            except Exception as e:
+                logger.warning(f"⚠️  Could not reconcile container {container_id[:12]}: {e}")
+
+    def _events_loop(self):
+        backoff = 1
+        since = None
+        while not self._stopping:
+            try:
+                self._events = docker_client.events(
+                    decode=True,
+                    since=since,
+                    filters={
+                        'type': 'container',
+                        'event': ['die', 'oom'],
+                        'label': [f'{LABEL_MANAGED}=true', f'{LABEL_OWNER_NODE}={NODE_ID}']
+                    }
+                )
+                self._connected.set()
+                logger.info("📡 Subscribed to Docker container events")
+                self._reconcile()
+                backoff = 1
+                for event in self._events:
+                    since = event.get('time', since)
+                    self._handle_event(event)
+            except Exception as e:
+                if self._stopping:
+                    break
+                logger.warning(f"⚠️  Docker events stream interrupted: {e}")
+            self._connected.clear()
+            if not self._stopping:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _timer_loop(self):
+        while True:
+            expired = []
+            with self._timer_cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, container_id = heapq.heappop(self._deadlines)
+                    watch = self._watches.get(container_id)
+                    if watch and watch.deadline == deadline:
+                        del self._watches[container_id]
+                        expired.append(watch)
+                if not expired:
+                    timeout = self._deadlines[0][0] - now if self._deadlines else None
+                    self._timer_cond.wait(timeout)
+                    continue
+
+            for watch in expired:
+                logger.error(f"⏰ Container {watch.container_id[:12]} exceeded its timeout, killing it")
+                try:
+                    docker_client.api.kill(watch.container_id)
+                except Exception as e:
+                    logger.warning(f"⚠️  Failed to kill timed out container {watch.container_id[:12]}: {e}")
+                if not watch.future.done():
+                    watch.future.set_exception(ContainerTimeout(f"Container {watch.container_id[:12]} timed out"))
+
+
+# Process-wide supervisor shared by every Docker task
+container_supervisor = ContainerSupervisor()
@@ -1,12 +1,19 @@
 import os
+import signal
 import subprocess
 import tempfile
 import logging
 import shutil
+import time
 from pathlib import Path
 from datetime import datetime
 from database import DatabaseOperations
-from .claude_oauth import ClaudeOAuthManager
+from .claude_oauth import ensure_user_oauth_tokens
+from .oauth_refresh import oauth_refresh_scheduler
+from .cancellation import TaskCancelled, task_cancellations
+from .task_metrics import record_task_finished
+from .phase_timer import task_timers
+from .tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +24,7 @@ class DirectTaskExecutor:
         self.work_dir = Path(work_dir)
         self.work_dir.mkdir(exist_ok=True, parents=True)
         self.claude_cli_path = None
+        self.task_id = None
         self._ensure_claude_cli()
     
     def _ensure_claude_cli(self):
@@ -103,6 +111,25 @@ class DirectTaskExecutor:
         else:
             raise Exception("No authentication method provided")
     
+    def _run_cancellable(self, args: list, timeout: int, span_name: str = 'subprocess', **kwargs) -> subprocess.CompletedProcess:
+        """Like subprocess.run, but in its own process group so cancelling the task kills it at once"""
+        with start_span(span_name, {'task.id': self.task_id}) as span:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                       start_new_session=True, **kwargs)
+            task_cancellations.register_process(self.task_id, process)
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                raise
+            finally:
+                task_cancellations.unregister_process(self.task_id, process)
+            if span:
+                span.set_attribute('process.exit_code', process.returncode)
+        task_cancellations.check(self.task_id)
+        return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+    
     def _clone_repository(self, workspace: Path, repo_url: str, branch: str, github_token: str) -> Path:
         """Clone repository into workspace"""
         repo_dir = workspace / "repo"
@@ -115,9 +142,9 @@ class DirectTaskExecutor:
         
         logger.info(f"🔄 Cloning repository: {repo_url} (branch: {branch})")
         
-        result = subprocess.run([
+        result = self._run_cancellable([
             'git', 'clone', '-b', branch, auth_url, str(repo_dir)
-        ], capture_output=True, text=True, timeout=120)
+        ], timeout=120, span_name='git.clone')
         
         if result.returncode != 0:
             raise Exception(f"Git clone failed: {result.stderr}")
@@ -156,9 +183,9 @@ class DirectTaskExecutor:
         logger.info(f"🏠 HOME directory: {env.get('HOME', 'not set')}")
         
         # Use sudo with HOME environment variable explicitly set
-        result = subprocess.run([
+        result = self._run_cancellable([
             'sudo', '-u', 'claude-user', f'HOME={workspace}', 'claude', '--dangerously-skip-permissions', '--print', prompt
-        ], cwd=repo_dir, capture_output=True, text=True, timeout=600, env=env)
+        ], cwd=repo_dir, timeout=600, env=env, span_name='agent.claude')
         
         logger.info(f"📤 Claude stdout: {result.stdout[:200]}...")
         logger.info(f"📥 Claude stderr: {result.stderr[:200]}...")
@@ -238,8 +265,14 @@ class DirectTaskExecutor:
     def execute_task(self, task_id: int, user_id: str, github_token: str) -> bool:
         """Main execution method for a task"""
         workspace = None
+        self.task_id = task_id
+        started_at = time.monotonic()
+        timer = task_timers.get(task_id, 'claude')
+        timer.end()
         
         try:
+            task_cancellations.check(task_id)
+            
             # Get task details
             task = DatabaseOperations.get_task_by_id(task_id, user_id)
             if not task:
@@ -262,9 +295,11 @@ class DirectTaskExecutor:
             logger.info(f"🚀 Starting direct execution for task {task_id}")
             
             # Setup workspace
+            timer.begin('setup')
             workspace = self._setup_workspace(task_id)
             
             # Get user preferences for authentication
+            timer.begin('credentials')
             user = DatabaseOperations.get_user_by_id(user_id)
             user_preferences = user.get('preferences', {}) if user else {}
             claude_config = user_preferences.get('claudeCode', {})
@@ -275,6 +310,11 @@ class DirectTaskExecutor:
             
             if use_oauth and oauth_tokens.get('access_token'):
                 logger.info("🔐 Using OAuth authentication")
+                # Shared per-user cache: concurrent tasks for this user refresh at most once
+                success, oauth_tokens = ensure_user_oauth_tokens(user_id, oauth_tokens)
+                if not success:
+                    raise Exception("OAuth token refresh failed")
+                oauth_refresh_scheduler.track(user_id, oauth_tokens)
                 self._setup_credentials(workspace, oauth_tokens=oauth_tokens)
             else:
                 # Fallback to API key
@@ -285,16 +325,25 @@ class DirectTaskExecutor:
                 self._setup_credentials(workspace, api_key=api_key)
             
             # Clone repository
+            timer.begin('clone')
             repo_dir = self._clone_repository(
                 workspace, task['repo_url'], task['target_branch'], github_token
             )
             
             # Execute Claude with OAuth tokens if using OAuth
             oauth_for_execution = oauth_tokens if use_oauth else None
+            timer.begin('agent')
             stdout, stderr = self._execute_claude(workspace, repo_dir, prompt, oauth_for_execution)
             
             # Extract changes
+            timer.begin('extract')
             changes = self._extract_changes(repo_dir)
+            task_cancellations.check(task_id)
+            timer.add_bytes('stdout', stdout)
+            timer.add_bytes('diff', changes['git_diff'])
+            timer.add_bytes('patch', changes['git_patch'])
+            # Snapshot before persisting; the persist phase itself is only exported as a metric
+            timings = timer.to_dict()
             
             # Update task with results
             update_data = {
@@ -304,20 +353,41 @@ class DirectTaskExecutor:
                 'git_patch': changes['git_patch'],
                 'changed_files': changes['changed_files'],
                 'execution_metadata': {
+                    **(task.get('execution_metadata') or {}),  # keep submit-time metadata (priority, cache key)
                     'stdout': stdout,
                     'stderr': stderr,
+                    'timings': timings,
                     'completed_at': datetime.now().isoformat(),
                     'execution_method': 'direct_host'
                 }
             }
             
+            timer.begin('persist')
             DatabaseOperations.update_task(task_id, user_id, update_data)
+            timer.end()
             
             logger.info(f"🎉 Task {task_id} completed successfully")
+            record_task_finished('claude', 'direct', 'completed', time.monotonic() - started_at)
             return True
             
         except Exception as e:
+            if task_cancellations.is_abandoned(task_id):
+                # Another worker node holds the task now; its outcome is theirs to write
+                logger.warning(f"⚠️  Task {task_id} abandoned after its lease was lost")
+                record_task_finished('claude', 'direct', 'abandoned', time.monotonic() - started_at)
+                return False
+            if isinstance(e, TaskCancelled) or task_cancellations.is_cancelled(task_id):
+                # Re-assert the status in case the 'running' write raced the cancel endpoint
+                logger.info(f"🛑 Task {task_id} cancelled")
+                record_task_finished('claude', 'direct', 'cancelled', time.monotonic() - started_at)
+                try:
+                    DatabaseOperations.update_task(task_id, user_id, {'status': 'cancelled', 'error': 'Cancelled by user'})
+                except Exception:
+                    logger.error(f"Failed to update task {task_id} status after cancellation")
+                return False
+            
             logger.error(f"❌ Task {task_id} failed: {e}")
+            record_task_finished('claude', 'direct', 'failed', time.monotonic() - started_at)
             
             # Update task status to failed
             try:
@@ -334,9 +404,12 @@ class DirectTaskExecutor:
             # Cleanup workspace
             if workspace:
                 self._cleanup_workspace(workspace)
+            task_cancellations.finish(task_id)
+            task_timers.pop(task_id)
 
 
 def run_direct_task(task_id: int, user_id: str, github_token: str):
     """Entry point for direct task execution"""
+    # The scheduler already holds this task's claude slot (see execution_semaphore)
     executor = DirectTaskExecutor()
     return executor.execute_task(task_id, user_id, github_token)
\ No newline at end of file
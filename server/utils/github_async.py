@@ -0,0 +1,171 @@
+import os
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Awaitable, Callable, Dict, Optional
+from .task_metrics import github_call
+from .tracing import current_context, use_context
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+
+
+class GitHubAPIError(Exception):
+    """Raised when GitHub answers with a non-success status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class GitHubTimeout(Exception):
+    """A GitHub-bound request did not finish within its deadline and was cancelled"""
+
+
+class GitHubBusy(Exception):
+    """Too many request threads are already waiting on GitHub"""
+
+
+class GitHubResponse:
+    def __init__(self, status: int, data, headers, body: bytes):
+        self.status = status
+        self.data = data  # parsed JSON, or None for other content types
+        self.headers = headers
+        self.body = body
+
+
+class GitHubSession:
+    """Token-bound REST calls, awaited on the client's event loop"""
+
+    def __init__(self, client: 'AsyncGitHubClient', token: str):
+        self.client = client
+        self.headers = {
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'Claude-Code-Automation/1.0'
+        }
+
+    async def request(self, method: str, path: str, operation: str, json: Dict = None, params: Dict = None,
+                      headers: Dict = None, allow: tuple = ()) -> GitHubResponse:
+        """
+        Send one API request. Statuses >= 400 raise GitHubAPIError unless
+        listed in ``allow`` (e.g. 404 for a file that may not exist yet).
+        """
+        async with self.client.limit:
+            with github_call(operation):
+                async with self.client.http.request(method, GITHUB_API_URL + path, json=json, params=params,
+                                                    headers={**self.headers, **(headers or {})}) as response:
+                    body = await response.read()
+                    data = None
+                    if body and response.content_type == 'application/json':
+                        data = await response.json(content_type=None)
+        if response.status >= 400 and response.status not in allow:
+            message = data.get('message', '') if isinstance(data, dict) else body.decode('utf-8', 'replace')[:200]
+            raise GitHubAPIError(response.status, message)
+        return GitHubResponse(response.status, data, response.headers, body)
+
+    async def get(self, path: str, operation: str, **kwargs):
+        return (await self.request('GET', path, operation, **kwargs)).data
+
+    async def post(self, path: str, operation: str, json: Dict, **kwargs):
+        return (await self.request('POST', path, operation, json=json, **kwargs)).data
+
+    async def patch(self, path: str, operation: str, json: Dict, **kwargs):
+        return (await self.request('PATCH', path, operation, json=json, **kwargs)).data
+
+    async def delete(self, path: str, operation: str, **kwargs):
+        return await self.request('DELETE', path, operation, **kwargs)
+
+
+class AsyncGitHubClient:
+    """
+    GitHub REST client running on one process-wide asyncio event loop.
+
+    Request threads hand a coroutine to ``run`` and wait for it with a
+    deadline; the loop multiplexes every in-flight GitHub call over a shared
+    connection pool, so an endpoint can fan out (repo pages, file contents,
+    blobs) instead of making its calls one after another. A coroutine that
+    misses its deadline is cancelled along with all of its outstanding HTTP
+    requests. At most ``max_waiting`` request threads may wait on GitHub at
+    once, by default all but two of the gunicorn worker's threads. A request
+    beyond that queues for up to ``busy_wait`` seconds and then fails, so a
+    slow GitHub cannot tie up the whole worker thread pool and starve
+    unrelated endpoints, while a short burst still gets served.
+    """
+
+    def __init__(self, request_timeout: float = None, deadline: float = None,
+                 max_connections: int = None, max_waiting: int = None, busy_wait: float = None):
+        self.request_timeout = request_timeout or float(os.getenv('GITHUB_HTTP_TIMEOUT_SECONDS', '10'))
+        self.deadline = deadline or float(os.getenv('GITHUB_REQUEST_DEADLINE_SECONDS', '30'))
+        self.max_connections = max_connections or int(os.getenv('GITHUB_MAX_CONNECTIONS', '32'))
+        self.max_waiting = max_waiting or int(os.getenv('GITHUB_MAX_WAITING_REQUESTS', '0')) or self._default_max_waiting()
+        self.busy_wait = busy_wait if busy_wait is not None else float(os.getenv('GITHUB_BUSY_WAIT_SECONDS', '2'))
+        self._waiting = threading.BoundedSemaphore(self.max_waiting)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.http = None  # aiohttp.ClientSession, opened with the loop
+        self.limit: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def _default_max_waiting() -> int:
+        """Every gunicorn thread but two, which stay free for endpoints that do not call GitHub"""
+        return max(1, int(os.getenv('GUNICORN_THREADS', '8')) - 2)
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='github-async', daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+                logger.info(f"🐙 Async GitHub client started ({self.max_connections} connections, "
+                            f"{self.max_waiting} waiting requests)")
+            return self._loop
+
+    async def _open(self):
+        # aiohttp is only imported once a GitHub endpoint is first used; it is slow to import
+        import aiohttp
+        # Created on the loop thread, which owns them from here on
+        self.http = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            connector=aiohttp.TCPConnector(limit=self.max_connections)
+        )
+        self.limit = asyncio.Semaphore(self.max_connections)
+
+    def session(self, token: str) -> GitHubSession:
+        return GitHubSession(self, token)
+
+    def run(self, work: Callable[..., Awaitable], *args, deadline: float = None):
+        """
+        Run ``work(*args)`` on the event loop and wait for its result from a
+        request thread. Raises GitHubBusy when no waiting slot frees up
+        within ``busy_wait`` seconds, and GitHubTimeout (after cancelling the
+        work) when it outlives the deadline.
+        """
+        if not self._waiting.acquire(timeout=self.busy_wait):
+            raise GitHubBusy(f"{self.max_waiting} requests were still waiting on GitHub after {self.busy_wait:g}s")
+        try:
+            loop = self._start()
+            parent = current_context()
+
+            async def traced():
+                # Continue the request's trace on the loop thread
+                with use_context(parent):
+                    return await work(*args)
+
+            future = asyncio.run_coroutine_threadsafe(traced(), loop)
+            deadline = deadline or self.deadline
+            try:
+                return future.result(timeout=deadline)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise GitHubTimeout(f"GitHub did not respond within {deadline:g}s")
+        finally:
+            self._waiting.release()
+
+
+# Process-wide client shared by the GitHub-bound endpoints
+github_client = AsyncGitHubClient()
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from .github_async import GitHubAPIError, github_client
+
+logger = logging.getLogger(__name__)
+
+
+class GitHubPermissionProbe:
+    """
+    Read-only GitHub token and repository permission checks, awaited on
+    the async GitHub client's event loop.
+
+    Responses are cached per (token hash, resource) for ``ttl_seconds``. Once an
+    entry goes stale it is revalidated with ``If-None-Match``, so a repeat
+    validation costs at most one conditional request per resource and a 304
+    does not count against the token's rate limit. Nothing is ever written to
+    the repository.
+    """
+
+    def __init__(self, ttl_seconds: int = None, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('GITHUB_PERMISSION_CACHE_TTL', '300'))
+        self.max_entries = max_entries
+        self._cache: OrderedDict = OrderedDict()
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _parse_scopes(header_value: Optional[str]) -> Optional[List[str]]:
+        """Parse X-OAuth-Scopes; fine-grained tokens do not send the header at all"""
+        if header_value is None:
+            return None
+        return [scope.strip() for scope in header_value.split(',') if scope.strip()]
+
+    async def _get(self, token: str, path: str) -> Dict:
+        """GET an API resource through the cache, revalidating stale entries with their ETag"""
+        key = (self._token_hash(token), path)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry:
+                self._cache.move_to_end(key)
+                if now - entry['checked_at'] < self.ttl_seconds:
+                    return entry
+
+        # Concurrent lookups of the same resource share one request (all run on the client's loop)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._fetch(key, token, path, entry))
+            pending.add_done_callback(lambda done: self._settle(key, done))
+        # Shielded: a caller hitting its deadline must not cancel the lookup for the others
+        return await asyncio.shield(pending)
+
+    def _settle(self, key: tuple, done: asyncio.Future):
+        self._pending.pop(key, None)
+        if not done.cancelled():
+            done.exception()  # retrieved, even if every waiter has gone
+
+    async def _fetch(self, key: tuple, token: str, path: str, entry: Optional[Dict]) -> Dict:
+        now = time.monotonic()
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        try:
+            response = await github_client.session(token).request('GET', path, 'permission_probe', headers=headers)
+        except GitHubAPIError:
+            with self._lock:
+                self._cache.pop(key, None)
+            raise
+
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            logger.info(f"📊 GitHub rate limit remaining: {remaining}/{response.headers.get('X-RateLimit-Limit', '?')}")
+
+        if response.status == 304 and entry:
+            entry = dict(entry, checked_at=now)
+        else:
+            entry = {
+                'data': response.data,
+                'etag': response.headers.get('ETag'),
+                'scopes': self._parse_scopes(response.headers.get('X-OAuth-Scopes')),
+                'checked_at': now
+            }
+
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    async def get_token_info(self, token: str) -> Dict:
+        """Return the login and classic OAuth scopes (None for fine-grained tokens) of a token"""
+        entry = await self._get(token, '/user')
+        return {
+            'login': entry['data'].get('login'),
+            'scopes': entry['scopes']
+        }
+
+    async def get_repo_permissions(self, token: str, repo_full_name: str) -> Dict:
+        """Return repository metadata and the token's effective permissions on it"""
+        # Both lookups go out together; /user is usually already cached
+        token_info, entry = await asyncio.gather(
+            self.get_token_info(token),
+            self._get(token, f'/repos/{repo_full_name}')
+        )
+        repo = entry['data']
+        repo_perms = repo.get('permissions') or {}
+        scopes = token_info['scopes']
+
+        can_pull = bool(repo_perms.get('pull'))
+        can_push = bool(repo_perms.get('push'))
+
+        # A classic token can only write through the API if its scopes allow it,
+        # even when the user behind it has push access to the repository.
+        if scopes is not None and can_push:
+            can_push = 'repo' in scopes or ('public_repo' in scopes and not repo.get('private'))
+
+        return {
+            'name': repo.get('full_name'),
+            'private': repo.get('private'),
+            'default_branch': repo.get('default_branch'),
+            'permissions': {
+                'read': can_pull,
+                'write': can_push,
+                'admin': bool(repo_perms.get('admin')),
+                'read_branches': can_pull,
+                'create_branches': can_push
+            },
+            'scopes': scopes
+        }
+
+    def invalidate(self, token: str):
+        """Drop every cached entry for a token"""
+        token_hash = self._token_hash(token)
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == token_hash]:
+                del self._cache[key]
+
+
+# Process-wide probe; its coroutines run on github_client's loop
+permission_probe = GitHubPermissionProbe()
@@ -0,0 +1,200 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+from database import DatabaseOperations
+from .admission import parse_size
+from .metrics import Gauge
+from .task_dispatch import task_dispatcher
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_STATUS = Gauge(
+    'health_probe_status',
+    'Latest dependency probe result (1 ok, 0.5 degraded, 0 down)',
+    ['probe']
+)
+HEALTH_PROBE_LATENCY_SECONDS = Gauge(
+    'health_probe_latency_seconds',
+    'Duration of the latest dependency probe',
+    ['probe']
+)
+
+OK, DEGRADED, DOWN, SKIPPED = 'ok', 'degraded', 'down', 'skipped'
+_STATUS_VALUES = {OK: 1.0, DEGRADED: 0.5, DOWN: 0.0}
+
+
+def _docker_mode() -> bool:
+    return os.getenv('EXECUTION_MODE', 'direct').lower() == 'docker' or os.getenv('FORCE_DOCKER', 'false').lower() == 'true'
+
+
+class HealthProbes:
+    """
+    Probes the API's dependencies on a background thread and caches the results.
+
+    /health and /ready only read the cache, so load balancer checks cost
+    nothing and never reach the database or Docker daemon themselves. Each
+    probe runs with a timeout on its own pool thread so one hung dependency
+    cannot delay the others; a probe still stuck from the previous round is
+    reported down without being started again. Results older than three
+    intervals are treated as down.
+    """
+
+    def __init__(self, interval: float = None, timeout: float = None):
+        self.interval = interval or float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', '15'))
+        self.timeout = timeout or float(os.getenv('HEALTH_PROBE_TIMEOUT_SECONDS', '5'))
+        self.db_slow_seconds = float(os.getenv('HEALTH_DB_SLOW_MS', '1000')) / 1000
+        self.disk_path = os.getenv('HEALTH_DISK_PATH', '/tmp')
+        self.min_free_disk = parse_size(os.getenv('HEALTH_MIN_FREE_DISK', '1g'))
+        self.max_queue_depth = int(os.getenv('HEALTH_MAX_QUEUE_DEPTH', '100'))
+        self.docker_mode = _docker_mode()
+        # With remote or queue dispatch, containers and agent CLIs live with the executor service or worker nodes
+        self.runs_tasks = task_dispatcher.local
+
+        # name -> (probe, critical): a critical probe that is down makes the node unready
+        self.probes: Dict[str, tuple] = {
+            'database': (self._probe_database, True),
+            'docker': (self._probe_docker, self.docker_mode and self.runs_tasks),
+            'disk': (self._probe_disk, True),
+            # A full queue is backpressure, not a fault: /start-task already answers 503 when it cannot enqueue
+            'queue': (self._probe_queue, False),
+            # Direct mode runs every agent through the host's claude CLI
+            'claude_cli': (lambda: self._probe_cli('claude'), self.runs_tasks and not self.docker_mode),
+        }
+        self._results: Dict[str, Dict] = {}
+        self._in_flight: Dict[str, object] = {}
+        self._pool = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix='health-probe')
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- probes --------------------------------------------------------
+    # Each returns (status, detail dict)
+
+    def _probe_database(self):
+        started = time.monotonic()
+        DatabaseOperations.ping()
+        elapsed = time.monotonic() - started
+        return (DEGRADED if elapsed > self.db_slow_seconds else OK), {}
+
+    def _probe_docker(self):
+        if not self.runs_tasks:
+            return SKIPPED, {'reason': 'tasks run on the executor service or worker nodes'}
+        if not self.docker_mode:
+            return SKIPPED, {'reason': 'direct execution mode'}
+        from .container import docker_client
+        docker_client.ping()
+        return OK, {}
+
+    def _probe_disk(self):
+        usage = shutil.disk_usage(self.disk_path)
+        status = DOWN if usage.free < self.min_free_disk else DEGRADED if usage.free < 2 * self.min_free_disk else OK
+        return status, {'path': self.disk_path, 'free_bytes': usage.free, 'total_bytes': usage.total}
+
+    def _probe_queue(self):
+        # Remote dispatch: also the executor service's reachability; queue dispatch: the cluster-wide queue
+        stats = task_dispatcher.scheduler_stats()
+        queued = stats['queued']
+        status = DEGRADED if queued >= 0.8 * self.max_queue_depth else OK
+        return status, {'queued': queued, 'running': stats['running'], 'max_queued': self.max_queue_depth}
+
+    def _probe_cli(self, name: str):
+        if not self.runs_tasks:
+            return SKIPPED, {'reason': 'tasks run on the executor service or worker nodes'}
+        if self.docker_mode:
+            return SKIPPED, {'reason': 'installed inside task containers'}
+        path = shutil.which(name)
+        if not path:
+            return DOWN, {'error': f'{name} not found on PATH'}
+        result = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            return DOWN, {'path': path, 'error': (result.stderr or result.stdout).strip()[:200]}
+        return OK, {'path': path, 'version': result.stdout.strip()[:100]}
+
+    # -- scheduling ----------------------------------------------------
+
+    def _timed(self, probe: Callable):
+        started = time.monotonic()
+        status, detail = probe()
+        return status, detail, time.monotonic() - started
+
+    def run_once(self):
+        """Run every probe (concurrently, each bounded by the timeout) and cache the results"""
+        futures = {}
+        for name, (probe, _) in self.probes.items():
+            previous = self._in_flight.get(name)
+            if previous is not None and not previous.done():
+                self._store(name, DOWN, {'error': 'previous probe still running'}, None)
+                continue
+            futures[name] = self._in_flight[name] = self._pool.submit(self._timed, probe)
+
+        deadline = time.monotonic() + self.timeout
+        for name, future in futures.items():
+            try:
+                status, detail, elapsed = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                self._store(name, status, detail, elapsed)
+            except FutureTimeout:
+                self._store(name, DOWN, {'error': f'timed out after {self.timeout:g}s'}, None)
+            except Exception as e:
+                self._store(name, DOWN, {'error': str(e)[:200]}, None)
+
+    def _store(self, name: str, status: str, detail: Dict, elapsed: Optional[float]):
+        if status != SKIPPED:
+            HEALTH_PROBE_STATUS.labels(name).set(_STATUS_VALUES[status])
+            if elapsed is not None:
+                HEALTH_PROBE_LATENCY_SECONDS.labels(name).set(elapsed)
+        if status == DOWN and (self._results.get(name) or {}).get('status') != DOWN:
+            logger.warning(f"⚠️  Health probe {name} is down: {detail.get('error', detail)}")
+        result = {
+            'status': status,
+            'critical': self.probes[name][1],
+            'latency_ms': round(elapsed * 1000, 1) if elapsed is not None else None,
+            'checked_at': time.time(),
+            **detail
+        }
+        with self._lock:
+            self._results[name] = result
+
+    def _run(self):
+        logger.info(f"🩺 Health probes started (every {self.interval:g}s)")
+        while True:
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Health probe round failed: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='health-probes', daemon=True)
+                self._thread.start()
+
+    # -- reporting -----------------------------------------------------
+
+    def snapshot(self) -> Dict:
+        """Cached probe results and the overall status: healthy, degraded, unhealthy or starting"""
+        now = time.time()
+        with self._lock:
+            checks = {name: dict(result) for name, result in self._results.items()}
+        for result in checks.values():
+            if result['status'] != SKIPPED and now - result['checked_at'] > 3 * self.interval:
+                result['status'], result['error'] = DOWN, 'stale'
+
+        if len(checks) < len(self.probes):
+            overall = 'starting'
+        elif any(r['status'] == DOWN and r['critical'] for r in checks.values()):
+            overall = 'unhealthy'
+        elif any(r['status'] in (DOWN, DEGRADED) for r in checks.values()):
+            overall = 'degraded'
+        else:
+            overall = 'healthy'
+        return {'status': overall, 'checks': checks}
+
+
+# Process-wide probes, started by the server entry point
+health_probes = HealthProbes()
@@ -0,0 +1,49 @@
+import time
+import logging
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class LazySingleton(Generic[T]):
+    """
+    A process-wide client built on first use instead of at import.
+
+    Attribute access is forwarded to the instance, so a module-level
+    ``client = LazySingleton(factory)`` can replace ``client = factory()``
+    without touching its call sites. The factory runs once, under a lock;
+    if it raises, nothing is cached and the next use tries again (e.g. once
+    the Docker daemon is up).
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'client')
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.monotonic()
+                    self._instance = self._factory()
+                    logger.info(f"🔌 {self._name} ready in {(time.monotonic() - started) * 1000:.0f} ms")
+                instance = self._instance
+        return instance
+
+    def set(self, instance: T):
+        """Use ``instance`` instead of building one (benchmarks, local fakes)"""
+        with self._lock:
+            self._instance = instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
@@ -0,0 +1,208 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from database import DatabaseOperations
+from .claude_oauth import expires_at_seconds, ensure_user_oauth_tokens, oauth_token_cache
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+OAUTH_TRACKED_USERS = Gauge(
+    'claude_oauth_refresh_tracked_users',
+    'Users whose OAuth tokens the background scheduler keeps fresh'
+)
+OAUTH_SCHEDULED_REFRESHES = Counter(
+    'claude_oauth_scheduled_refreshes_total',
+    'Background OAuth refresh attempts by result',
+    ['result']
+)
+
+
+class OAuthRefreshScheduler:
+    """
+    Keeps OAuth tokens fresh ahead of expiry on a background thread.
+
+    Each tracked user is scheduled at ``expires_at - lead_seconds``. The lead is
+    larger than the 300s buffer executors check against, so task start finds
+    valid tokens in the shared cache instead of refreshing inline. Users with
+    OAuth enabled are (re)discovered from the database every ``rescan_seconds``.
+    Failed refreshes are retried with exponential backoff; after ``max_failures``
+    in a row the user is dropped until they re-authenticate (a new refresh token).
+
+    With a ``leader_check`` (worker nodes), only the process it approves refreshes
+    in the background; the others stand by and recheck every
+    ``standby_seconds``, so a cluster rotates each user's tokens once.
+    """
+
+    def __init__(self, lead_seconds: int = None, rescan_seconds: int = None, retry_seconds: int = None,
+                 max_retry_seconds: int = None, max_failures: int = None):
+        self.lead_seconds = lead_seconds or int(os.getenv('CLAUDE_OAUTH_REFRESH_LEAD_SECONDS', '900'))
+        self.rescan_seconds = rescan_seconds or int(os.getenv('CLAUDE_OAUTH_RESCAN_SECONDS', '600'))
+        self.retry_seconds = retry_seconds or int(os.getenv('CLAUDE_OAUTH_REFRESH_RETRY_SECONDS', '60'))
+        self.max_retry_seconds = max_retry_seconds or int(os.getenv('CLAUDE_OAUTH_REFRESH_MAX_RETRY_SECONDS', '3600'))
+        self.max_failures = max_failures or int(os.getenv('CLAUDE_OAUTH_REFRESH_MAX_FAILURES', '5'))
+        self._heap = []
+        self._due: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}     # consecutive failed refreshes per user
+        self._given_up: Dict[str, str] = {}     # user -> refresh token that kept failing
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._next_rescan = 0.0
+        self.standby_seconds = 30
+        self.leader_check: Optional[Callable[[], bool]] = None
+        OAUTH_TRACKED_USERS.set_function(lambda: len(self._due))
+
+    def _schedule(self, user_id: str, due_at: float):
+        with self._cond:
+            self._due[user_id] = due_at
+            heapq.heappush(self._heap, (due_at, user_id))
+            self._cond.notify()
+
+    def track(self, user_id: str, tokens: Dict):
+        """Start (or keep) refreshing a user's tokens ahead of their expiry"""
+        if not self._leading():
+            oauth_token_cache.put(user_id, tokens)
+            return
+        if user_id in self._given_up:
+            if self._given_up[user_id] == tokens.get('refresh_token'):
+                return
+            # Re-authenticated since the refreshes failed
+            self._given_up.pop(user_id, None)
+            self._failures.pop(user_id, None)
+        oauth_token_cache.put(user_id, tokens)
+        current = oauth_token_cache.get(user_id) or tokens
+        due_at = expires_at_seconds(current) - self.lead_seconds
+        if self._due.get(user_id) != due_at:
+            self._schedule(user_id, due_at)
+
+    def untrack(self, user_id: str):
+        """Stop refreshing a user's tokens (stale heap entries are skipped)"""
+        with self._cond:
+            self._due.pop(user_id, None)
+            self._failures.pop(user_id, None)
+
+    def _leading(self) -> bool:
+        return self.leader_check is None or self.leader_check()
+
+    def _standby(self):
+        """Drop every tracked user while another process runs the background refresh"""
+        with self._cond:
+            if self._due:
+                logger.info(f"🔁 OAuth refresh scheduler standing by; another node refreshes {len(self._due)} users")
+            self._due.clear()
+            self._heap.clear()
+            self._failures.clear()
+
+    def _rescan(self):
+        """Discover users with OAuth enabled and track their stored tokens"""
+        try:
+            users = DatabaseOperations.get_oauth_users()
+        except Exception as e:
+            logger.warning(f"⚠️  OAuth refresh scheduler could not list OAuth users: {e}")
+            return
+
+        seen = set()
+        for user in users:
+            tokens = ((user.get('preferences') or {}).get('claudeCode') or {}).get('oauth') or {}
+            if tokens.get('access_token') and tokens.get('refresh_token') and tokens.get('expires_at'):
+                seen.add(user['id'])
+                self.track(user['id'], tokens)
+
+        for user_id in [u for u in list(self._due) if u not in seen]:
+            self.untrack(user_id)
+        for user_id in [u for u in list(self._given_up) if u not in seen]:
+            self._given_up.pop(user_id, None)
+        logger.info(f"🔁 OAuth refresh scheduler tracking {len(self._due)} users")
+
+    def _refresh(self, user_id: str):
+        tokens = oauth_token_cache.get(user_id)
+        if not tokens:
+            self.untrack(user_id)
+            return
+
+        success, refreshed = ensure_user_oauth_tokens(
+            user_id, tokens, buffer_seconds=self.lead_seconds, trigger='scheduler'
+        )
+        if success:
+            OAUTH_SCHEDULED_REFRESHES.labels('success').inc()
+            self._failures.pop(user_id, None)
+            # Never reschedule sooner than the retry interval, even for short-lived tokens
+            next_due = max(expires_at_seconds(refreshed) - self.lead_seconds, time.time() + self.retry_seconds)
+            self._schedule(user_id, next_due)
+        else:
+            OAUTH_SCHEDULED_REFRESHES.labels('failure').inc()
+            self._failed(user_id, tokens)
+
+    def _failed(self, user_id: str, tokens: Dict = None):
+        """Back off exponentially after a failed refresh, or stop tracking after too many in a row"""
+        failures = self._failures.get(user_id, 0) + 1
+        if failures >= self.max_failures:
+            self.untrack(user_id)
+            self._given_up[user_id] = (tokens or oauth_token_cache.get(user_id) or {}).get('refresh_token')
+            logger.warning(f"⚠️  Background OAuth refresh failed {failures} times in a row for {user_id}; "
+                           f"not retrying until the user re-authenticates")
+            return
+        self._failures[user_id] = failures
+        delay = min(self.retry_seconds * 2 ** (failures - 1), self.max_retry_seconds)
+        logger.warning(f"⚠️  Background OAuth refresh failed for {user_id}, retrying in {delay}s")
+        self._schedule(user_id, time.time() + delay)
+
+    def _run(self):
+        logger.info("🔄 OAuth refresh scheduler started")
+        while True:
+            if time.time() >= self._next_rescan:
+                if self._leading():
+                    self._rescan()
+                    self._next_rescan = time.time() + self.rescan_seconds
+                else:
+                    self._standby()
+                    self._next_rescan = time.time() + min(self.standby_seconds, self.rescan_seconds)
+
+            due_users = []
+            with self._cond:
+                if self._stopping:
+                    break
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, user_id = heapq.heappop(self._heap)
+                    if self._due.get(user_id) == due_at:
+                        due_users.append(user_id)
+                if not due_users:
+                    next_due = self._heap[0][0] if self._heap else self._next_rescan
+                    self._cond.wait(max(0.0, min(next_due, self._next_rescan) - now))
+                    continue
+
+            if not self._leading():
+                self._standby()
+                continue
+            for user_id in due_users:
+                try:
+                    self._refresh(user_id)
+                except Exception as e:
+                    logger.error(f"❌ Unexpected error refreshing OAuth tokens for {user_id}: {e}")
+                    self._failed(user_id)
+        logger.info("🛑 OAuth refresh scheduler stopped")
+
+    def start(self, leader_check: Callable[[], bool] = None):
+        """Run the background thread; ``leader_check`` limits refreshing to the process it returns True in"""
+        with self._cond:
+            self.leader_check = leader_check
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='oauth-refresh', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+
+# Process-wide scheduler, started by the server entry point
+oauth_refresh_scheduler = OAuthRefreshScheduler()
@@ -0,0 +1,131 @@
+import time
+import threading
+from typing import Dict, List, Optional
+from .task_metrics import TASK_PHASE_SECONDS
+
+# Phases in pipeline order; executors record the subset that applies to them
+PHASES = (
+    'queue_wait', 'credentials', 'setup', 'container_create',
+    'clone', 'agent', 'extract', 'parse', 'persist'
+)
+
+
+class PhaseTimer:
+    """
+    Monotonic start/end times for each phase of one task.
+
+    Phases are sequential: ``begin()`` closes the open phase and opens the next,
+    ``end()`` closes the open phase. Times are stored as offsets in seconds from
+    the timer's creation (normally task submission) so the result is compact.
+    """
+
+    def __init__(self, agent: str = 'claude', origin: float = None):
+        self.agent = agent
+        self.origin = origin if origin is not None else time.monotonic()
+        self.phases: Dict[str, List[float]] = {}
+        self.bytes: Dict[str, int] = {}
+        self._open: Optional[tuple] = None
+
+    def begin(self, name: str):
+        now = time.monotonic()
+        self._close(now)
+        self._open = (name, now)
+
+    def end(self):
+        self._close(time.monotonic())
+
+    def _close(self, now: float):
+        if self._open:
+            name, started = self._open
+            self._open = None
+            self.record(name, started, now)
+
+    def record(self, name: str, started: float, ended: float):
+        """Record a phase from absolute monotonic times"""
+        self.phases[name] = [round(started - self.origin, 3), round(ended - self.origin, 3)]
+        TASK_PHASE_SECONDS.labels(self.agent, name).observe(max(0.0, ended - started))
+
+    def record_wall_clock(self, marks: List[tuple]):
+        """
+        Record phases from (name, epoch seconds) marks taken elsewhere (e.g. inside a
+        container); each phase runs until the next mark.
+        """
+        offset = time.time() - time.monotonic()
+        for (name, started), (_, ended) in zip(marks, marks[1:]):
+            self.record(name, started - offset, ended - offset)
+
+    def add_bytes(self, name: str, value):
+        if value is None:
+            return
+        self.bytes[name] = self.bytes.get(name, 0) + (len(value.encode('utf-8')) if isinstance(value, str) else int(value))
+
+    def to_dict(self) -> Dict:
+        self.end()
+        total = max((end for _, end in self.phases.values()), default=0.0)
+        return {'phases': self.phases, 'bytes': self.bytes, 'total': total}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def aggregate_timings(tasks: List[Dict]) -> Dict:
+    """Per-phase count, mean, p50, p95 and max duration (plus mean bytes) over tasks' stored timings"""
+    durations: Dict[str, List[float]] = {}
+    byte_counts: Dict[str, List[int]] = {}
+    for task in tasks:
+        timings = task.get('timings') or {}
+        for name, (started, ended) in (timings.get('phases') or {}).items():
+            durations.setdefault(name, []).append(ended - started)
+        if timings.get('total'):
+            durations.setdefault('total', []).append(timings['total'])
+        for name, value in (timings.get('bytes') or {}).items():
+            byte_counts.setdefault(name, []).append(value)
+
+    order = {name: i for i, name in enumerate(PHASES + ('total',))}
+    phases = {}
+    for name in sorted(durations, key=lambda n: order.get(n, len(order))):
+        values = durations[name]
+        phases[name] = {
+            'count': len(values),
+            'mean': round(sum(values) / len(values), 3),
+            'p50': round(_percentile(values, 0.5), 3),
+            'p95': round(_percentile(values, 0.95), 3),
+            'max': round(max(values), 3)
+        }
+    return {
+        'tasks': len(tasks),
+        'phases': phases,
+        'bytes': {name: {'count': len(v), 'mean': int(sum(v) / len(v))} for name, v in byte_counts.items()}
+    }
+
+
+class PhaseTimerRegistry:
+    """Hands a task's timer from the scheduler (queue wait) to its executor"""
+
+    def __init__(self):
+        self._timers: Dict[int, PhaseTimer] = {}
+        self._lock = threading.Lock()
+
+    def start(self, task_id: int, agent: str = 'claude') -> PhaseTimer:
+        timer = PhaseTimer(agent)
+        with self._lock:
+            self._timers[task_id] = timer
+        return timer
+
+    def get(self, task_id: int, agent: str = 'claude') -> PhaseTimer:
+        """The task's timer, created now if the task was not submitted through the scheduler"""
+        with self._lock:
+            timer = self._timers.get(task_id)
+            if timer is None:
+                timer = self._timers[task_id] = PhaseTimer(agent)
+            return timer
+
+    def pop(self, task_id: int) -> Optional[PhaseTimer]:
+        with self._lock:
+            return self._timers.pop(task_id, None)
+
+
+# Process-wide registry shared by the scheduler and both executors
+task_timers = PhaseTimerRegistry()
@@ -0,0 +1,152 @@
+import sys
+import time
+import marshal
+import logging
+import threading
+import traceback
+from collections import Counter as _Counts
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Hard limits so a forgotten session cannot hurt a live process
+MAX_DURATION_SECONDS = 300
+MIN_INTERVAL_SECONDS = 0.001
+MAX_STACK_DEPTH = 128
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class StackSampler:
+    """
+    Statistical profiler over ``sys._current_frames()``.
+
+    A single daemon thread snapshots every other thread's stack each
+    ``interval`` seconds; nothing is installed in the profiled threads, so the
+    overhead is one frame walk per thread per sample and stops entirely when the
+    session ends. Only one session runs at a time and sessions stop on their own
+    after ``duration`` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: _Counts = _Counts()
+        self._samples = 0
+        self.interval = 0.01
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 30, interval: float = 0.01) -> Dict:
+        """Start a sampling session; raises RuntimeError if one is already running"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profiling session is already running")
+            self.interval = max(MIN_INTERVAL_SECONDS, float(interval))
+            duration = min(MAX_DURATION_SECONDS, max(0.1, float(duration)))
+            self._stacks = _Counts()
+            self._samples = 0
+            self._stop.clear()
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._thread = threading.Thread(target=self._run, args=(duration,), name='stack-sampler', daemon=True)
+            self._thread.start()
+        logger.info(f"🔬 Stack sampling started ({duration:g}s at {self.interval * 1000:g}ms)")
+        return self.status()
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        return self.status()
+
+    def _run(self, duration: float):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration
+        names = {}
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_key(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                self._stacks[(names.get(ident, str(ident)),) + tuple(stack)] += 1
+            self._samples += 1
+            self._stop.wait(self.interval)
+        self.stopped_at = time.time()
+        logger.info(f"🔬 Stack sampling stopped after {self._samples} samples")
+
+    def status(self) -> Dict:
+        return {
+            'running': self.running,
+            'samples': self._samples,
+            'interval_seconds': self.interval,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'distinct_stacks': len(self._stacks)
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format (thread;outer;...;inner count), for flamegraph.pl / speedscope"""
+        lines = []
+        for stack, count in self._stacks.most_common():
+            thread, frames = stack[0], stack[1:]
+            names = [thread] + [f'{name} ({filename.rsplit("/", 1)[-1]}:{line})' for filename, line, name in frames]
+            lines.append(';'.join(n.replace(';', ':') for n in names) + f' {count}')
+        return '\n'.join(lines) + '\n'
+
+    def pstats(self) -> bytes:
+        """
+        Samples converted to a marshalled pstats dict (loadable with pstats.Stats or
+        snakeviz). Call counts are sample counts and times are samples * interval.
+        """
+        stats = {}
+        for stack, count in self._stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            seen = set()
+            for i, key in enumerate(frames):
+                cc, nc, tt, ct, callers = stats.get(key, (0, 0, 0.0, 0.0, {}))
+                if key not in seen:
+                    # Count inclusive time once per stack even under recursion
+                    ct += count * self.interval
+                    nc += count
+                    cc += count
+                    seen.add(key)
+                if i == len(frames) - 1:
+                    tt += count * self.interval
+                if i > 0:
+                    caller = frames[i - 1]
+                    c = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c[0] + count, c[1] + count, c[2], c[3] + count * self.interval)
+                stats[key] = (cc, nc, tt, ct, callers)
+        return marshal.dumps(stats)
+
+
+def thread_dump() -> str:
+    """Current stack of every thread, innermost frame last"""
+    names = {t.ident: (t.name, t.daemon) for t in threading.enumerate()}
+    sections = []
+    for ident, frame in sys._current_frames().items():
+        name, daemon = names.get(ident, ('<unknown>', False))
+        header = f'Thread {name} (ident {ident}{", daemon" if daemon else ""})'
+        sections.append(header + '\n' + ''.join(traceback.format_stack(frame)))
+    return '\n'.join(sections)
+
+
+# Process-wide sampler used by the admin endpoints
+stack_sampler = StackSampler()
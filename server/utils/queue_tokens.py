@@ -0,0 +1,52 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueueTokenCipher:
+    """
+    Encrypts the GitHub tokens stored in ``task_queue`` rows.
+
+    API nodes encrypt on enqueue and worker nodes decrypt just before running
+    the task, both with the Fernet key in TASK_QUEUE_ENCRYPTION_KEY, so the
+    database only ever holds ciphertext. ``cryptography`` is imported on first
+    use: only TASK_DISPATCH=queue deployments need it.
+    """
+
+    def __init__(self, key: str = None):
+        self._key = key
+        self._fernet = None
+        self._lock = threading.Lock()
+
+    def _cipher(self):
+        with self._lock:
+            if self._fernet is None:
+                key = self._key or os.getenv('TASK_QUEUE_ENCRYPTION_KEY', '')
+                if not key:
+                    raise RuntimeError("TASK_QUEUE_ENCRYPTION_KEY is not set; it is required with TASK_DISPATCH=queue")
+                from cryptography.fernet import Fernet
+                self._fernet = Fernet(key.encode())
+            return self._fernet
+
+    def check(self):
+        """Raise early if the key is missing or malformed"""
+        self._cipher()
+
+    def encrypt(self, token: str) -> str:
+        return self._cipher().encrypt(token.encode()).decode()
+
+    def decrypt(self, value: str) -> str:
+        """Plain token for a stored value; raises ValueError if it cannot be decrypted"""
+        from cryptography.fernet import InvalidToken
+        if not value:
+            raise ValueError("no GitHub token stored for the task")
+        try:
+            return self._cipher().decrypt(value.encode()).decode()
+        except InvalidToken:
+            raise ValueError("GitHub token could not be decrypted; is TASK_QUEUE_ENCRYPTION_KEY the same on every node?")
+
+
+# Shared by the queue dispatcher (API nodes) and worker nodes
+queue_token_cipher = QueueTokenCipher()
@@ -0,0 +1,168 @@
+import os
+import json
+import zlib
+import uuid
+import decimal
+import logging
+from datetime import date
+from typing import Iterator, Optional
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # stdlib json still works, just slower on multi-MB payloads
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Smaller bodies are sent as-is: compressing them costs more than it saves
+COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+# Larger bodies are encoded and compressed piece by piece instead of held in memory whole
+STREAM_MIN_BYTES = int(os.getenv('RESPONSE_STREAM_MIN_BYTES', str(1024 * 1024)))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '4'))
+
+CHUNK_BYTES = 64 * 1024
+
+
+def _default(value):
+    """Types Flask's JSON provider accepts that the encoders do not handle natively"""
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(value) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default)
+        except TypeError:
+            pass  # e.g. non-string keys, integers beyond 64 bits or lone surrogates; the stdlib encoder handles those
+    # ASCII escapes keep lone surrogates (e.g. from undecodable agent output) encodable, as Flask's own jsonify does
+    return json.dumps(value, separators=(',', ':'), default=_default).encode('ascii')
+
+
+def iter_json(value) -> Iterator[bytes]:
+    """
+    Encode ``value`` as a sequence of JSON fragments of roughly CHUNK_BYTES
+    or less, so no buffer ever holds the whole document: small subtrees are
+    encoded in one call, large ones member by member.
+    """
+    if isinstance(value, (dict, list, tuple)) and approximate_size(value) <= CHUNK_BYTES:
+        yield encode_json(value)
+    elif isinstance(value, dict):
+        yield b'{'
+        for n, (key, item) in enumerate(value.items()):
+            yield (b',' if n else b'') + encode_json(str(key)) + b':'
+            yield from iter_json(item)
+        yield b'}'
+    elif isinstance(value, (list, tuple)):
+        yield b'['
+        for n, item in enumerate(value):
+            if n:
+                yield b','
+            yield from iter_json(item)
+        yield b']'
+    elif isinstance(value, str) and len(value) > CHUNK_BYTES:
+        # Escaping is per character, so a long string can be encoded slice by slice
+        yield b'"'
+        for start in range(0, len(value), CHUNK_BYTES):
+            yield encode_json(value[start:start + CHUNK_BYTES])[1:-1]
+        yield b'"'
+    else:
+        yield encode_json(value)
+
+
+def approximate_size(value) -> int:
+    """Rough encoded size from string lengths, without encoding anything"""
+    if isinstance(value, str):
+        return len(value) + 2
+    if isinstance(value, dict):
+        return sum(len(str(key)) + 4 + approximate_size(item) for key, item in value.items()) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(approximate_size(item) + 1 for item in value) + 2
+    return 8
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """'br' or 'gzip' from an Accept-Encoding header (preferring br), or None for identity"""
+    offered = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if offered.get(encoding, offered.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress, self.flush = self._compressor.process, self._compressor.finish
+        else:
+            # wbits 16+: gzip container
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress, self.flush = self._compressor.compress, self._compressor.flush
+
+
+def _stream(fragments: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Coalesce fragments into ~CHUNK_BYTES writes, compressing them on the way out"""
+    compressor = _Compressor(encoding) if encoding else None
+    buffer, buffered = [], 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        buffered += len(fragment)
+        if buffered >= CHUNK_BYTES:
+            chunk = b''.join(buffer) if len(buffer) > 1 else fragment
+            buffer, buffered = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    tail = b''.join(buffer)
+    if compressor:
+        tail = compressor.compress(tail) + compressor.flush()
+    if tail:
+        yield tail
+
+
+def json_response(payload, status: int = 200) -> Response:
+    """
+    ``jsonify`` for large payloads: encoded with orjson when available,
+    compressed with brotli or gzip as the client accepts, and streamed in
+    chunks once the body would exceed RESPONSE_STREAM_MIN_BYTES.
+    """
+    size = approximate_size(payload)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if size >= COMPRESS_MIN_BYTES else None
+
+    if size >= STREAM_MIN_BYTES:
+        response = Response(_stream(iter_json(payload), encoding), status=status, mimetype='application/json')
+    else:
+        body = encode_json(payload)
+        if encoding:
+            compressor = _Compressor(encoding)
+            body = compressor.compress(body) + compressor.flush()
+        response = Response(body, status=status, mimetype='application/json')
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
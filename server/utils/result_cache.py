@@ -0,0 +1,115 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from database import DatabaseOperations
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_LOOKUPS = Counter(
+    'result_cache_lookups_total',
+    'Result cache lookups at task submission by outcome',
+    ['result']
+)
+
+# Fields copied from the cached task onto the new one
+CACHED_RESULT_FIELDS = ('commit_hash', 'git_diff', 'git_patch', 'changed_files')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially reformatted resubmissions still match"""
+    return re.sub(r'\s+', ' ', prompt or '').strip()
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Reuses the results of a completed task for an identical resubmission.
+
+    A task's cache key is (repo, base commit, normalized prompt, agent), scoped to
+    the submitting user. The base commit is the branch head at submit time,
+    resolved with ``git ls-remote`` and cached for ``head_ttl`` seconds so
+    repeated submissions do not each pay a network round trip. The lookup runs
+    on the request path, so ls-remote is capped at ``head_timeout`` seconds and
+    a slow remote is treated as a cache miss.
+    """
+
+    MAX_HEADS = 1024
+
+    def __init__(self, enabled: bool = None, head_ttl: int = None, head_timeout: float = None):
+        self.enabled = enabled if enabled is not None else os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+        self.head_ttl = head_ttl or int(os.getenv('RESULT_CACHE_HEAD_TTL', '30'))
+        self.head_timeout = head_timeout or float(os.getenv('RESULT_CACHE_HEAD_TIMEOUT_SECONDS', '3'))
+        self._heads: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve_head(self, repo_url: str, branch: str, github_token: str = None) -> Optional[str]:
+        """Commit SHA at the head of a branch, or None if it cannot be resolved"""
+        key = (repo_url, branch, hashlib.sha256((github_token or '').encode()).hexdigest())
+        with self._lock:
+            cached = self._heads.get(key)
+            if cached and time.monotonic() - cached[0] < self.head_ttl:
+                self._heads.move_to_end(key)
+                return cached[1]
+
+        auth_url = repo_url
+        if github_token and 'github.com' in repo_url:
+            auth_url = repo_url.replace('https://github.com/', f'https://{github_token}@github.com/')
+        try:
+            result = subprocess.run(
+                ['git', 'ls-remote', auth_url, f'refs/heads/{branch}'],
+                capture_output=True, text=True, timeout=self.head_timeout,
+                env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+            )
+        except subprocess.TimeoutExpired:
+            logger.warning(f"⚠️  ls-remote for {repo_url} took over {self.head_timeout:g}s, skipping the result cache")
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  ls-remote failed for {repo_url}: {e}")
+            return None
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+
+        sha = result.stdout.split()[0]
+        with self._lock:
+            self._heads[key] = (time.monotonic(), sha)
+            self._heads.move_to_end(key)
+            while len(self._heads) > self.MAX_HEADS:
+                self._heads.popitem(last=False)
+        return sha
+
+    def cache_key(self, repo_url: str, branch: str, prompt: str, github_token: str = None) -> Optional[Dict]:
+        """Metadata identifying this submission (stored on the task), or None when caching is off"""
+        if not self.enabled:
+            return None
+        base_commit = self.resolve_head(repo_url, branch, github_token)
+        if not base_commit:
+            return None
+        return {'base_commit': base_commit, 'prompt_hash': prompt_hash(prompt)}
+
+    def lookup(self, user_id: str, repo_url: str, agent: str, key: Optional[Dict]) -> Optional[Dict]:
+        """Most recent completed task with the same key, if any"""
+        if not key:
+            return None
+        try:
+            task = DatabaseOperations.find_cached_task_result(
+                user_id, repo_url, agent, key['base_commit'], key['prompt_hash']
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Result cache lookup failed: {e}")
+            task = None
+        RESULT_CACHE_LOOKUPS.labels('hit' if task else 'miss').inc()
+        return task
+
+
+# Process-wide cache used by /start-task
+result_cache = ResultCache()
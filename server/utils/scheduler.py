@@ -0,0 +1,341 @@
+import os
+import time
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from database import DatabaseOperations
+from . import run_ai_code_task_smart
+from .admission import admission_controller, task_resource_profile
+from .agent_semaphore import execution_semaphore
+from .metrics import Gauge, Histogram
+from .phase_timer import task_timers
+from .tracing import current_context, record_span, start_span, use_context
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_QUEUE_DEPTH = Gauge('scheduler_queue_depth', 'Tasks waiting to be dispatched')
+SCHEDULER_RUNNING = Gauge('scheduler_running_tasks', 'Tasks dispatched and not yet finished')
+SCHEDULER_WAIT_SECONDS = Histogram('scheduler_wait_seconds', 'Time between task submission and dispatch', ['priority'])
+
+# Dispatch priority classes, most urgent first
+PRIORITY_CLASSES = {'interactive': 0, 'normal': 1, 'batch': 2}
+DEFAULT_PRIORITY = 'normal'
+
+# A queued task is promoted one priority class for every PRIORITY_AGING_SECONDS it waits
+PRIORITY_AGING_SECONDS = float(os.getenv('PRIORITY_AGING_SECONDS', '120'))
+
+
+class _QueuedTask:
+    __slots__ = ('task_id', 'user_id', 'project_id', 'github_token', 'agent', 'profile', 'priority',
+                 'submitted_at', 'submitted_ns', 'sort_key', 'trace_context', 'on_finished', 'agent_slot')
+
+    _sequence = itertools.count()
+
+    def __init__(self, task_id, user_id, project_id, github_token, agent, profile, priority, on_finished=None):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.project_id = project_id
+        self.github_token = github_token
+        self.agent = agent
+        self.profile = profile
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+        self.submitted_ns = time.time_ns()
+        # The submitting request's span; dispatch happens on other threads
+        self.trace_context = current_context()
+        # Called once the dispatched task has finished (worker nodes release its queue row)
+        self.on_finished = on_finished
+        # Host-wide agent slot taken at dispatch and held until the task finishes
+        self.agent_slot = None
+        # rank - wait / aging is time-invariant as rank * aging + submitted_at, so the
+        # heap order stays correct as tasks age without ever re-sorting
+        self.sort_key = (PRIORITY_CLASSES[priority] * PRIORITY_AGING_SECONDS + self.submitted_at, next(self._sequence))
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    def effective_class(self, now: float) -> int:
+        """Priority class after aging (0 is the most urgent)"""
+        return max(0, PRIORITY_CLASSES[self.priority] - int((now - self.submitted_at) // PRIORITY_AGING_SECONDS))
+
+
+class _Tenant:
+    """Fair-share accounting for one user or one project within a user"""
+
+    def __init__(self, key, weight: float = 1.0, max_concurrency: int = None):
+        self.key = key
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.virtual_time = 0.0
+        self.running = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.queue = []               # projects: heap of queued tasks by aged priority
+        self.children: Dict = {}      # users: project tenants
+
+    def has_capacity(self) -> bool:
+        return self.max_concurrency is None or self.running < self.max_concurrency
+
+    def record_dispatch(self, wait: float):
+        self.virtual_time += 1.0 / self.weight
+        self.running += 1
+        self.dispatched += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> Dict:
+        return {
+            'weight': self.weight,
+            'max_concurrency': self.max_concurrency,
+            'running': self.running,
+            'dispatched': self.dispatched,
+            'avg_wait_seconds': round(self.total_wait / self.dispatched, 3) if self.dispatched else 0.0,
+            'max_wait_seconds': round(self.max_wait, 3)
+        }
+
+
+class TaskScheduler:
+    """
+    Weighted fair-share dispatcher in front of run_ai_code_task_smart.
+
+    Tasks are first ordered by priority class (interactive, normal, batch), with
+    waiting tasks promoted one class every PRIORITY_AGING_SECONDS so batch work
+    cannot starve. Priority only reorders the queue; running tasks are never
+    preempted. Within a class, users share dispatch slots in proportion to their
+    weight (start-time fair queuing on a per-user virtual clock), and each
+    user's projects share that user's slots the same way. A task is dispatched
+    only when its user and project are below their concurrency quota, a slot of
+    its agent's host-wide semaphore is free and its resource profile fits the
+    admission controller; the slot is taken without waiting, so a task blocked
+    on its agent never holds a reservation or a worker thread and other agents'
+    tasks dispatch past it. Quotas and weights come from
+    ``users.preferences.scheduler`` and ``projects.settings.scheduler``
+    (``{"maxConcurrency": n, "weight": w}``).
+    """
+
+    LIMITS_TTL = 60
+
+    def __init__(self, execute, max_workers: int = None):
+        self._execute = execute
+        self.default_user_concurrency = int(os.getenv('SCHEDULER_DEFAULT_USER_CONCURRENCY', '4'))
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv('SCHEDULER_MAX_WORKERS', '32')),
+            thread_name_prefix='task-worker'
+        )
+        self._users: Dict[str, _Tenant] = {}
+        self._limits_cache: Dict[Tuple, Tuple[float, Dict]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._queued = 0
+        self._running = 0
+        SCHEDULER_QUEUE_DEPTH.set_function(lambda: self._queued)
+        SCHEDULER_RUNNING.set_function(lambda: self._running)
+
+    # -- configuration -------------------------------------------------
+
+    def _load_limits(self, user_id: str, project_id: Optional[int]) -> Dict:
+        """Read scheduler settings from user preferences and project settings (cached)"""
+        key = (user_id, project_id)
+        cached = self._limits_cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.LIMITS_TTL:
+            return cached[1]
+
+        limits = {'user': {}, 'project': {}}
+        try:
+            user = DatabaseOperations.get_user_by_id(user_id)
+            limits['user'] = ((user or {}).get('preferences') or {}).get('scheduler') or {}
+            if project_id:
+                project = DatabaseOperations.get_project_by_id(project_id, user_id)
+                limits['project'] = ((project or {}).get('settings') or {}).get('scheduler') or {}
+        except Exception as e:
+            logger.warning(f"⚠️  Could not load scheduler settings for {user_id}: {e}")
+
+        self._limits_cache[key] = (time.monotonic(), limits)
+        return limits
+
+    def _tenants_for(self, user_id: str, project_id: Optional[int], limits: Dict) -> Tuple[_Tenant, _Tenant]:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _Tenant(user_id)
+        if not user.running and not self._has_queued(user):
+            # A (re)activated tenant starts at the current minimum so it cannot bank idle credit
+            active = [u.virtual_time for u in self._users.values() if u is not user and (u.running or self._has_queued(u))]
+            user.virtual_time = max(user.virtual_time, min(active)) if active else user.virtual_time
+        user.weight = float(limits['user'].get('weight') or 1.0)
+        user.max_concurrency = int(limits['user'].get('maxConcurrency') or self.default_user_concurrency)
+
+        project = user.children.get(project_id)
+        if project is None:
+            project = user.children[project_id] = _Tenant(project_id)
+        if not project.running and not project.queue:
+            active = [p.virtual_time for p in user.children.values() if p is not project and (p.running or p.queue)]
+            project.virtual_time = max(project.virtual_time, min(active)) if active else project.virtual_time
+        project.weight = float(limits['project'].get('weight') or 1.0)
+        max_concurrency = limits['project'].get('maxConcurrency')
+        project.max_concurrency = int(max_concurrency) if max_concurrency else None
+        return user, project
+
+    @staticmethod
+    def _has_queued(user: _Tenant) -> bool:
+        return any(p.queue for p in user.children.values())
+
+    # -- submission and dispatch ---------------------------------------
+
+    def submit(self, task_id: int, user_id: str, github_token: str, agent: str = 'claude',
+               project_id: int = None, priority: str = DEFAULT_PRIORITY, on_finished: Callable[[], None] = None):
+        """Queue a task for priority-ordered, fair-share dispatch; ``on_finished`` runs after it has finished"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        limits = self._load_limits(user_id, project_id)
+        entry = _QueuedTask(task_id, user_id, project_id, github_token, agent, task_resource_profile(agent), priority, on_finished)
+        task_timers.start(task_id, agent).begin('queue_wait')
+        with self._cond:
+            _, project = self._tenants_for(user_id, project_id, limits)
+            heapq.heappush(project.queue, entry)
+            self._queued += 1
+            self._cond.notify()
+        self.start()
+        logger.info(f"📥 Task {task_id} queued for user {user_id} with {priority} priority (queued: {self._queued}, running: {self._running})")
+
+    def cancel(self, task_id: int) -> bool:
+        """Remove a task that has not been dispatched yet; returns False if it is not queued"""
+        with self._cond:
+            for user in self._users.values():
+                for project in user.children.values():
+                    for index, entry in enumerate(project.queue):
+                        if entry.task_id == task_id:
+                            project.queue[index] = project.queue[-1]
+                            project.queue.pop()
+                            heapq.heapify(project.queue)
+                            self._queued -= 1
+                            task_timers.pop(task_id)
+                            logger.info(f"🗑️ Removed queued task {task_id} for user {entry.user_id}")
+                            return True
+        return False
+
+    def _pick(self) -> Optional[Tuple[_Tenant, _Tenant, _QueuedTask]]:
+        """
+        Choose the next dispatchable task: most urgent aged priority class, then
+        lowest user virtual time, then lowest project virtual time
+        """
+        now = time.monotonic()
+        candidates = []
+        for user in self._users.values():
+            if not user.has_capacity():
+                continue
+            for project in user.children.values():
+                if project.queue and project.has_capacity():
+                    head = project.queue[0]
+                    candidates.append((head.effective_class(now), user.virtual_time, project.virtual_time, head.sort_key, user, project))
+        candidates.sort(key=lambda c: c[:4])
+        for _, _, _, _, user, project in candidates:
+            entry = project.queue[0]
+            semaphore = execution_semaphore(entry.agent)
+            slot = semaphore.try_acquire() if semaphore else None
+            if semaphore and slot is None:
+                continue  # every host slot for this agent is taken; later candidates may use another agent
+            if admission_controller.try_admit(entry.task_id, entry.profile):
+                heapq.heappop(project.queue)
+                entry.agent_slot = slot
+                return user, project, entry
+            if slot:
+                slot.release()
+        return None
+
+    def _run(self):
+        logger.info("🗓️ Fair-share task scheduler started")
+        while True:
+            with self._cond:
+                picked = self._pick()
+                while picked is None:
+                    # Woken by submissions, task completions and admission releases
+                    self._cond.wait(1.0)
+                    picked = self._pick()
+                user, project, entry = picked
+                wait = time.monotonic() - entry.submitted_at
+                user.record_dispatch(wait)
+                project.record_dispatch(wait)
+                self._queued -= 1
+                self._running += 1
+            SCHEDULER_WAIT_SECONDS.labels(entry.priority).observe(wait)
+            task_timers.get(entry.task_id, entry.agent).end()
+            record_span('scheduler.queue_wait', entry.submitted_ns, parent=entry.trace_context,
+                        attributes={'task.id': entry.task_id, 'task.priority': entry.priority})
+            logger.info(f"🚚 Dispatching {entry.priority} task {entry.task_id} for user {entry.user_id} after {wait:.2f}s in queue")
+            self._pool.submit(self._execute_entry, user, project, entry)
+
+    def _execute_entry(self, user: _Tenant, project: _Tenant, entry: _QueuedTask):
+        try:
+            with use_context(entry.trace_context), \
+                    start_span('task.execute', {'task.id': entry.task_id, 'task.agent': entry.agent, 'user.id': entry.user_id}):
+                result = self._execute(entry.task_id, entry.user_id, entry.github_token, entry.agent)
+        except Exception as e:
+            logger.error(f"❌ Task {entry.task_id} raised during dispatch: {e}")
+            result = None
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self._finished(user, project, entry))
+        else:
+            self._finished(user, project, entry)
+
+    def _finished(self, user: _Tenant, project: _Tenant, entry: _QueuedTask):
+        # The executor normally releases its own reservation; this is idempotent
+        admission_controller.release(entry.task_id)
+        if entry.agent_slot:
+            entry.agent_slot.release()
+        with self._cond:
+            user.running -= 1
+            project.running -= 1
+            self._running -= 1
+            self._cond.notify()
+        if entry.on_finished:
+            try:
+                entry.on_finished()
+            except Exception as e:
+                logger.error(f"❌ Completion callback for task {entry.task_id} failed: {e}")
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='task-scheduler', daemon=True)
+                self._thread.start()
+
+    # -- reporting -----------------------------------------------------
+
+    def stats(self) -> Dict:
+        """Per-tenant queue, running, dispatch and wait-time stats plus Jain's fairness index"""
+        with self._cond:
+            users = {}
+            shares = []
+            for user_id, user in self._users.items():
+                user_stats = user.stats()
+                user_stats['queued'] = sum(len(p.queue) for p in user.children.values())
+                user_stats['projects'] = {}
+                for project_id, project in user.children.items():
+                    project_stats = project.stats()
+                    project_stats['queued'] = len(project.queue)
+                    user_stats['projects'][str(project_id) if project_id else 'none'] = project_stats
+                users[user_id] = user_stats
+                if user.dispatched:
+                    shares.append(user.dispatched / user.weight)
+
+            fairness = (sum(shares) ** 2 / (len(shares) * sum(s * s for s in shares))) if shares else 1.0
+            queued_by_priority = {name: 0 for name in PRIORITY_CLASSES}
+            for user in self._users.values():
+                for project in user.children.values():
+                    for entry in project.queue:
+                        queued_by_priority[entry.priority] += 1
+            return {
+                'queued': self._queued,
+                'queued_by_priority': queued_by_priority,
+                'running': self._running,
+                'fairness_index': round(fairness, 4),
+                'users': users
+            }
+
+
+# Process-wide scheduler; /start-task submits here instead of spawning a thread per task
+task_scheduler = TaskScheduler(execute=run_ai_code_task_smart)
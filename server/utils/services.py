@@ -0,0 +1,61 @@
+import os
+import sys
+import fcntl
+import logging
+import ipaddress
+from .oauth_refresh import oauth_refresh_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def start_task_services(oauth_leader_check=None):
+    """Background threads owned by the process that runs tasks (dev server, executor service or worker node)"""
+    # Keep OAuth tokens fresh in the background so task start never waits on a refresh;
+    # worker nodes pass a leader check so only one node in the cluster refreshes
+    if os.getenv('CLAUDE_OAUTH_PROACTIVE_REFRESH', 'true').lower() == 'true':
+        oauth_refresh_scheduler.start(leader_check=oauth_leader_check)
+
+    # A single background reaper replaces per-task container scans in Docker mode
+    if os.getenv('EXECUTION_MODE', 'direct').lower() == 'docker' or os.getenv('FORCE_DOCKER', 'false').lower() == 'true':
+        from .container import container_reaper
+        from .container_supervisor import container_supervisor
+        container_reaper.start()
+        container_supervisor.start()
+
+
+def acquire_instance_lock(path: str, role: str):
+    """Exit unless this process is the only ``role`` holding ``path``: its scheduling and slot accounting are in-process"""
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.error(f"❌ Another {role} holds {path}; only one may run per lock file")
+        sys.exit(1)
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def is_loopback_bind(address: str) -> bool:
+    """True for a unix socket or a host (``host``, ``host:port`` or ``[v6]:port``) that only local processes can reach"""
+    if address.startswith('unix:'):
+        return True
+    host = address
+    if host.startswith('['):
+        host = host[1:host.index(']')]
+    elif host.count(':') == 1:
+        host = host.split(':')[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_token_off_loopback(addresses, token: str, role: str):
+    """Refuse to serve an unauthenticated internal API on an address other hosts can reach"""
+    exposed = [address for address in addresses if not is_loopback_bind(address)]
+    if exposed and not token:
+        raise RuntimeError(f"The {role} would listen on {', '.join(exposed)} without a token; "
+                           f"set EXECUTOR_TOKEN or bind to 127.0.0.1")
@@ -0,0 +1,219 @@
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+import requests
+from database import DatabaseOperations
+from .scheduler import DEFAULT_PRIORITY, PRIORITY_CLASSES, task_scheduler
+from .admission import admission_controller
+from .cancellation import task_cancellations
+from .queue_tokens import queue_token_cipher
+from .task_metrics import record_task_finished
+from .tracing import SPAN_KIND_CLIENT, current_context, start_span
+
+logger = logging.getLogger(__name__)
+
+
+class LocalDispatcher:
+    """Schedules and runs tasks in this process (development server and the executor service)"""
+
+    local = True
+
+    def submit(self, task_id: int, user_id: str, github_token: str, agent: str = 'claude',
+               project_id: int = None, priority: str = None, on_finished: Callable[[], None] = None):
+        task_scheduler.submit(task_id, user_id, github_token, agent=agent, project_id=project_id,
+                              priority=priority or DEFAULT_PRIORITY, on_finished=on_finished)
+
+    def cancel(self, task_id: int, agent: str = None, container_id: str = None, abandon: bool = False) -> bool:
+        """
+        Stop a task wherever it is; returns True if it had not started running yet.
+        With ``abandon`` the executor stops without writing the task's status.
+        """
+        if abandon:
+            task_cancellations.abandon(task_id)
+        else:
+            task_cancellations.cancel(task_id)
+        if task_scheduler.cancel(task_id):
+            # Never started, so no executor will clear the cancellation
+            task_cancellations.finish(task_id)
+            record_task_finished(agent, 'queued', 'cancelled')
+            return True
+        if container_id:
+            # The die event completes the task, which releases its container, slots and reservation
+            from .container import kill_task_container
+            kill_task_container(container_id)
+        return False
+
+    def scheduler_stats(self) -> Dict:
+        return task_scheduler.stats()
+
+    def capacity(self) -> Dict:
+        return admission_controller.snapshot()
+
+
+class ExecutorUnavailable(Exception):
+    """The executor service could not be reached or rejected the call"""
+
+
+class RemoteDispatcher:
+    """
+    Hands tasks to the executor service over its internal HTTP API.
+
+    Used by the API workers in production, which then hold no scheduler,
+    cancellation or container state of their own and can be scaled
+    out. The caller's trace context travels in the traceparent header.
+    """
+
+    local = False
+
+    def __init__(self, url: str = None, token: str = None, timeout: float = None):
+        self.url = (url or os.getenv('EXECUTOR_URL', 'http://127.0.0.1:5100')).rstrip('/')
+        self.token = token if token is not None else os.getenv('EXECUTOR_TOKEN', '')
+        self.timeout = timeout or float(os.getenv('EXECUTOR_TIMEOUT_SECONDS', '10'))
+        self._session = requests.Session()
+
+    def _call(self, method: str, path: str, payload: Dict = None) -> Dict:
+        headers = {}
+        if self.token:
+            headers['X-Executor-Token'] = self.token
+        with start_span(f'executor.{method.lower()} {path}', kind=SPAN_KIND_CLIENT):
+            context = current_context()
+            if context:
+                headers['traceparent'] = context.traceparent()
+            try:
+                response = self._session.request(method, self.url + path, json=payload, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise ExecutorUnavailable(f"Executor unreachable at {self.url}: {e}")
+        if response.status_code != 200:
+            raise ExecutorUnavailable(f"Executor returned {response.status_code} for {path}: {response.text[:200]}")
+        return response.json()
+
+    def submit(self, task_id: int, user_id: str, github_token: str, agent: str = 'claude',
+               project_id: int = None, priority: str = None):
+        self._call('POST', '/internal/tasks', {
+            'task_id': task_id, 'user_id': user_id, 'github_token': github_token,
+            'agent': agent, 'project_id': project_id, 'priority': priority
+        })
+
+    def cancel(self, task_id: int, agent: str = None, container_id: str = None) -> bool:
+        return self._call('POST', f'/internal/tasks/{task_id}/cancel', {
+            'agent': agent, 'container_id': container_id
+        })['was_queued']
+
+    def scheduler_stats(self) -> Dict:
+        return self._call('GET', '/internal/scheduler/stats')['scheduler']
+
+    def capacity(self) -> Dict:
+        return self._call('GET', '/internal/capacity')['admission']
+
+
+class QueueDispatcher:
+    """
+    Enqueues tasks in the shared ``task_queue`` table, from which any number
+    of worker nodes (worker.py) claim and run them.
+
+    The API nodes only write queue rows and read task, queue and node state,
+    so they hold no task state and need no route to the workers. Cancelling a
+    task that a node has already claimed flags its row; the node stops it on
+    its next heartbeat.
+    """
+
+    local = False
+
+    def __init__(self, node_timeout: float = None):
+        # A node that has not heartbeated for this long is reported offline and its capacity ignored
+        self.node_timeout = node_timeout or float(os.getenv('WORKER_NODE_TIMEOUT_SECONDS', '30'))
+        # Fail at startup rather than on the first /start-task if the token key is missing
+        queue_token_cipher.check()
+
+    def submit(self, task_id: int, user_id: str, github_token: str, agent: str = 'claude',
+               project_id: int = None, priority: str = None):
+        priority = priority or DEFAULT_PRIORITY
+        try:
+            DatabaseOperations.enqueue_task(task_id, user_id, queue_token_cipher.encrypt(github_token), agent,
+                                            project_id, priority, PRIORITY_CLASSES[priority])
+        except Exception as e:
+            raise ExecutorUnavailable(f"Could not enqueue task {task_id}: {e}")
+
+    def cancel(self, task_id: int, agent: str = None, container_id: str = None) -> bool:
+        if DatabaseOperations.cancel_queued_task(task_id):
+            record_task_finished(agent, 'queued', 'cancelled')
+            return True
+        return False
+
+    def scheduler_stats(self) -> Dict:
+        """Queue depth and running tasks across the cluster, per priority, user and node"""
+        queued_by_priority = {name: 0 for name in PRIORITY_CLASSES}
+        users, nodes = {}, {}
+        queued = running = 0
+        for row in DatabaseOperations.get_task_queue():
+            user = users.setdefault(row['user_id'], {'queued': 0, 'running': 0})
+            if row.get('claimed_by'):
+                running += 1
+                user['running'] += 1
+                nodes[row['claimed_by']] = nodes.get(row['claimed_by'], 0) + 1
+            else:
+                queued += 1
+                user['queued'] += 1
+                queued_by_priority[row.get('priority') or DEFAULT_PRIORITY] += 1
+        return {
+            'queued': queued,
+            'queued_by_priority': queued_by_priority,
+            'running': running,
+            'users': users,
+            'running_by_node': nodes
+        }
+
+    def capacity(self) -> Dict:
+        """Registered worker nodes and the task slots of those that are live and accepting work"""
+        now = datetime.now(timezone.utc)
+        nodes = []
+        totals = {'slots': 0, 'running_tasks': 0, 'available_slots': 0}
+        by_status = {'active': 0, 'draining': 0, 'stopped': 0, 'offline': 0}
+        for row in DatabaseOperations.get_worker_nodes():
+            age = (now - _parse_timestamp(row['last_heartbeat_at'])).total_seconds() if row.get('last_heartbeat_at') else None
+            status = row['status']
+            if status != 'stopped' and (age is None or age > self.node_timeout):
+                status = 'offline'
+            by_status[status] = by_status.get(status, 0) + 1
+            capacity = row.get('capacity') or {}
+            if status == 'active':
+                totals['slots'] += capacity.get('slots', 0)
+                totals['running_tasks'] += row.get('running_tasks') or 0
+                totals['available_slots'] += max(0, capacity.get('slots', 0) - (row.get('running_tasks') or 0))
+            nodes.append({
+                'node_id': row['node_id'],
+                'hostname': row.get('hostname'),
+                'status': status,
+                'execution_mode': row.get('execution_mode'),
+                'agents': row.get('agents') or [],
+                'running_tasks': row.get('running_tasks') or 0,
+                'capacity': capacity,
+                'heartbeat_age_seconds': round(age, 1) if age is not None else None,
+                'started_at': row.get('started_at')
+            })
+        return {'nodes': nodes, 'nodes_by_status': by_status, **totals}
+
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def create_dispatcher(mode: Optional[str] = None):
+    """
+    TASK_DISPATCH=local runs tasks in this process; remote submits them to the
+    executor service; queue enqueues them for worker nodes
+    """
+    mode = (mode or os.getenv('TASK_DISPATCH', 'local')).lower()
+    if mode == 'remote':
+        return RemoteDispatcher()
+    if mode == 'queue':
+        return QueueDispatcher()
+    if mode != 'local':
+        raise ValueError(f"TASK_DISPATCH must be 'local', 'remote' or 'queue', not {mode!r}")
+    return LocalDispatcher()
+
+
+# Process-wide dispatcher used by the task endpoints
+task_dispatcher = create_dispatcher()
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from .metrics import Counter, Histogram, DEFAULT_BUCKETS
+from .tracing import SPAN_KIND_CLIENT, start_span
+
+# Agent runs take minutes; extend the default buckets past the container timeouts
+TASK_DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800)
+
+TASKS_SUBMITTED = Counter(
+    'tasks_submitted_total',
+    'Tasks accepted by /start-task',
+    ['agent']
+)
+TASKS_FINISHED = Counter(
+    'tasks_finished_total',
+    'Tasks that reached a final status',
+    ['agent', 'mode', 'status']
+)
+TASK_DURATION_SECONDS = Histogram(
+    'task_duration_seconds',
+    'Execution time from executor start to final status',
+    ['agent', 'mode', 'status'],
+    buckets=TASK_DURATION_BUCKETS
+)
+CONTAINER_OPERATION_SECONDS = Histogram(
+    'container_operation_seconds',
+    'Docker container create, wait and remove latency',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+
+TASK_PHASE_SECONDS = Histogram(
+    'task_phase_seconds',
+    'Time tasks spend in each pipeline phase',
+    ['agent', 'phase'],
+    buckets=DEFAULT_BUCKETS
+)
+DB_CALL_SECONDS = Histogram(
+    'db_call_seconds',
+    'Supabase call latency by DatabaseOperations method',
+    ['operation', 'result']
+)
+GITHUB_API_SECONDS = Histogram(
+    'github_api_seconds',
+    'GitHub API call latency by operation',
+    ['operation']
+)
+
+
+@contextmanager
+def github_call(operation: str):
+    """Time a GitHub API call and trace it as a client span"""
+    with start_span(f'github.{operation}', kind=SPAN_KIND_CLIENT), GITHUB_API_SECONDS.labels(operation).time():
+        yield
+
+
+def record_task_finished(agent: str, mode: str, status: str, duration: float = None):
+    """Count a task's final status and, when known, how long it ran"""
+    agent = (agent or 'unknown').lower()
+    TASKS_FINISHED.labels(agent, mode, status).inc()
+    if duration is not None:
+        TASK_DURATION_SECONDS.labels(agent, mode, status).observe(duration)
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import time
+import queue
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+import requests
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'async-code-api')
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class SpanContext:
+    """Identifies a span so children can be parented to it, including across threads"""
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self) -> str:
+        """W3C traceparent header value"""
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional['SpanContext']:
+        match = _TRACEPARENT.match((value or '').strip().lower())
+        if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+            return None
+        return cls(match.group(1), match.group(2))
+
+
+class Span:
+    __slots__ = ('name', 'context', 'parent_id', 'kind', 'start_ns', 'end_ns', 'attributes', 'status', 'message')
+
+    def __init__(self, name: str, parent: Optional[SpanContext], kind: int, attributes: Dict = None, start_ns: int = None):
+        self.name = name
+        self.context = SpanContext(parent.trace_id if parent else os.urandom(16).hex(), os.urandom(8).hex())
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = 0
+        self.message = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error: Exception):
+        self.status = STATUS_ERROR
+        self.message = str(error)[:500]
+
+    def end(self, end_ns: int = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            tracer.export(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            'traceId': self.context.trace_id,
+            'spanId': self.context.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            'status': {'code': self.status, **({'message': self.message} if self.message else {})}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('current_span_context', default=None)
+
+
+def current_context() -> Optional[SpanContext]:
+    """Context of the active span; capture it before handing work to another thread"""
+    return _current.get()
+
+
+@contextmanager
+def use_context(context: Optional[SpanContext]):
+    """Make a captured context current (e.g. on a worker thread)"""
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Tracer:
+    """
+    Minimal tracer exporting spans as OTLP/JSON.
+
+    TRACE_EXPORTER selects 'otlp' (POST to OTEL_EXPORTER_OTLP_ENDPOINT/v1/traces),
+    'file' (one ExportTraceServiceRequest per line in TRACE_FILE) or 'none'.
+    Finished spans go onto a bounded queue drained by a background thread, so
+    request and worker threads never block on export; spans are dropped when
+    the queue is full.
+    """
+
+    def __init__(self):
+        self.exporter = os.getenv('TRACE_EXPORTER', 'none').lower()
+        self.enabled = self.exporter in ('otlp', 'file')
+        self.endpoint = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318').rstrip('/') + '/v1/traces'
+        self.file_path = os.getenv('TRACE_FILE', '/tmp/async-code-traces.jsonl')
+        self.batch_size = int(os.getenv('TRACE_EXPORT_BATCH_SIZE', '512'))
+        self.interval = float(os.getenv('TRACE_EXPORT_INTERVAL_SECONDS', '2'))
+        self._queue: queue.Queue = queue.Queue(maxsize=int(os.getenv('TRACE_MAX_QUEUE_SIZE', '4096')))
+        self._session = requests.Session()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        self.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _payload(self, spans) -> Dict:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{'scope': {'name': 'async-code'}, 'spans': [s.to_otlp() for s in spans]}]
+            }]
+        }
+
+    def _flush(self, spans):
+        payload = self._payload(spans)
+        try:
+            if self.exporter == 'file':
+                with open(self.file_path, 'a') as f:
+                    f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+            else:
+                self._session.post(self.endpoint, json=payload, timeout=5)
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to export {len(spans)} spans: {e}")
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch:
+                self._flush(batch)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+
+# Process-wide tracer
+tracer = Tracer()
+
+
+@contextmanager
+def start_span(name: str, attributes: Dict = None, kind: int = SPAN_KIND_INTERNAL, parent: SpanContext = None):
+    """Run a block inside a child span of ``parent`` (default: the current span)"""
+    if not tracer.enabled:
+        yield None
+        return
+    span = Span(name, parent or current_context(), kind, attributes)
+    token = _current.set(span.context)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+
+def record_span(name: str, start_ns: int, end_ns: int = None, attributes: Dict = None,
+                parent: SpanContext = None, error: str = None):
+    """Record a span whose timing was measured elsewhere (e.g. queue wait, container run)"""
+    if not tracer.enabled:
+        return
+    span = Span(name, parent or current_context(), SPAN_KIND_INTERNAL, attributes, start_ns=start_ns)
+    if error:
+        span.status, span.message = STATUS_ERROR, error
+    span.end(end_ns)
+
+
+def init_flask_tracing(app):
+    """Open a server span per request, continuing an incoming W3C traceparent"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        if not tracer.enabled:
+            return
+        parent = SpanContext.from_traceparent(request.headers.get('traceparent'))
+        span = Span(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+                    parent, SPAN_KIND_SERVER, {'http.method': request.method, 'http.target': request.path})
+        g.trace_span = span
+        g.trace_token = _current.set(span.context)
+
+    @app.after_request
+    def _tag_response(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = STATUS_ERROR
+            response.headers['traceparent'] = span.context.traceparent()
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        span = g.pop('trace_span', None)
+        if span is None:
+            return
+        if error is not None:
+            span.set_error(error)
+        _current.reset(g.pop('trace_token'))
+        span.end()
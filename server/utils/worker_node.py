@@ -0,0 +1,326 @@
+import os
+import math
+import time
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional
+from database import DatabaseOperations
+from .admission import admission_controller, task_resource_profile
+from .metrics import Counter, Gauge
+from .queue_tokens import queue_token_cipher
+from .scheduler import PRIORITY_AGING_SECONDS, task_scheduler
+from .task_dispatch import LocalDispatcher
+
+logger = logging.getLogger(__name__)
+
+WORKER_CLAIMED_TASKS = Gauge('worker_claimed_tasks', 'Tasks leased to this worker node and not yet finished')
+WORKER_CLAIMS = Counter('worker_claims_total', 'Tasks claimed from the shared queue', ['attempt'])
+WORKER_HEARTBEATS = Counter('worker_heartbeats_total', 'Worker node heartbeats by result', ['result'])
+
+
+class WorkerNode:
+    """
+    One node of a distributed worker pool (worker.py).
+
+    Claims tasks from the shared ``task_queue`` table, runs them through this
+    process's fair-share scheduler and executor, and heartbeats its
+    ``worker_nodes`` row, which also renews the leases on its tasks. A node
+    never claims more tasks than it has free slots, so queued work stays
+    available to the other nodes. Draining (SIGTERM, or an operator setting
+    the row to 'draining') stops claiming, hands tasks that have not started
+    back to the queue and lets running ones finish. When a node dies its
+    leases lapse and other nodes claim its tasks again, up to
+    WORKER_MAX_ATTEMPTS runs per task.
+    """
+
+    def __init__(self, node_id: str = None):
+        # Same identity as the container labels, so a node's reaper only touches its own containers
+        self.node_id = node_id or os.getenv('NODE_ID') or socket.gethostname()
+        self.hostname = socket.gethostname()
+        self.agents = [agent.strip() for agent in os.getenv('WORKER_AGENTS', 'claude,codex').split(',') if agent.strip()]
+        self.poll_interval = float(os.getenv('WORKER_POLL_INTERVAL_SECONDS', '2'))
+        self.heartbeat_interval = float(os.getenv('WORKER_HEARTBEAT_SECONDS', '10'))
+        self.lease_seconds = int(os.getenv('WORKER_LEASE_SECONDS', '60'))
+        self.max_attempts = int(os.getenv('WORKER_MAX_ATTEMPTS', '2'))
+        self.drain_timeout = float(os.getenv('WORKER_DRAIN_TIMEOUT_SECONDS', '3600'))
+        self.slots = int(os.getenv('WORKER_MAX_TASKS', '0')) or self._default_slots()
+        docker_mode = os.getenv('EXECUTION_MODE', 'direct').lower() == 'docker' or os.getenv('FORCE_DOCKER', 'false').lower() == 'true'
+        self.execution_mode = 'docker' if docker_mode else 'direct'
+        if self.heartbeat_interval * 2 > self.lease_seconds:
+            logger.warning(f"⚠️  WORKER_LEASE_SECONDS ({self.lease_seconds}) should be at least twice "
+                           f"WORKER_HEARTBEAT_SECONDS ({self.heartbeat_interval:g}) or leases may lapse between heartbeats")
+
+        self.status = 'active'
+        self._dispatcher = LocalDispatcher()
+        self._claimed: Dict[int, Dict] = {}   # task id -> claimed queue row
+        self._lock = threading.Lock()
+        self._wake = threading.Event()        # claim loop: a slot freed up or the status changed
+        self._beat = threading.Event()        # heartbeat loop: report a status change now
+        self._stopped = threading.Event()
+        self._exit_when_drained = False
+        self._drain_started: Optional[float] = None
+        self._report_status: Optional[str] = None
+        self._last_heartbeat: Optional[float] = None
+        self.is_leader = False                # runs the cluster-wide background jobs (worker_heartbeat picks it)
+        WORKER_CLAIMED_TASKS.set_function(lambda: len(self._claimed))
+
+    @staticmethod
+    def _default_slots() -> int:
+        """Claude tasks that fit the host's admission capacity, bounded by the scheduler's worker pool"""
+        profile = task_resource_profile('claude')
+        capacity = admission_controller.capacity
+        fits = min(capacity.cpus / profile.cpus if profile.cpus else math.inf,
+                   capacity.memory / profile.memory if profile.memory else math.inf)
+        return max(1, int(min(fits, int(os.getenv('SCHEDULER_MAX_WORKERS', '32')))))
+
+    # -- lifecycle -----------------------------------------------------
+
+    def start(self):
+        """Register the node (raises if the database is unreachable or the token key is missing) and start claiming"""
+        queue_token_cipher.check()
+        self._heartbeat(status='active', register=True)
+        for target, name in ((self._claim_loop, 'worker-claim'), (self._heartbeat_loop, 'worker-heartbeat')):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        logger.info(f"🛠️ Worker node {self.node_id} started: {self.slots} slot(s), agents {', '.join(self.agents)}, "
+                    f"{self.execution_mode} execution")
+
+    def drain(self, exit_when_done: bool = False):
+        """
+        Stop claiming and give back tasks that have not started; running tasks finish.
+        With ``exit_when_done`` the node then marks itself stopped and ``wait()``
+        returns; otherwise it idles as 'draining' until resumed. Safe to call
+        from a signal handler: the work happens on the heartbeat thread.
+        """
+        with self._lock:
+            if self.status == 'draining' and (self._exit_when_drained or not exit_when_done):
+                return
+            self.status = 'draining'
+            self._exit_when_drained = self._exit_when_drained or exit_when_done
+            self._drain_started = self._drain_started or time.monotonic()
+            self._report_status = 'draining'
+        self._beat.set()
+        self._wake.set()
+
+    @property
+    def exiting(self) -> bool:
+        return self._exit_when_drained
+
+    def wait(self, timeout: float = None) -> bool:
+        """True once the node has drained and stopped"""
+        return self._stopped.wait(timeout)
+
+    # -- claiming ------------------------------------------------------
+
+    def _free_slots(self) -> int:
+        with self._lock:
+            return max(0, self.slots - len(self._claimed)) if self.status == 'active' else 0
+
+    def _claim_loop(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            free = self._free_slots()
+            if free:
+                try:
+                    rows = DatabaseOperations.claim_queued_tasks(
+                        self.node_id, self.agents, free, self.lease_seconds, self.max_attempts,
+                        PRIORITY_AGING_SECONDS, task_scheduler.default_user_concurrency
+                    )
+                except Exception:
+                    rows = []  # logged by DatabaseOperations; retried next poll
+                for row in rows:
+                    self._start_task(row)
+            # Woken early when a task finishes or the node's status changes
+            self._wake.wait(self.poll_interval)
+
+    def _start_task(self, row: Dict):
+        task_id = row['task_id']
+        with self._lock:
+            self._claimed[task_id] = row
+        attempt = row.get('attempts') or 1
+        WORKER_CLAIMS.labels('first' if attempt == 1 else 'retry').inc()
+        if attempt > 1:
+            logger.warning(f"🔁 Task {task_id} claimed again after its node was lost (attempt {attempt}/{self.max_attempts})")
+        logger.info(f"📬 Node {self.node_id} claimed {row.get('priority')} task {task_id} for user {row['user_id']}")
+        try:
+            github_token = queue_token_cipher.decrypt(row.get('github_token'))
+        except ValueError as e:
+            logger.error(f"❌ Cannot run task {task_id}: {e}")
+            try:
+                DatabaseOperations.update_task(task_id, row['user_id'], {'status': 'failed', 'error': f"Cannot run the task: {e}"})
+            except Exception:
+                pass
+            self._finished(task_id)
+            return
+        try:
+            self._dispatcher.submit(task_id, row['user_id'], github_token, agent=row.get('agent') or 'claude',
+                                    project_id=row.get('project_id'), priority=row.get('priority'),
+                                    on_finished=lambda: self._finished(task_id))
+        except Exception as e:
+            logger.error(f"❌ Could not schedule claimed task {task_id}: {e}")
+            self._release(task_id)
+
+    def _finished(self, task_id: int):
+        with self._lock:
+            row = self._claimed.pop(task_id, None)
+        self._wake.set()
+        if row is None or row.get('lost'):
+            return
+        try:
+            DatabaseOperations.complete_queued_task(task_id, self.node_id)
+        except Exception:
+            # The next claim_tasks drops queue rows whose task has already reached a final state
+            pass
+
+    def _release(self, task_id: int):
+        """Return a claimed task that never started to the queue, without counting the attempt"""
+        with self._lock:
+            row = self._claimed.pop(task_id, None)
+        if row is None:
+            return
+        try:
+            DatabaseOperations.release_queued_task(task_id, self.node_id, max(0, (row.get('attempts') or 1) - 1),
+                                                   row.get('github_token'))
+            logger.info(f"↩️ Released task {task_id} back to the queue")
+        except Exception:
+            pass  # its lease lapses and another node claims it
+
+    def _cancel(self, task_id: int, lost: bool = False):
+        """
+        Stop a task the API has cancelled (its row is already marked cancelled), or
+        one whose lease was ``lost``: that run is abandoned without writing its result,
+        since another node may already be running the task.
+        """
+        with self._lock:
+            row = self._claimed.get(task_id)
+            if row is None or row.get('lost') or (row.get('cancelling') and not lost):
+                return
+            row['cancelling'] = True
+            row['lost'] = lost
+        container_id = None
+        if self.execution_mode == 'docker':
+            try:
+                container_id = (DatabaseOperations.get_task_by_id(task_id, row['user_id']) or {}).get('container_id')
+            except Exception:
+                pass
+        if self._dispatcher.cancel(task_id, agent=row.get('agent'), container_id=container_id, abandon=lost):
+            # Never dispatched, so no completion callback will release the row
+            self._finished(task_id)
+        if lost:
+            logger.warning(f"⚠️  Lease on task {task_id} lapsed before node {self.node_id} renewed it; "
+                           f"stopped the local run without writing its result")
+        else:
+            logger.info(f"🛑 Node {self.node_id} stopped cancelled task {task_id}")
+
+    # -- heartbeat and draining ----------------------------------------
+
+    def describe(self) -> Dict:
+        with self._lock:
+            claimed = len(self._claimed)
+        return {
+            'hostname': self.hostname,
+            'execution_mode': self.execution_mode,
+            'agents': self.agents,
+            'running_tasks': claimed,
+            'capacity': {'slots': self.slots, 'admission': admission_controller.snapshot()}
+        }
+
+    def _heartbeat_loop(self):
+        while not self._stopped.is_set():
+            self._beat.wait(self.heartbeat_interval)
+            self._beat.clear()
+            with self._lock:
+                status, self._report_status = self._report_status, None
+            try:
+                self._heartbeat(status=status)
+            except Exception:
+                with self._lock:
+                    self._report_status = self._report_status or status  # report it next time
+            if self.status == 'draining':
+                self._release_unstarted()
+                self._check_drained()
+
+    def _heartbeat(self, status: str = None, register: bool = False):
+        with self._lock:
+            task_ids = [task_id for task_id, row in self._claimed.items() if not row.get('lost')]
+        try:
+            result = DatabaseOperations.worker_heartbeat(self.node_id, self.describe(), task_ids, self.lease_seconds,
+                                                         status=status, register=register)
+        except Exception:
+            WORKER_HEARTBEATS.labels('error').inc()
+            if self.is_leader and (self._last_heartbeat is None or time.monotonic() - self._last_heartbeat > self.lease_seconds):
+                # Other nodes already see this one as gone and have picked a new leader
+                logger.warning(f"⚠️  Node {self.node_id} gives up leadership: no heartbeat for {self.lease_seconds}s")
+                self.is_leader = False
+            raise
+        WORKER_HEARTBEATS.labels('ok').inc()
+        self._last_heartbeat = time.monotonic()
+
+        leader = result.get('leader') == self.node_id
+        if leader != self.is_leader:
+            logger.info(f"👑 Node {self.node_id} is now the leader" if leader else f"Node {self.node_id} is no longer the leader")
+            self.is_leader = leader
+
+        # An operator drains or resumes a node through its worker_nodes row
+        if result.get('status') == 'draining' and self.status == 'active':
+            logger.info(f"🚰 Node {self.node_id} draining at an operator's request")
+            self.drain()
+        elif result.get('status') == 'active' and self.status == 'draining' and not self._exit_when_drained and status is None:
+            with self._lock:
+                self.status, self._drain_started = 'active', None
+            logger.info(f"▶️ Node {self.node_id} resumed claiming tasks")
+            self._wake.set()
+
+        for task_id in result.get('cancel') or []:
+            self._cancel(task_id)
+        for task_id in result.get('lost') or []:
+            self._cancel(task_id, lost=True)
+
+    def _release_unstarted(self):
+        with self._lock:
+            task_ids = list(self._claimed)
+        for task_id in task_ids:
+            # Still in the local scheduler's queue: nothing ran, so another node can take it
+            if task_scheduler.cancel(task_id):
+                self._release(task_id)
+
+    def _check_drained(self):
+        with self._lock:
+            remaining = len(self._claimed)
+        timed_out = self._drain_started is not None and time.monotonic() - self._drain_started > self.drain_timeout
+        if not self._exit_when_drained or (remaining and not timed_out):
+            return
+        if remaining:
+            logger.warning(f"⏱️ Drain timed out with {remaining} task(s) still running; other nodes retry them once their leases lapse")
+        try:
+            self._heartbeat(status='stopped')
+        except Exception:
+            pass  # reported offline once its heartbeat goes stale
+        logger.info(f"🏁 Node {self.node_id} drained and stopped")
+        self._stopped.set()
+        self._wake.set()
+
+    # -- reporting -----------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._lock:
+            claimed: List[Dict] = [
+                {'task_id': task_id, 'user_id': row['user_id'], 'agent': row.get('agent'), 'priority': row.get('priority'),
+                 'attempts': row.get('attempts'), 'claimed_at': row.get('claimed_at'), 'lost': bool(row.get('lost'))}
+                for task_id, row in self._claimed.items()
+            ]
+        return {
+            'node_id': self.node_id,
+            'status': self.status,
+            'leader': self.is_leader,
+            'execution_mode': self.execution_mode,
+            'agents': self.agents,
+            'slots': self.slots,
+            'claimed': claimed,
+            'last_heartbeat_age_seconds': round(time.monotonic() - self._last_heartbeat, 1) if self._last_heartbeat else None,
+            'admission': admission_controller.snapshot()
+        }
+
+
+# Process-wide node, started by worker.py
+worker_node = WorkerNode()
@@ -0,0 +1,77 @@
+from flask import Flask, Blueprint, jsonify
+import os
+import signal
+import logging
+import threading
+from dotenv import load_dotenv
+from werkzeug.serving import make_server
+
+# Load environment variables
+load_dotenv()
+
+# Worker nodes run the tasks they claim in this process, whatever dispatch mode the API nodes share via .env
+os.environ['TASK_DISPATCH'] = 'local'
+
+from health import health_bp
+from admin import admin_bp
+from utils.health_probes import health_probes
+from utils.services import acquire_instance_lock, start_task_services
+from utils.tracing import init_flask_tracing
+from utils.worker_node import worker_node
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKER_LOCK_FILE = os.getenv('WORKER_LOCK_FILE') or f'/tmp/async-code-worker-{worker_node.node_id}.lock'
+
+worker_bp = Blueprint('worker', __name__)
+
+@worker_bp.route('/worker', methods=['GET'])
+def worker_status():
+    """This node's status, slots and claimed tasks"""
+    return jsonify({'status': 'success', 'worker': worker_node.stats()})
+
+
+# One process per node id: its leases, slots and containers are tracked in this process
+_instance_lock = acquire_instance_lock(WORKER_LOCK_FILE, 'worker')
+
+app = Flask(__name__)
+
+# Request spans (no-op unless TRACE_EXPORTER is set)
+init_flask_tracing(app)
+
+# /worker, /health, /ready, /metrics and /admin for this node; tasks arrive through the shared queue
+app.register_blueprint(worker_bp)
+app.register_blueprint(health_bp)
+app.register_blueprint(admin_bp)
+
+
+def handle_stop_signal(signum, frame):
+    """First SIGTERM/SIGINT drains the node; a second one exits at once (other nodes retry its tasks)"""
+    if worker_node.exiting:
+        logger.warning("⚠️  Second stop signal, exiting without waiting for running tasks")
+        os._exit(1)
+    logger.info(f"🚰 Received {signal.Signals(signum).name}, draining node {worker_node.node_id}")
+    worker_node.drain(exit_when_done=True)
+
+
+if __name__ == '__main__':
+    host = os.getenv('WORKER_HOST', '127.0.0.1')
+    port = int(os.getenv('WORKER_PORT', '5200'))
+
+    start_task_services(oauth_leader_check=lambda: worker_node.is_leader)
+    health_probes.start()
+    worker_node.start()
+
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='worker-http', daemon=True).start()
+    logger.info(f"Starting worker node {worker_node.node_id} on {host}:{server.port}")
+
+    # The main thread only waits, so stop signals are handled promptly
+    while not worker_node.wait(1.0):
+        pass
+    server.shutdown()